@@ -5,51 +5,68 @@ from simple_facerec import SimpleFacerec
 import yaml
 import numpy as np
 import os
-import pickle
-import json
-import pandas as pd
 import requests
+from class_roster import RoomRoster, load_timetable_index
+from face_detectors import detector_from_config
+from face_quality import quality_gate_from_config
+from frame_source import open_source
+from pipeline import RecognitionPipeline
+from recognition_client import recognition_client_from_config
+from shared_gallery import shared_gallery_from_config
+from user_registry import registry_from_config
+
+# Load configuration from YAML file
+cfg = yaml.load(open('config.yaml', 'r'), Loader=yaml.FullLoader)
+ROOM = cfg['CLASSROOM']['ROOM']
+TIMETABLE_PATH = cfg['CLASSROOM']['TIMETABLE_PATH']
+CAPTURE_SOURCE = cfg['CAPTURE']['SOURCE']
+CAPTURE_REALTIME = cfg['CAPTURE']['REALTIME']
+RECOGNITION_SERVICE_URL = cfg['RECOGNITION_SERVICE']['URL']
+
+# Users are kept in one indexed registry, see user_registry.py
+@st.cache_resource
+def get_user_registry():
+    return registry_from_config(cfg['PATH'])
 
 # Function to save user data for sign up
 def save_user_data(name, enrollment, user_class, semester, image_path):
-    if not os.path.exists("users"):
-        os.makedirs("users")
-
-    user_data = {
+    get_user_registry().save({
         "name": name,
         "enrollment": enrollment,
         "class": user_class,
         "semester": semester,
         "image_path": image_path
-    }
-
-    # Save user data in a pickle file for persistence
-    with open(f"users/{enrollment}.pkl", "wb") as f:
-        pickle.dump(user_data, f)
+    })
 
-# Function to fetch all user data and cache it in session state
+# Function to fetch all user data
 def fetch_all_users():
-    if 'users_data' not in st.session_state:
-        st.session_state['users_data'] = []
-        if os.path.exists("users"):
-            for file in os.listdir("users"):
-                if file.endswith(".pkl"):
-                    with open(f"users/{file}", "rb") as f:
-                        st.session_state['users_data'].append(pickle.load(f))
-    return st.session_state['users_data']
-
-# Function to initialize SimpleFacerec and cache it in session state
-def initialize_face_recognition():
-    if 'sfr_initialized' not in st.session_state:
-        st.session_state['sfr'] = SimpleFacerec()
-        st.session_state['sfr'].load_encoding_images("images/")
-        st.session_state['sfr_initialized'] = True
+    return get_user_registry().all()
 
-# Load timetable from JSON file
-@st.cache_data
+# One gallery shared by all sessions and reloaded when images/ changes, see shared_gallery.py
+@st.cache_resource
+def get_shared_gallery():
+    return shared_gallery_from_config(cfg)
+
+# Function to initialize SimpleFacerec and cache it in session state; the gallery itself is shared
+def initialize_face_recognition():
+    if 'sfr_initialized' in st.session_state:
+        return
+    if RECOGNITION_SERVICE_URL:
+        # Thin client of recognition_service.py, which holds the gallery and models
+        st.session_state['sfr'] = recognition_client_from_config(cfg['RECOGNITION_SERVICE'])
+    else:
+        st.session_state['sfr'] = SimpleFacerec().use_gallery(get_shared_gallery())
+        st.session_state['sfr'].detector = detector_from_config(cfg['DETECTOR'])
+        st.session_state['sfr'].quality_gate = quality_gate_from_config(cfg['QUALITY'])
+        if cfg['RESIZING']['ADAPTIVE']:
+            st.session_state['sfr'].enable_adaptive_resizing(cfg['RESIZING']['TARGET_LATENCY_MS'],
+                                                             cfg['RESIZING']['MIN_FACE_SIZE'])
+    st.session_state['sfr_initialized'] = True
+
+# Timetable compiled once for all sessions, see timetable_index.py
+@st.cache_resource
 def load_timetable():
-    with open("timetable.json", "r") as file:
-        return pd.json_normalize(data=json.load(file)["timetable"], record_path="slots", meta="day")
+    return load_timetable_index(TIMETABLE_PATH)
 
 # Initialize SimpleFacerec
 initialize_face_recognition()
@@ -139,21 +156,10 @@ elif choice == "Signup":
             # Save user data with the image path
             save_user_data(name, enrollment, user_class, semester, image_path)
 
-            # Refresh user data cache
-            if 'users_data' in st.session_state:
-                st.session_state['users_data'].append({
-                    "name": name,
-                    "enrollment": enrollment,
-                    "class": user_class,
-                    "semester": semester,
-                    "image_path": image_path
-                })
-            else:
-                fetch_all_users()
-
-            # Reload face encodings
-            if 'sfr' in st.session_state:
-                st.session_state['sfr'].load_encoding_images("images/")
+            # Add the new face to the shared gallery, replacing an earlier image of the same user
+            # (the recognition service picks it up from images/ itself)
+            if not RECOGNITION_SERVICE_URL:
+                get_shared_gallery().add_person(enrollment, image_path)
             
             st.success(f"User {name} signed up successfully! Image saved at {image_path}")
         else:
@@ -168,8 +174,7 @@ elif choice == "Login":
     
     # Login button
     if st.button("Login"):
-        users_data = fetch_all_users()
-        user_data = next((user for user in users_data if user['enrollment'] == enrollment_number), None)
+        user_data = get_user_registry().get(enrollment_number)
         if user_data:
             st.session_state['logged_in'] = True
             st.session_state['user_data'] = user_data
@@ -187,18 +192,16 @@ elif choice == "Face Recognition":
     if enrollment_number is None:
         st.error("Please log in first to mark attendance.")
     else:
-        # Initialize webcam for face recognition
-        video_capture = cv2.VideoCapture(0)
+        # Initialize the video source for face recognition, detecting faces on the latest frame
+        video_capture = open_source(CAPTURE_SOURCE, realtime=CAPTURE_REALTIME)
 
-        while True:
-            ret, frame = video_capture.read()
-            if not ret:
-                st.write("Error: Failed to access the webcam.")
-                break
-
-            # Detect faces in the frame
-            face_locations, face_names = st.session_state['sfr'].detect_known_faces(frame)
+        # Match the students of the class scheduled in this room first, following period changes
+        sfr = st.session_state['sfr']
+        roster = RoomRoster(ROOM, load_timetable(), get_user_registry())
+        pipeline = RecognitionPipeline(video_capture,
+                                       roster.recognizer(sfr, sfr.detect_known_faces, video_capture)).start()
 
+        for frame, face_locations, face_names in pipeline.results():
             # Display the resulting frame
             st.image(frame, channels="BGR", use_container_width=True)
 
@@ -208,8 +211,10 @@ elif choice == "Face Recognition":
                     log_attendance(name, enrollment_number)
                 st.write("Attendance marked successfully.")
                 break
+        else:
+            st.write("Error: Failed to access the webcam.")
 
-        video_capture.release()
+        pipeline.stop()
         cv2.destroyAllWindows()
 
 # Dashboard Section
@@ -236,18 +241,17 @@ elif choice == "Dashboard":
     timetable = load_timetable()
     
     # Display timetable by day
-    days = timetable["day"].unique()
-    selected_day = st.selectbox("Select Day", days)
+    selected_day = st.selectbox("Select Day", timetable.days)
 
-    filtered_timetable = timetable[timetable["day"] == selected_day]
+    filtered_timetable = timetable.day_slots(selected_day)
 
     st.subheader(f"Timetable for {selected_day}")
 
     # Create spacious grid layout for the timetable
-    for index, row in filtered_timetable.iterrows():
-        time = row["time"]
-        subject = row["subject"]
-        teacher = row.get("teacher", "")  # Remove "nan" for missing teacher field
+    for index, entry in enumerate(filtered_timetable):
+        time = entry.slot["time"]
+        subject = entry.slot["subject"]
+        teacher = entry.slot.get("teacher", "")
 
         # Assign colors dynamically based on subject or time
         if subject == "Break":
@@ -280,8 +284,8 @@ elif choice == "Face Recognition":
     if enrollment_number is None:
         st.error("Please log in first to mark attendance.")
     else:
-        # Initialize webcam for face recognition
-        video_capture = cv2.VideoCapture(0)
+        # Initialize the video source for face recognition
+        video_capture = open_source(CAPTURE_SOURCE, realtime=CAPTURE_REALTIME)
 
         while True:
             ret, frame = video_capture.read()
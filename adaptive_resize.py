@@ -0,0 +1,59 @@
+import collections
+import math
+
+
+class AdaptiveResizer:
+    """
+    Picks the frame_resizing scale from recent detection timings and the
+    size of the faces seen. Detection cost grows with the number of pixels
+    (scale squared), while dlib only finds faces that are big enough in the
+    resized frame. The scale is therefore lowered when the faces are large
+    (a student close to a laptop camera), raised when faces are small
+    (students at the back of a lecture hall), and never raised past what the
+    latency budget allows.
+    """
+
+    def __init__(self, target_latency_ms=80, min_face_size=40, min_scale=0.1, max_scale=1.0,
+                 initial_scale=0.25, window=10, step=0.05):
+        """
+        :param target_latency_ms: Detection time allowed per frame.
+        :param min_face_size: Face height in pixels the detector needs in the resized frame.
+        :param min_scale: Lowest scale used.
+        :param max_scale: Highest scale used.
+        :param initial_scale: Scale before any timing is known.
+        :param window: Number of recent frames the timings and face sizes are taken from.
+        :param step: Scales are rounded to multiples of this to avoid resizing to a new size every frame.
+        """
+        self.target_latency = target_latency_ms / 1000.0
+        self.min_face_size = min_face_size
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.scale = initial_scale
+        self.step = step
+        self.timings = collections.deque(maxlen=window)
+        self.face_heights = collections.deque(maxlen=window)
+
+    def update(self, elapsed, face_heights):
+        """
+        Record a detection and choose the scale of the next frame.
+        :param elapsed: Detection time of the frame in seconds, at the current scale.
+        :param face_heights: Heights of the detected faces in original-frame pixels.
+        :return: The new scale.
+        """
+        # Normalise the timing to scale 1.0 so timings at different scales can be averaged
+        self.timings.append(elapsed / (self.scale ** 2))
+        self.face_heights.append(min(face_heights) if face_heights else None)
+
+        # Largest scale that keeps detection within the latency budget
+        cost_at_full_scale = sum(self.timings) / len(self.timings)
+        budget_scale = math.sqrt(self.target_latency / cost_at_full_scale) if cost_at_full_scale > 0 else self.max_scale
+
+        # Smallest scale that keeps the smallest recent face detectable. Without
+        # faces, use what the budget allows so that small faces can be found.
+        seen = [h for h in self.face_heights if h]
+        face_scale = self.min_face_size / min(seen) if seen else budget_scale
+
+        scale = min(max(face_scale, self.min_scale), budget_scale, self.max_scale)
+        scale = max(self.min_scale, round(scale / self.step) * self.step)
+        self.scale = round(min(scale, self.max_scale), 4)
+        return self.scale
@@ -4,42 +4,67 @@ import face_recognition as frg
 from simple_facerec import SimpleFacerec
 import yaml
 import numpy as np
-import os
-import pickle
+from class_roster import RoomRoster, load_timetable_index
+from face_detectors import detector_from_config
+from face_quality import quality_gate_from_config
+from frame_source import open_source
+from pipeline import RecognitionPipeline
+from recognition_client import recognition_client_from_config
+from shared_gallery import shared_gallery_from_config
+from user_registry import registry_from_config
+
+# Load configuration from YAML file
+cfg = yaml.load(open('config.yaml', 'r'), Loader=yaml.FullLoader)
+
+PICTURE_PROMPT = cfg['INFO']['PICTURE_PROMPT']
+WEBCAM_PROMPT = cfg['INFO']['WEBCAM_PROMPT']
+ROOM = cfg['CLASSROOM']['ROOM']
+TIMETABLE_PATH = cfg['CLASSROOM']['TIMETABLE_PATH']
+CAPTURE_SOURCE = cfg['CAPTURE']['SOURCE']
+CAPTURE_REALTIME = cfg['CAPTURE']['REALTIME']
+RECOGNITION_SERVICE_URL = cfg['RECOGNITION_SERVICE']['URL']
+
+# Timetable compiled once for all sessions, see timetable_index.py
+@st.cache_resource
+def load_timetable():
+    return load_timetable_index(TIMETABLE_PATH)
+
+# Users are kept in one indexed registry, see user_registry.py
+@st.cache_resource
+def get_user_registry():
+    return registry_from_config(cfg['PATH'])
 
 # Function to save user data for sign up
 def save_user_data(name, enrollment, user_class, semester, image_path):
-    if not os.path.exists("users"):
-        os.makedirs("users")
-
-    user_data = {
+    get_user_registry().save({
         "name": name,
         "enrollment": enrollment,
         "class": user_class,
         "semester": semester,
         "image_path": image_path
-    }
-
-    # Save user data in a pickle file for persistence
-    with open(f"users/{enrollment}.pkl", "wb") as f:
-        pickle.dump(user_data, f)
+    })
 
 # Function to load user data
 def load_user_data(enrollment):
-    try:
-        with open(f"users/{enrollment}.pkl", "rb") as f:
-            return pickle.load(f)
-    except FileNotFoundError:
-        return None
-
-# Load configuration from YAML file
-cfg = yaml.load(open('config.yaml', 'r'), Loader=yaml.FullLoader)
-PICTURE_PROMPT = cfg['INFO']['PICTURE_PROMPT']
-WEBCAM_PROMPT = cfg['INFO']['WEBCAM_PROMPT']
-
-# Initialize SimpleFacerec for face recognition
-sfr = SimpleFacerec()
-sfr.load_encoding_images("images/")  # Set your image path here
+    return get_user_registry().get(enrollment)
+
+# One gallery shared by all sessions and reloaded when images/ changes, see shared_gallery.py
+@st.cache_resource
+def get_shared_gallery():
+    return shared_gallery_from_config(cfg)
+
+if RECOGNITION_SERVICE_URL:
+    # Thin client of recognition_service.py, one per session as it keeps the session's candidates
+    if 'recognition_client' not in st.session_state:
+        st.session_state['recognition_client'] = recognition_client_from_config(cfg['RECOGNITION_SERVICE'])
+    sfr = st.session_state['recognition_client']
+else:
+    # Initialize SimpleFacerec for face recognition on the shared gallery
+    sfr = SimpleFacerec().use_gallery(get_shared_gallery())
+    sfr.detector = detector_from_config(cfg['DETECTOR'])
+    sfr.quality_gate = quality_gate_from_config(cfg['QUALITY'])
+    if cfg['RESIZING']['ADAPTIVE']:
+        sfr.enable_adaptive_resizing(cfg['RESIZING']['TARGET_LATENCY_MS'], cfg['RESIZING']['MIN_FACE_SIZE'])
 
 # Set Streamlit page config
 st.set_page_config(layout="wide")
@@ -118,6 +143,11 @@ if choice == "Signup":
 
             # Save user data with the image path
             save_user_data(name, enrollment, user_class, semester, image_path)
+
+            # Add the new face to the shared gallery, so every session recognizes the user right away
+            # (the recognition service picks it up from images/ itself)
+            if not RECOGNITION_SERVICE_URL:
+                get_shared_gallery().add_person(enrollment, image_path)
             st.success(f"User {name} signed up successfully! Image saved at {image_path}")
         else:
             st.error("Please fill all the fields.")
@@ -193,23 +223,30 @@ if st.session_state['logged_in']:
 
     elif choice == "Webcam":
         st.write(WEBCAM_PROMPT)
-        device_id = st.sidebar.selectbox("Select Webcam Device ID", [0, 1, 2, 3], index=0)
-        cap = cv2.VideoCapture(device_id)
+        source = st.sidebar.text_input("Video Source (webcam ID, video file or image folder)", str(CAPTURE_SOURCE))
+        cap = open_source(source, realtime=CAPTURE_REALTIME)
 
         run = st.checkbox("Start Video Stream")
-        while run:
-            ret, frame = cap.read()
-            if not ret:
-                st.write("Failed to capture frame.")
-                break
-
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            face_locations, face_names = sfr.detect_known_faces(rgb_frame)
+        if run:
+            if RECOGNITION_SERVICE_URL:
+                # The service detects faces on every frame, tracking only runs in this process
+                recognize = sfr.detect_known_faces
+            else:
+                sfr.enable_tracking(detect_every=cfg['TRACKING']['DETECT_EVERY'], tracker=cfg['TRACKING']['TRACKER'])
+                recognize = sfr.track_known_faces
+            # Match the students of the class scheduled in this room first, following period changes
+            roster = RoomRoster(ROOM, load_timetable(), get_user_registry())
+            # Capture and recognition run on their own threads, always on the latest frame
+            pipeline = RecognitionPipeline(cap, roster.recognizer(sfr, recognize, cap)).start()
+            for frame, face_locations, face_names in pipeline.results():
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
-            for face_loc, name in zip(face_locations, face_names):
-                if name not in st.session_state['recognized_names']:
-                    st.session_state['recognized_names'].add(name)
-                    log_attendance(name, st.session_state['user_data']['enrollment'])
+                for face_loc, name in zip(face_locations, face_names):
+                    if name not in st.session_state['recognized_names']:
+                        st.session_state['recognized_names'].add(name)
+                        log_attendance(name, st.session_state['user_data']['enrollment'])
 
-            st.image(rgb_frame)
+                st.image(rgb_frame)
+            st.write("Failed to capture frame.")
+            pipeline.stop()
         cap.release()
@@ -0,0 +1,304 @@
+import argparse
+import csv
+from datetime import date, datetime
+
+import yaml
+from class_roster import as_index, load_timetable_index, timetable_classes
+from user_registry import registry_from_config
+
+# Counters kept up to date by AttendanceStore in the transaction of every new mark
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS student_subject_counts (
+    student_id TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    marks INTEGER NOT NULL,
+    last_date TEXT NOT NULL,
+    PRIMARY KEY (student_id, subject)
+);
+CREATE TABLE IF NOT EXISTS daily_counts (
+    date TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    marks INTEGER NOT NULL,
+    PRIMARY KEY (date, subject)
+);
+CREATE TABLE IF NOT EXISTS lectures (
+    subject TEXT NOT NULL,
+    slot TEXT NOT NULL,
+    date TEXT NOT NULL,
+    PRIMARY KEY (subject, slot)
+);
+CREATE TABLE IF NOT EXISTS subject_counts (
+    subject TEXT PRIMARY KEY,
+    lectures INTEGER NOT NULL,
+    marks INTEGER NOT NULL
+);
+"""
+
+# Bumped when the counters change meaning, so existing databases recompute them once
+COUNTERS_VERSION = 2
+
+# Slots of real lectures. Records migrated from before slots existed have the
+# date of the day (no time) or 'timestamp#id' as slot and are no lecture.
+LECTURE_SLOT = "instr(slot, '#') = 0 AND instr(slot, ' ') > 0"
+
+# Rows of the reports, in column order
+STUDENT_COLUMNS = ["student_id", "subject", "marks", "lectures", "percentage", "last_date"]
+DAILY_COLUMNS = ["date", "subject", "marks"]
+SUBJECT_COLUMNS = ["subject", "lectures", "marks"]
+RECORD_COLUMNS = ["id", "student_id", "subject", "slot", "timestamp"]
+
+
+def where_clause(filters):
+    """
+    :param filters: (column, operator, value) triples; those with value None are left out.
+    :return: (WHERE clause or "", parameters)
+    """
+    filters = [(column, operator, value) for column, operator, value in filters if value is not None]
+    if not filters:
+        return "", []
+    return "WHERE " + " AND ".join(f"{column} {operator} ?" for column, operator, _ in filters), \
+        [value for _, _, value in filters]
+
+
+def is_lecture_slot(slot):
+    return "#" not in slot and " " in slot
+
+
+def create_counters(connection):
+    """
+    Create the counter tables. Databases that already hold attendance, or
+    whose counters were computed by an earlier version, get their counters
+    computed from the attendance table once.
+    """
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    with connection:
+        connection.executescript(SCHEMA)
+        if version < COUNTERS_VERSION:
+            rebuild_counters(connection)
+            connection.execute(f"PRAGMA user_version = {COUNTERS_VERSION}")
+
+
+def rebuild_counters(connection):
+    """
+    Recompute every counter from the attendance table. Only needed once per database.
+    """
+    for table in ("student_subject_counts", "daily_counts", "lectures", "subject_counts"):
+        connection.execute(f"DELETE FROM {table}")
+    connection.execute("INSERT INTO student_subject_counts SELECT student_id, subject, COUNT(*), MAX(date) "
+                       "FROM attendance GROUP BY student_id, subject")
+    connection.execute("INSERT INTO daily_counts SELECT date, subject, COUNT(*) FROM attendance GROUP BY date, subject")
+    connection.execute("INSERT INTO lectures SELECT subject, slot, MIN(date) FROM attendance "
+                       f"WHERE {LECTURE_SLOT} GROUP BY subject, slot")
+    connection.execute(f"INSERT INTO subject_counts SELECT subject, COUNT(DISTINCT CASE WHEN {LECTURE_SLOT} "
+                       "THEN slot END), COUNT(*) FROM attendance GROUP BY subject")
+
+
+def count_mark(connection, record):
+    """
+    Add a new (not duplicate) mark to the counters, in the caller's transaction.
+    A lecture is counted as held the first time anyone is marked for its subject
+    and slot; migrated slots are no lecture (see LECTURE_SLOT).
+    """
+    student_id, subject, slot, date = record["student_id"], record["subject"], record["slot"], record["timestamp"][:10]
+    connection.execute("INSERT INTO student_subject_counts VALUES (?, ?, 1, ?) ON CONFLICT (student_id, subject) "
+                       "DO UPDATE SET marks = marks + 1, last_date = MAX(last_date, excluded.last_date)",
+                       (student_id, subject, date))
+    connection.execute("INSERT INTO daily_counts VALUES (?, ?, 1) ON CONFLICT (date, subject) "
+                       "DO UPDATE SET marks = marks + 1", (date, subject))
+    new_lecture = 0
+    if is_lecture_slot(slot):
+        new_lecture = connection.execute("INSERT OR IGNORE INTO lectures VALUES (?, ?, ?)",
+                                         (subject, slot, date)).rowcount
+    connection.execute("INSERT INTO subject_counts VALUES (?, ?, 1) ON CONFLICT (subject) "
+                       "DO UPDATE SET lectures = lectures + excluded.lectures, marks = marks + 1",
+                       (subject, new_lecture))
+
+
+class AttendanceAnalytics:
+    """
+    Attendance reports read from the counters of an attendance database, so
+    their cost depends on the number of students and subjects, not on the
+    length of the history. Report methods return iterators over the rows of
+    a database cursor, so even semester-long reports are never held in
+    memory at once.
+    """
+
+    def __init__(self, store, timetable=None, users=None, term_start=None, term_end=None):
+        """
+        :param store: AttendanceStore, which keeps the counters up to date.
+        :param timetable: TimetableIndex (or timetables) to count the lectures each class had.
+            Without it, the lectures of a subject are the slots anyone was marked in.
+        :param users: UserRegistry giving the class of every student, needed with a timetable.
+        :param term_start: First date lectures are counted from ('%Y-%m-%d'), the first
+            date anyone was marked on by default.
+        :param term_end: Last date lectures are counted to ('%Y-%m-%d'), today by default.
+        """
+        self.store = store
+        self.timetable = as_index(timetable) if timetable is not None else None
+        self.users = users
+        self.term_start = term_start
+        self.term_end = term_end
+
+    def rows(self, sql, params=()):
+        for row in self.store.reader().execute(sql, params):
+            yield dict(row)
+
+    def term(self):
+        """
+        :return: (first, last) date lectures are counted over, first is None before any mark.
+        """
+        start = self.term_start or self.store.reader().execute("SELECT MIN(date) FROM daily_counts").fetchone()[0]
+        end = self.term_end or date.today().strftime('%Y-%m-%d')
+        if start is None:
+            return None, None
+        return datetime.strptime(start, '%Y-%m-%d').date(), datetime.strptime(end, '%Y-%m-%d').date()
+
+    def class_lectures(self, student_id, subject, term, classes, held):
+        """
+        Lectures of a subject the class of a student had during the term.
+        :param classes: Timetable classes per student, filled in for one report.
+        :param held: Lectures per class and subject, filled in for one report.
+        :return: Number of lectures, or None without timetable, class or lectures of the subject.
+        """
+        if self.timetable is None or self.users is None or term[0] is None:
+            return None
+        if student_id not in classes:
+            user = self.users.get(student_id)
+            classes[student_id] = timetable_classes(self.timetable, user) if user else []
+        # A branch matches every section of its semester, take the section that has the subject
+        for class_name in classes[student_id]:
+            if (class_name, subject) not in held:
+                held[class_name, subject] = self.timetable.lectures_between(class_name, subject, *term)
+            if held[class_name, subject]:
+                return held[class_name, subject]
+        return None
+
+    def student_report(self, student_id=None, subject=None):
+        """
+        Marks and attendance percentage per student and subject. With a timetable,
+        the lectures are those the student's class had of the subject during the
+        term, attended by anyone or not. Otherwise, and for students without a
+        class in the timetable, they are the lectures of the subject anyone was
+        marked in, which merges the classes that share a subject.
+        """
+        where, params = where_clause([("c.student_id", "=", student_id), ("c.subject", "=", subject)])
+        rows = self.rows("SELECT c.student_id, c.subject, c.marks, s.lectures, c.last_date "
+                         f"FROM student_subject_counts c JOIN subject_counts s ON s.subject = c.subject {where} "
+                         "ORDER BY c.student_id, c.subject", params)
+        term, classes, held = self.term(), {}, {}
+        for row in rows:
+            lectures = self.class_lectures(row["student_id"], row["subject"], term, classes, held)
+            if lectures is not None:
+                row["lectures"] = lectures
+            row["percentage"] = round(100.0 * row["marks"] / row["lectures"], 1) if row["lectures"] else None
+            yield {column: row[column] for column in STUDENT_COLUMNS}
+
+    def subject_report(self):
+        """
+        Lectures anyone was marked in and marks per subject.
+        """
+        return self.rows("SELECT subject, lectures, marks FROM subject_counts ORDER BY subject")
+
+    def daily_report(self, date_from=None, date_to=None, subject=None):
+        """
+        Marks per day and subject.
+        :param date_from: First date included ('%Y-%m-%d').
+        :param date_to: Last date included ('%Y-%m-%d').
+        """
+        where, params = where_clause([("date", ">=", date_from), ("date", "<=", date_to), ("subject", "=", subject)])
+        return self.rows(f"SELECT date, subject, marks FROM daily_counts {where} ORDER BY date, subject", params)
+
+    def records(self, date_from=None, date_to=None, subject=None):
+        """
+        Raw attendance records in id order, for a full history export.
+        """
+        where, params = where_clause([("date", ">=", date_from), ("date", "<=", date_to), ("subject", "=", subject)])
+        return self.rows(f"SELECT id, student_id, subject, slot, timestamp FROM attendance {where} ORDER BY id",
+                         params)
+
+
+def export_csv(rows, columns, path):
+    """
+    Write report rows to a CSV file one row at a time.
+    :return: Number of rows written.
+    """
+    count = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([row[column] for column in columns])
+            count += 1
+    return count
+
+
+def export_xlsx(rows, columns, path, title="Attendance"):
+    """
+    Write report rows to an Excel file with openpyxl's write-only mode, which
+    streams rows to disk instead of building the sheet in memory.
+    :return: Number of rows written.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ImportError("Excel export needs openpyxl: pip install openpyxl")
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append(columns)
+    count = 0
+    for row in rows:
+        sheet.append([row[column] for column in columns])
+        count += 1
+    workbook.save(path)
+    return count
+
+
+def export(rows, columns, path, title="Attendance"):
+    """
+    Export report rows as CSV or Excel, chosen by the file extension.
+    """
+    if path.endswith(".xlsx"):
+        return export_xlsx(rows, columns, path, title)
+    return export_csv(rows, columns, path)
+
+
+def analytics_from_config(store, cfg):
+    """
+    AttendanceAnalytics counting the lectures of every class from the timetable
+    of the CLASSROOM section, with the students of the user registry of PATH.
+    """
+    classroom = cfg['CLASSROOM']
+    return AttendanceAnalytics(store, load_timetable_index(classroom['TIMETABLE_PATH']),
+                               registry_from_config(cfg['PATH']), classroom.get('TERM_START'),
+                               classroom.get('TERM_END'))
+
+
+if __name__ == "__main__":
+    from attendance_store import AttendanceStore
+
+    cfg = yaml.load(open('config.yaml', 'r'), Loader=yaml.FullLoader)
+
+    parser = argparse.ArgumentParser(description="Export attendance reports as CSV or Excel.")
+    parser.add_argument("report", choices=["students", "subjects", "daily", "records"])
+    parser.add_argument("output", help="Output file, .csv or .xlsx")
+    parser.add_argument("--db", default=cfg['PATH']['ATTENDANCE_DB'], help="Attendance database")
+    parser.add_argument("--student", help="Only this student (students report)")
+    parser.add_argument("--subject", help="Only this subject")
+    parser.add_argument("--from", dest="date_from", help="First date, YYYY-MM-DD (daily and records reports)")
+    parser.add_argument("--to", dest="date_to", help="Last date, YYYY-MM-DD (daily and records reports)")
+    args = parser.parse_args()
+
+    store = AttendanceStore(args.db)
+    analytics = analytics_from_config(store, cfg)
+    if args.report == "students":
+        rows, columns = analytics.student_report(args.student, args.subject), STUDENT_COLUMNS
+    elif args.report == "subjects":
+        rows, columns = analytics.subject_report(), SUBJECT_COLUMNS
+    elif args.report == "daily":
+        rows, columns = analytics.daily_report(args.date_from, args.date_to, args.subject), DAILY_COLUMNS
+    else:
+        rows, columns = analytics.records(args.date_from, args.date_to, args.subject), RECORD_COLUMNS
+    count = export(rows, columns, args.output, title=args.report.capitalize())
+    store.close()
+    print(f"Wrote {count} rows to {args.output}.")
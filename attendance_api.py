@@ -0,0 +1,119 @@
+from datetime import datetime
+
+# Page size of GET /attendance
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Most records accepted by one POST /mark-attendance/bulk
+MAX_BULK_RECORDS = 1000
+
+
+class RequestError(ValueError):
+    """
+    Invalid request, answered with `status` and the message as error.
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def validate_record(data):
+    """
+    Check an attendance record of a request and fill in its timestamp.
+    :return: (record, error), one of them None.
+    """
+    if not isinstance(data, dict) or not data.get('student_id') or not data.get('subject'):
+        return None, "Missing student_id or subject"
+    # Without a slot, the second lecture of a subject on a day would be taken for a duplicate
+    if not data.get('slot'):
+        return None, "Missing slot, expected the start of the lecture (YYYY-MM-DD HH:MM)"
+    timestamp = data.get('timestamp') or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError):
+        return None, "Invalid timestamp, expected YYYY-MM-DD HH:MM:SS"
+    return {"student_id": str(data['student_id']), "subject": str(data['subject']), "timestamp": timestamp,
+            "slot": str(data['slot'])}, None
+
+
+def single_record(data):
+    """
+    Record of a POST /mark-attendance body.
+    :raises RequestError: If the record is invalid.
+    """
+    record, error = validate_record(data)
+    if error:
+        raise RequestError(error)
+    return record
+
+
+def single_response(record):
+    if record["duplicate"]:
+        return {"message": "Attendance already marked.", "record": record}
+    return {"message": "Attendance marked successfully!", "record": record}
+
+
+def bulk_records(data):
+    """
+    Split the records of a POST /mark-attendance/bulk body.
+    :return: (valid records, rejected), rejected holding the index and error of every invalid record.
+    :raises RequestError: If the body has no list of records or too many.
+    """
+    records = data.get('records') if isinstance(data, dict) else None
+    if not isinstance(records, list):
+        raise RequestError("Missing records")
+    if len(records) > MAX_BULK_RECORDS:
+        raise RequestError(f"At most {MAX_BULK_RECORDS} records per request", 413)
+
+    valid, rejected = [], []
+    for index, item in enumerate(records):
+        record, error = validate_record(item)
+        if error:
+            rejected.append({"index": index, "error": error})
+        else:
+            valid.append(record)
+    return valid, rejected
+
+
+def bulk_response(stored, rejected):
+    return {
+        "accepted": [r for r in stored if not r["duplicate"]],
+        "duplicates": [r for r in stored if r["duplicate"]],
+        "rejected": rejected,
+    }
+
+
+def query_params(args):
+    """
+    Keyword arguments of AttendanceStore.query from the GET /attendance query parameters.
+    :raises RequestError: On an invalid limit, cursor or date.
+    """
+    try:
+        limit = min(int(args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        cursor = int(args['cursor']) if args.get('cursor') else None
+        for key in ('from', 'to'):
+            if args.get(key):
+                datetime.strptime(args[key], '%Y-%m-%d')
+    except ValueError:
+        raise RequestError("Invalid limit, cursor or date")
+    if limit < 1:
+        raise RequestError("Invalid limit, cursor or date")
+    return {"student_id": args.get('student_id'), "subject": args.get('subject'),
+            "date_from": args.get('from') or None, "date_to": args.get('to') or None,
+            "cursor": cursor, "limit": limit}
+
+
+def query_response(records, next_cursor):
+    return {"records": records, "next_cursor": next_cursor}
+
+
+def report_params(args):
+    """
+    Keyword arguments of AttendanceAnalytics.student_report from the GET /attendance/report query parameters.
+    """
+    return {"student_id": args.get('student_id') or None, "subject": args.get('subject') or None}
+
+
+def report_response(rows):
+    return {"report": list(rows)}
@@ -0,0 +1,276 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class AttendanceClient:
+    """
+    Sends attendance to backend.py without blocking the recognition loop.
+    submit() only appends the record to an on-disk spool; a background
+    thread sends the spool in order, in batches, to the bulk endpoint over
+    one keep-alive session. When the backend is down the records stay in
+    the spool and are sent when it comes back, also after a restart.
+    Marks are idempotent per student, subject and slot, so records that are
+    sent twice (e.g. after a crash between sending and recording it) are
+    harmless. Batches the backend refuses as malformed (4xx) are never
+    retried: they are moved to a `.rejected` file next to the spool, like
+    spool lines that cannot be read (e.g. half written before a crash).
+
+    One spool file must only be used by one process at a time.
+    """
+
+    def __init__(self, base_url="http://localhost:5001", spool_path="dataset/attendance_spool.jsonl",
+                 batch_size=100, flush_interval=0.5, timeout=5.0, max_backoff=30.0):
+        """
+        :param base_url: Address of backend.py.
+        :param spool_path: JSON lines file of the records not sent yet.
+        :param batch_size: Most records sent in one request.
+        :param flush_interval: Seconds the sender waits for more records before sending.
+        :param timeout: Seconds before a request to the backend is given up.
+        :param max_backoff: Longest wait between attempts while the backend is unreachable.
+        """
+        self.url = base_url.rstrip("/") + "/mark-attendance/bulk"
+        self.spool_path = spool_path
+        # Byte offset of the first record not sent yet, so a restart does not send everything again
+        self.offset_path = spool_path + ".offset"
+        # Batches refused by the backend, kept for inspection
+        self.rejected_path = spool_path + ".rejected"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        if os.path.dirname(spool_path):
+            os.makedirs(os.path.dirname(spool_path), exist_ok=True)
+
+        # Connection errors and 5xx answers are retried inside the request as well
+        self.session = requests.Session()
+        retry = Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504), allowed_methods=None)
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=4, max_retries=retry))
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=4, max_retries=retry))
+
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.idle = threading.Condition(self.lock)
+        self.stopped = False
+        self.last_error = None
+        # Records submitted since the last send, the sender is woken early once a batch is full
+        self.unsent = 0
+        self.stats = {"submitted": 0, "batches": 0, "sent": 0, "duplicates": 0, "rejected": 0, "failures": 0,
+                      "quarantined": 0}
+        self.sender = threading.Thread(target=self.send_loop, daemon=True)
+        self.sender.start()
+
+    def submit(self, student_id, subject, slot, timestamp=None):
+        """
+        Queue an attendance record. Returns as soon as the record is in the spool.
+        :param slot: Lecture slot, e.g. timetable_index.lecture_slot; records of the same
+            student, subject and slot are marked once.
+        :param timestamp: Time of the sighting (default: now).
+        :return: The queued record.
+        """
+        record = {"student_id": student_id, "subject": subject, "slot": slot,
+                  "timestamp": timestamp or datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        with self.lock:
+            with open(self.spool_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.stats["submitted"] += 1
+            self.unsent += 1
+            full = self.unsent >= self.batch_size
+        # Otherwise the sender sends within flush_interval, together with whatever else arrives
+        if full:
+            self.wakeup.set()
+        return record
+
+    def read_offset(self):
+        try:
+            with open(self.offset_path) as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def write_offset(self, offset):
+        tmp_path = self.offset_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(offset))
+        os.replace(tmp_path, self.offset_path)
+
+    def next_batch(self):
+        """
+        Oldest records not sent yet. Lines that are no record (e.g. half written
+        before a crash) are moved to the rejected file. Called with the lock held.
+        :return: (records, end offset)
+        """
+        offset = self.read_offset()
+        records, corrupt = [], []
+        if not os.path.exists(self.spool_path):
+            return records, offset
+        with open(self.spool_path) as f:
+            f.seek(offset)
+            while len(records) < self.batch_size:
+                line = f.readline()
+                # A line without newline is still being written
+                if not line.endswith("\n"):
+                    break
+                offset = f.tell()
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if isinstance(record, dict):
+                    records.append(record)
+                else:
+                    corrupt.append(line)
+        if corrupt:
+            self.reject_lines(corrupt)
+            print(f"{len(corrupt)} unreadable lines of the attendance spool moved to {self.rejected_path}")
+            if not records:
+                self.write_offset(offset)
+        return records, offset
+
+    def send_loop(self):
+        backoff = self.flush_interval
+        while True:
+            self.wakeup.wait(backoff if self.last_error else self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.send_pending()
+                backoff = self.flush_interval
+            except Exception as error:
+                # Backend down, overloaded or answering with an error or an unexpected body: try again
+                # later. Whatever goes wrong, the sender lives on, or the spool would only grow
+                self.last_error = error
+                self.stats["failures"] += 1
+                backoff = min(backoff * 2, self.max_backoff)
+            if self.stopped:
+                return
+
+    def send_pending(self):
+        """
+        Send batches until the spool is empty.
+        :raises requests.RequestException: If the backend is unreachable or fails.
+        :raises ValueError: If its answer is not the one of the bulk endpoint.
+        """
+        while True:
+            with self.lock:
+                records, offset = self.next_batch()
+                if not records:
+                    self.truncate()
+                    self.idle.notify_all()
+                    return
+            response = self.session.post(self.url, json={"records": records}, timeout=self.timeout)
+            if is_refused(response):
+                # Sending the batch again would be refused again
+                self.quarantine(records, offset, response)
+                continue
+            response.raise_for_status()
+            result = bulk_result(response)
+            self.last_error = None
+            with self.lock:
+                self.write_offset(offset)
+                self.unsent = max(0, self.unsent - len(records))
+            self.stats["batches"] += 1
+            self.stats["sent"] += len(result["accepted"])
+            self.stats["duplicates"] += len(result["duplicates"])
+            self.stats["rejected"] += len(result["rejected"])
+            for rejected in result["rejected"]:
+                # The backend will never accept these, so they are dropped
+                print(f"Attendance record rejected: {rejected}")
+
+    def reject_lines(self, lines):
+        """
+        Append spool lines to the rejected file. Called with the lock held.
+        """
+        with open(self.rejected_path, "a") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self.stats["quarantined"] += len(lines)
+
+    def quarantine(self, records, offset, response):
+        """
+        Move a batch the backend refused to the rejected file and skip it in the spool.
+        """
+        with self.lock:
+            self.reject_lines([json.dumps(record) + "\n" for record in records])
+            self.write_offset(offset)
+            self.unsent = max(0, self.unsent - len(records))
+        print(f"Attendance batch of {len(records)} records refused by the backend "
+              f"({response.status_code} {response.text.strip()}), moved to {self.rejected_path}")
+
+    def truncate(self):
+        """
+        Empty the spool once everything in it was sent. Called with the lock held.
+        """
+        if os.path.exists(self.spool_path) and os.path.getsize(self.spool_path) > 0:
+            open(self.spool_path, "w").close()
+            self.write_offset(0)
+
+    def pending(self):
+        """
+        Number of records not sent yet.
+        """
+        with self.lock:
+            offset = self.read_offset()
+            if not os.path.exists(self.spool_path):
+                return 0
+            with open(self.spool_path) as f:
+                f.seek(offset)
+                return sum(1 for _ in f)
+
+    def flush(self, timeout=None):
+        """
+        Wait until the spool is empty.
+        :return: True if everything was sent, False on timeout (e.g. the backend is down).
+        """
+        self.wakeup.set()
+        with self.lock:
+            return self.idle.wait_for(lambda: self.read_offset() == 0 and not self.spool_size(), timeout)
+
+    def spool_size(self):
+        return os.path.getsize(self.spool_path) if os.path.exists(self.spool_path) else 0
+
+    def close(self, timeout=5.0):
+        """
+        Try to send what is left and stop the sender. Unsent records stay in the spool.
+        """
+        self.flush(timeout)
+        self.stopped = True
+        self.wakeup.set()
+        self.sender.join(timeout)
+        self.session.close()
+
+
+def is_refused(response):
+    """
+    Whether the backend refused a request for what it contains (4xx). Timeouts
+    and rate limits are answered with 4xx as well, but are worth retrying.
+    """
+    return 400 <= response.status_code < 500 and response.status_code not in (408, 429)
+
+
+def bulk_result(response):
+    """
+    Body of an answer of the bulk endpoint, checked before it is used.
+    :raises ValueError: If it is no such answer, e.g. the page of a proxy.
+    """
+    result = response.json()
+    if not isinstance(result, dict) or not all(isinstance(result.get(key), list)
+                                               for key in ("accepted", "duplicates", "rejected")):
+        raise ValueError(f"Unexpected answer of the backend: {response.text[:200]}")
+    return result
+
+
+def attendance_client_from_config(section):
+    """
+    :param section: CLIENT section of config.yaml.
+    """
+    return AttendanceClient(base_url=section['BACKEND_URL'], spool_path=section['SPOOL_PATH'],
+                            batch_size=section['BATCH_SIZE'], flush_interval=section['FLUSH_INTERVAL'],
+                            timeout=section['TIMEOUT'])
@@ -0,0 +1,226 @@
+import os
+import queue
+import sqlite3
+import threading
+
+from attendance_analytics import count_mark, create_counters
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    date TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    slot TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS attendance_student_page ON attendance (student_id, id);
+CREATE INDEX IF NOT EXISTS attendance_subject_page ON attendance (subject, id);
+CREATE INDEX IF NOT EXISTS attendance_date ON attendance (date);
+"""
+
+# Indexes of earlier versions, replaced by the ones above: pages are cut by id, not date
+OLD_INDEXES = ("attendance_student", "attendance_subject")
+
+# A student is marked once per subject and slot; repeated marks are duplicates
+UNIQUE_MARK = "CREATE UNIQUE INDEX IF NOT EXISTS attendance_mark ON attendance (student_id, subject, slot)"
+
+
+def migrate(connection):
+    """
+    Add the slot column to databases created before it existed. Old records
+    get their date as slot; earlier duplicates of the same day are kept
+    apart by their timestamp, so the unique index can be created.
+    """
+    columns = [row[1] for row in connection.execute("PRAGMA table_info(attendance)")]
+    if "slot" in columns:
+        return
+    with connection:
+        connection.execute("ALTER TABLE attendance ADD COLUMN slot TEXT NOT NULL DEFAULT ''")
+        connection.execute("UPDATE attendance SET slot = timestamp || '#' || id")
+        connection.execute("UPDATE attendance SET slot = date WHERE id IN "
+                           "(SELECT MIN(id) FROM attendance GROUP BY student_id, subject, date)")
+
+
+def page_query(student_id=None, subject=None, date_from=None, date_to=None, cursor=None, limit=100):
+    """
+    SQL of one page of AttendanceStore.query, with one row more than the page
+    to tell whether another page follows. Student and subject pages walk the
+    (student_id, id) and (subject, id) indexes backwards, so no page is sorted.
+    :return: (sql, params)
+    """
+    conditions, params = [], []
+    for column, operator, value in (("student_id", "=", student_id), ("subject", "=", subject),
+                                    ("date", ">=", date_from), ("date", "<=", date_to), ("id", "<", cursor)):
+        if value is not None:
+            conditions.append(f"{column} {operator} ?")
+            params.append(value)
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+    return (f"SELECT id, student_id, subject, slot, timestamp FROM attendance {where} ORDER BY id DESC LIMIT ?",
+            params + [limit + 1])
+
+
+class PendingWrite:
+    """
+    Records waiting for the writer thread, and the ids they were given.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.ids = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class AttendanceStore:
+    """
+    Attendance records in an embedded SQLite database. The database runs in
+    WAL mode so reads never wait for writes, and all writes go through one
+    writer thread that commits whatever arrived while the previous commit
+    was running in a single transaction (group commit). Every write still
+    returns only once it is committed.
+    """
+
+    def __init__(self, path="dataset/attendance.db", max_batch=500):
+        """
+        :param path: SQLite database file, created if missing.
+        :param max_batch: Most records committed in one transaction.
+        """
+        self.path = path
+        self.max_batch = max_batch
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        connection = self.connect()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        for name in OLD_INDEXES:
+            connection.execute(f"DROP INDEX IF EXISTS {name}")
+        migrate(connection)
+        connection.execute(UNIQUE_MARK)
+        create_counters(connection)
+        connection.close()
+
+        # Connections can only be used on the thread that opened them
+        self.local = threading.local()
+        self.pending = queue.Queue()
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        # With WAL, NORMAL only syncs at checkpoints and stays safe against corruption
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def reader(self):
+        if getattr(self.local, "connection", None) is None:
+            self.local.connection = self.connect()
+        return self.local.connection
+
+    def write_loop(self):
+        connection = self.connect()
+        while True:
+            writes = [self.pending.get()]
+            if writes[0] is None:
+                break
+            # Take everything that queued up while the last commit was running
+            count = len(writes[0].records)
+            while count < self.max_batch:
+                try:
+                    write = self.pending.get_nowait()
+                except queue.Empty:
+                    break
+                if write is None:
+                    self.pending.put(None)
+                    break
+                writes.append(write)
+                count += len(write.records)
+            self.commit(connection, writes)
+        connection.close()
+
+    def commit(self, connection, writes):
+        """
+        Commit writes in one transaction. Whatever goes wrong, every write is
+        marked done, so no caller waits forever and the writer thread lives on.
+        """
+        try:
+            with connection:
+                for write in writes:
+                    write.ids = [self.insert(connection, record) for record in write.records]
+        except Exception as error:
+            if len(writes) > 1:
+                # Commit them one by one, so a bad record only fails its own write
+                for write in writes:
+                    self.commit(connection, [write])
+                return
+            writes[0].error = error
+        for write in writes:
+            write.done.set()
+
+    @staticmethod
+    def insert(connection, record):
+        """
+        Insert a record unless the student is already marked for its subject and slot,
+        and count new marks in the analytics counters (see attendance_analytics.py).
+        :return: (id, stored), stored being the earlier record for duplicates and None otherwise.
+        """
+        key = (record["student_id"], record["subject"], record["slot"])
+        cursor = connection.execute(
+            "INSERT OR IGNORE INTO attendance (student_id, subject, date, timestamp, slot) VALUES (?, ?, ?, ?, ?)",
+            key[:2] + (record["timestamp"][:10], record["timestamp"], key[2]))
+        if cursor.rowcount:
+            record_id = cursor.lastrowid
+            count_mark(connection, record)
+            return record_id, None
+        row = connection.execute("SELECT id, student_id, subject, slot, timestamp FROM attendance "
+                                 "WHERE student_id = ? AND subject = ? AND slot = ?", key).fetchone()
+        return row["id"], dict(row)
+
+    def add_many(self, records):
+        """
+        Store attendance records and wait until they are committed. Marking a
+        student again for the same subject and slot is idempotent.
+        :param records: Dicts with student_id, subject, timestamp ('%Y-%m-%d %H:%M:%S')
+            and slot, the lecture the student is marked for (e.g. its start, see timetable_index.SLOT_FORMAT).
+        :return: The records with their id and a duplicate flag, in the order given. Duplicates
+            are the record stored by the earlier mark, with its timestamp.
+        :raises ValueError: If a record has no slot.
+        """
+        if any(not record.get("slot") for record in records):
+            raise ValueError("Attendance records need a slot")
+        write = PendingWrite(records)
+        self.pending.put(write)
+        write.done.wait()
+        if write.error is not None:
+            raise write.error
+        return [dict(stored or record, id=record_id, duplicate=stored is not None)
+                for record, (record_id, stored) in zip(records, write.ids)]
+
+    def add(self, student_id, subject, timestamp, slot):
+        return self.add_many([{"student_id": student_id, "subject": subject, "timestamp": timestamp,
+                               "slot": slot}])[0]
+
+    def query(self, student_id=None, subject=None, date_from=None, date_to=None, cursor=None, limit=100):
+        """
+        One page of records, newest first. Pages are cut by id (keyset
+        pagination), so records added meanwhile do not shift the following
+        pages. Pages of a student or subject are read from an index in id
+        order and cost the same however deep they are; pages filtered only
+        by date sort the records of the date range.
+        :param date_from: First date included ('%Y-%m-%d').
+        :param date_to: Last date included ('%Y-%m-%d').
+        :param cursor: next_cursor of the previous page, or None for the first page.
+        :param limit: Records per page.
+        :return: (records, next_cursor), next_cursor is None on the last page.
+        """
+        sql, params = page_query(student_id, subject, date_from, date_to, cursor, limit)
+        rows = self.reader().execute(sql, params).fetchall()
+        records = [dict(row) for row in rows[:limit]]
+        next_cursor = records[-1]["id"] if len(rows) > limit else None
+        return records, next_cursor
+
+    def close(self):
+        self.pending.put(None)
+        self.writer.join()
@@ -1,34 +1,91 @@
-from flask import Flask, request, jsonify
-from datetime import datetime
+from flask import Blueprint, Flask, current_app, request, jsonify
+import yaml
+from attendance_analytics import AttendanceAnalytics, analytics_from_config
+from attendance_api import (RequestError, bulk_records, bulk_response, query_params, query_response,
+                            report_params, report_response, single_record, single_response)
+from attendance_store import AttendanceStore
 
-app = Flask(__name__)
+api = Blueprint("attendance_api", __name__)
 
-# Mock database for attendance
-attendance_records = []
 
-@app.route('/mark-attendance', methods=['POST'])
+def create_app(db_path=None):
+    """
+    The backend as a Flask app, e.g. for `flask --app backend run --port 5001`.
+    :param db_path: Attendance database. By default PATH.ATTENDANCE_DB of config.yaml, whose
+        timetable then counts the lectures of the reports.
+    """
+    app = Flask(__name__)
+    # Attendance database, see attendance_store.py
+    if db_path is not None:
+        store = AttendanceStore(db_path)
+        analytics = AttendanceAnalytics(store)
+    else:
+        cfg = yaml.load(open('config.yaml', 'r'), Loader=yaml.FullLoader)
+        store = AttendanceStore(cfg['PATH']['ATTENDANCE_DB'])
+        analytics = analytics_from_config(store, cfg)
+    app.extensions["attendance_store"] = store
+    app.extensions["attendance_analytics"] = analytics
+    app.register_blueprint(api)
+    return app
+
+
+def current_store():
+    return current_app.extensions["attendance_store"]
+
+
+@api.app_errorhandler(RequestError)
+def request_error(error):
+    return jsonify({"error": str(error)}), error.status
+
+
+@api.route('/mark-attendance', methods=['POST'])
 def mark_attendance():
     """
     Endpoint to mark attendance.
-    Expects `student_id` and `subject` in the POST request body.
+    Expects `student_id`, `subject` and `slot` (the start of the lecture) in the
+    POST request body, and optionally `timestamp` (default: now). A student is
+    marked once per subject and slot, marking again returns the earlier record.
     """
-    data = request.json
-    student_id = data.get('student_id')
-    subject = data.get('subject')
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-    if not student_id or not subject:
-        return jsonify({"error": "Missing student_id or subject"}), 400
+    record = single_record(request.json)
 
     # Save attendance
-    attendance_records.append({
-        "student_id": student_id,
-        "subject": subject,
-        "timestamp": timestamp
-    })
+    return jsonify(single_response(current_store().add_many([record])[0]))
 
-    return jsonify({"message": "Attendance marked successfully!", "attendance_records": attendance_records})
+
+@api.route('/mark-attendance/bulk', methods=['POST'])
+def mark_attendance_bulk():
+    """
+    Endpoint to mark the attendance of many students in one request.
+    Expects `records`, a list of records as for /mark-attendance (at most MAX_BULK_RECORDS).
+    Responds with the `accepted` records, the `duplicates` as stored by the earlier mark, and
+    the `rejected` ones with their position in the list and the error.
+    """
+    valid, rejected = bulk_records(request.json)
+
+    # All valid records are committed in one transaction
+    stored = current_store().add_many(valid) if valid else []
+    return jsonify(bulk_response(stored, rejected))
+
+
+@api.route('/attendance', methods=['GET'])
+def list_attendance():
+    """
+    Endpoint to read attendance, newest first, one page at a time.
+    Optional query parameters: `student_id`, `subject`, `from` and `to` (dates as YYYY-MM-DD),
+    `limit` (at most MAX_PAGE_SIZE) and `cursor` (the `next_cursor` of the previous page).
+    """
+    return jsonify(query_response(*current_store().query(**query_params(request.args))))
+
+
+@api.route('/attendance/report', methods=['GET'])
+def attendance_report():
+    """
+    Endpoint to read attendance percentages per student and subject, from the analytics counters.
+    Optional query parameters: `student_id` and `subject`.
+    """
+    analytics = current_app.extensions["attendance_analytics"]
+    return jsonify(report_response(analytics.student_report(**report_params(request.args))))
 
 
 if __name__ == '__main__':
-    app.run(port=5001)
\ No newline at end of file
+    create_app().run(port=5001, threaded=True)
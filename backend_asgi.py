@@ -0,0 +1,184 @@
+import asyncio
+import collections
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import yaml
+from attendance_analytics import AttendanceAnalytics, analytics_from_config
+from attendance_api import (RequestError, bulk_records, bulk_response, query_params, query_response,
+                            report_params, report_response, single_record, single_response)
+from attendance_store import AttendanceStore
+
+class ReadCache:
+    """
+    Responses of GET requests by path and query string. A committed write
+    only drops the entries it can change: those whose student_id and
+    subject filters match one of the written records (reports only depend
+    on the subject, as every mark changes the lecture count of its subject).
+    Least recently used entries go first when full.
+    """
+
+    def __init__(self, size=1024):
+        self.size = size
+        # key -> (student_id filter, subject filter, body)
+        self.entries = collections.OrderedDict()
+        # Incremented by every write, so a read that overlapped one is not cached
+        self.writes = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        return entry[2]
+
+    def put(self, key, student_id, subject, body, writes):
+        """
+        :param writes: Value of `writes` when the read started.
+        """
+        if writes != self.writes:
+            return
+        self.entries[key] = (student_id, subject, body)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, records):
+        """
+        Drop the entries the written records can change.
+        """
+        self.writes += 1
+        students = {record["student_id"] for record in records}
+        subjects = {record["subject"] for record in records}
+        for key in [key for key, (student_id, subject, _) in self.entries.items()
+                    if (student_id is None or student_id in students) and (subject is None or subject in subjects)]:
+            del self.entries[key]
+
+
+class AttendanceApp:
+    """
+    The API of backend.py as a plain ASGI application, for many concurrent
+    clients. Writes are handed to the writer thread of AttendanceStore,
+    which commits the records of all concurrent requests in one transaction
+    (group commit). Run it with a single worker process, so all writes go
+    through that one writer:
+
+        uvicorn backend_asgi:create_app --factory --port 5001
+    """
+
+    def __init__(self, db_path, cache_size=1024, cfg=None):
+        """
+        :param cfg: config.yaml, to count lectures from its timetable (see analytics_from_config).
+        """
+        self.store = AttendanceStore(db_path)
+        self.analytics = analytics_from_config(self.store, cfg) if cfg else AttendanceAnalytics(self.store)
+        self.cache = ReadCache(cache_size)
+        self.readers = ThreadPoolExecutor(max_workers=4)
+        # Threads waiting for the store's writer, one per request being committed
+        self.writers = ThreadPoolExecutor(max_workers=64)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        try:
+            status, body = await self.route(scope, receive)
+        except RequestError as error:
+            status, body = error.status, json.dumps({"error": str(error)}).encode()
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.writers.shutdown()
+                self.readers.shutdown()
+                self.store.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def route(self, scope, receive):
+        """
+        :return: (status, JSON body bytes)
+        """
+        method, path = scope["method"], scope["path"]
+        if method == "POST" and path == "/mark-attendance":
+            record = single_record(await read_json(receive))
+            stored = await self.add_many([record])
+            return 200, json.dumps(single_response(stored[0])).encode()
+        if method == "POST" and path == "/mark-attendance/bulk":
+            valid, rejected = bulk_records(await read_json(receive))
+            stored = await self.add_many(valid) if valid else []
+            return 200, json.dumps(bulk_response(stored, rejected)).encode()
+        if method == "GET" and path == "/attendance":
+            params = query_params(dict(parse_qsl(scope["query_string"].decode())))
+            return 200, await self.cached_read(scope, params["student_id"], params["subject"],
+                                               lambda: query_response(*self.store.query(**params)))
+        if method == "GET" and path == "/attendance/report":
+            params = report_params(dict(parse_qsl(scope["query_string"].decode())))
+            # Percentages change with every mark of the subject, whoever the student is
+            return 200, await self.cached_read(scope, None, params["subject"],
+                                               lambda: report_response(self.analytics.student_report(**params)))
+        return 404, json.dumps({"error": "Not found"}).encode()
+
+    async def add_many(self, records):
+        """
+        Store records through the store's writer thread and drop the cached reads they change.
+        """
+        stored = await asyncio.get_running_loop().run_in_executor(self.writers, self.store.add_many, records)
+        self.cache.invalidate([record for record in stored if not record["duplicate"]])
+        return stored
+
+    async def cached_read(self, scope, student_id, subject, read):
+        """
+        Answer a GET request from the cache, or run `read` on a reader thread.
+        :param student_id: Student the response is filtered on, None for all.
+        :param subject: Subject the response is filtered on, None for all.
+        :param read: Callable returning the response as a JSON-serializable dict.
+        """
+        key = scope["path"] + "?" + scope["query_string"].decode()
+        body = self.cache.get(key)
+        if body is None:
+            writes = self.cache.writes
+            loop = asyncio.get_running_loop()
+            body = json.dumps(await loop.run_in_executor(self.readers, read)).encode()
+            self.cache.put(key, student_id, subject, body, writes)
+        return body
+
+
+async def read_json(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    try:
+        return json.loads(body or b"null")
+    except ValueError:
+        raise RequestError("Invalid JSON body")
+
+
+def create_app(db_path=None):
+    """
+    :param db_path: Attendance database. By default PATH.ATTENDANCE_DB of config.yaml, whose
+        timetable then counts the lectures of the reports.
+    """
+    if db_path is not None:
+        return AttendanceApp(db_path)
+    cfg = yaml.load(open('config.yaml', 'r'), Loader=yaml.FullLoader)
+    return AttendanceApp(cfg['PATH']['ATTENDANCE_DB'], cfg=cfg)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(create_app(), port=5001, log_level="warning")
@@ -0,0 +1,230 @@
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+import requests
+import yaml
+from class_roster import class_roster, load_timetable_index, room_slots
+from face_detectors import detector_from_config
+from face_quality import quality_gate_from_config
+from frame_source import open_source
+from simple_facerec import SimpleFacerec
+from timetable_index import SLOT_FORMAT
+from user_registry import registry_from_config
+
+
+class SlotAttendance:
+    """
+    Sightings of the students during one lecture slot of a recording.
+    """
+
+    def __init__(self, start, end, slot, timetable):
+        self.start = start
+        self.end = end
+        self.slot = slot
+        self.timetable = timetable
+        self.frames = 0
+        # name -> {"sightings", "votes", "first_seen", "last_seen", "best_distance"}
+        self.students = {}
+
+    def add(self, when, names, distances, margins, tolerance, min_margin):
+        """
+        Record the faces recognized on one frame. A sighting votes with its
+        confidence: 1 at distance 0, falling to 0 at the match tolerance.
+        Ambiguous matches (second-best person almost as close) do not vote.
+        """
+        self.frames += 1
+        seen = {}
+        for name, distance, margin in zip(names, distances, margins):
+            if name == "Unknown" or margin < min_margin:
+                continue
+            # Count a student once per frame, with the best of their faces
+            seen[name] = min(distance, seen.get(name, distance))
+        for name, distance in seen.items():
+            student = self.students.setdefault(name, {"sightings": 0, "votes": 0.0, "first_seen": when,
+                                                      "last_seen": when, "best_distance": distance})
+            student["sightings"] += 1
+            student["votes"] += 1.0 - distance / tolerance
+            student["last_seen"] = when
+            student["best_distance"] = min(student["best_distance"], distance)
+
+    def present(self, min_sightings=3, min_votes=1.0):
+        """
+        Students seen often and confidently enough to be marked present.
+        :return: Dict of name -> summary of their sightings.
+        """
+        return {name: {"sightings": s["sightings"], "confidence": round(float(s["votes"]) / s["sightings"], 3),
+                       "best_distance": round(float(s["best_distance"]), 4),
+                       "first_seen": s["first_seen"].strftime('%Y-%m-%d %H:%M:%S'),
+                       "last_seen": s["last_seen"].strftime('%Y-%m-%d %H:%M:%S')}
+                for name, s in sorted(self.students.items())
+                if s["sightings"] >= min_sightings and s["votes"] >= min_votes}
+
+    def summary(self, min_sightings=3, min_votes=1.0):
+        return {
+            "class": self.timetable["class"],
+            "semester": self.timetable["semester"],
+            "room": self.timetable["room"],
+            "subject": self.slot["subject"],
+            "teacher": self.slot.get("teacher"),
+            "start": self.start.strftime(SLOT_FORMAT),
+            "end": self.end.strftime(SLOT_FORMAT),
+            "frames": self.frames,
+            "students": self.present(min_sightings, min_votes),
+        }
+
+
+def recording_slots(timetables, room, start_time, end_time):
+    """
+    Lecture slots of a room overlapping a recording, with datetimes.
+    """
+    slots = []
+    day = start_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    while day < end_time:
+        for lecture in room_slots(timetables, room, day.strftime("%A")):
+            slot_start, slot_end = day + timedelta(minutes=lecture.start), day + timedelta(minutes=lecture.end)
+            if slot_start < end_time and slot_end > start_time:
+                slots.append(SlotAttendance(slot_start, slot_end, lecture.slot, lecture.timetable))
+        day += timedelta(days=1)
+    return slots
+
+
+class BatchAttendance:
+    """
+    Marks attendance from a whole lecture recording. Frames are sampled at a
+    fixed interval, faces are matched against the roster of the class in the
+    slot the frame falls in, and students are marked present once they were
+    recognized on enough frames with enough confidence.
+    """
+
+    def __init__(self, sfr, timetables, users, room, sample_every=1.0, min_sightings=3, min_votes=1.0,
+                 min_margin=0.03):
+        """
+        :param sfr: SimpleFacerec with the gallery loaded.
+        :param timetables: TimetableIndex, or timetables as returned by load_timetables.
+        :param users: UserRegistry, or list of user dicts, to find the students of each class.
+        :param room: Room the recording was made in.
+        :param sample_every: Seconds of video between the frames that are recognized.
+        :param min_sightings: Frames a student must be recognized on during a slot.
+        :param min_votes: Sum of the confidences of those sightings needed.
+        :param min_margin: Distance by which the best match must beat the second best to count.
+        """
+        self.sfr = sfr
+        self.timetables = timetables
+        self.users = users
+        self.room = room
+        self.sample_every = sample_every
+        self.min_sightings = min_sightings
+        self.min_votes = min_votes
+        self.min_margin = min_margin
+        self.stats = {"frames_read": 0, "frames_recognized": 0, "faces": 0, "seconds": 0.0}
+
+    def process(self, source):
+        """
+        :param source: FrameSource of the recording, see frame_source.py.
+        :return: List of SlotAttendance, one per lecture slot covered by the recording.
+        """
+        end_time = source.start_time + timedelta(seconds=getattr(source, "duration", 0) or 24 * 3600)
+        slots = recording_slots(self.timetables, self.room, source.start_time, end_time)
+        current = None
+        next_sample = 0.0
+        started = time.perf_counter()
+
+        while True:
+            # Frames that are not recognized are only grabbed, never converted to images
+            if not source.grab():
+                break
+            self.stats["frames_read"] += 1
+            if source.timestamp < next_sample:
+                continue
+            next_sample = source.timestamp + self.sample_every
+
+            when = source.frame_time()
+            slot = next((s for s in slots if s.start <= when < s.end), None)
+            if slot is None:
+                continue
+            if slot is not current:
+                # Match the class of the slot first, then the whole gallery
+                current = slot
+                self.sfr.set_candidates(class_roster(self.users, slot.timetable["class"], slot.timetable["semester"]))
+            ret, frame = source.retrieve()
+            if not ret:
+                continue
+
+            rgb_small_frame = self.sfr.prepare_frame(frame)
+            face_locations = self.sfr.locate_faces(rgb_small_frame)
+            face_encodings = self.sfr.encode_faces(rgb_small_frame, face_locations)
+            names, distances, margins = self.sfr.match_faces(face_encodings)
+            slot.add(when, names, distances, margins, self.sfr.matcher.tolerance, self.min_margin)
+            self.stats["frames_recognized"] += 1
+            self.stats["faces"] += len(face_locations)
+
+        self.stats["seconds"] = time.perf_counter() - started
+        return slots
+
+    def results(self, slots):
+        return [slot.summary(self.min_sightings, self.min_votes) for slot in slots if slot.frames]
+
+
+def post_attendance(results, url="http://localhost:5001/mark-attendance/bulk", batch_size=500):
+    """
+    Send the attendance of every slot to the backend's bulk endpoint. Records
+    are keyed by slot, so sending a recording again marks nobody twice.
+    :return: (accepted, duplicates) record counts.
+    """
+    records = [{"student_id": student_id, "subject": result["subject"], "slot": result["start"],
+                "timestamp": student["first_seen"]}
+               for result in results for student_id, student in result["students"].items()]
+    accepted = duplicates = 0
+    with requests.Session() as session:
+        for i in range(0, len(records), batch_size):
+            response = session.post(url, json={"records": records[i:i + batch_size]})
+            response.raise_for_status()
+            accepted += len(response.json()["accepted"])
+            duplicates += len(response.json()["duplicates"])
+    return accepted, duplicates
+
+
+if __name__ == "__main__":
+    cfg = yaml.load(open('config.yaml', 'r'), Loader=yaml.FullLoader)
+
+    parser = argparse.ArgumentParser(description="Mark attendance from a recorded lecture.")
+    parser.add_argument("video", help="Video file (or image folder) of the lecture")
+    parser.add_argument("--room", default=cfg['CLASSROOM']['ROOM'])
+    parser.add_argument("--start", help="Start of the recording, e.g. '2024-10-14 08:30' "
+                                        "(default: file modification time minus the video duration)")
+    parser.add_argument("--json", help="Write the attendance of every slot to this file")
+    parser.add_argument("--post", action="store_true", help="Send the attendance to the backend")
+    parser.add_argument("--url", default="http://localhost:5001/mark-attendance/bulk")
+    args = parser.parse_args()
+
+    batch_cfg = cfg['BATCH']
+    sfr = SimpleFacerec(index=cfg['MATCHING']['INDEX'], index_path=cfg['MATCHING']['INDEX_PATH'])
+    sfr.load_encoding_images("images/", cache_path=cfg['PATH']['PKL_PATH'], workers=cfg['ENCODING']['WORKERS'])
+    sfr.detector = detector_from_config(cfg['DETECTOR'])
+    sfr.quality_gate = quality_gate_from_config(cfg['QUALITY'])
+    sfr.frame_resizing = batch_cfg['FRAME_RESIZING']
+
+    start_time = datetime.strptime(args.start, '%Y-%m-%d %H:%M') if args.start else None
+    source = open_source(args.video, start_time=start_time)
+    batch = BatchAttendance(sfr, load_timetable_index(cfg['CLASSROOM']['TIMETABLE_PATH']),
+                            registry_from_config(cfg['PATH']), args.room,
+                            sample_every=batch_cfg['SAMPLE_EVERY'], min_sightings=batch_cfg['MIN_SIGHTINGS'],
+                            min_votes=batch_cfg['MIN_VOTES'], min_margin=batch_cfg['MIN_MARGIN'])
+    results = batch.results(batch.process(source))
+    source.release()
+
+    for result in results:
+        print(f"{result['start']} {result['subject']}: {len(result['students'])} students present "
+              f"({result['frames']} frames)")
+    print(batch.stats)
+    if sfr.quality_gate is not None:
+        print(sfr.quality_stats())
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.post:
+        accepted, duplicates = post_attendance(results, args.url)
+        print(f"{accepted} attendance records sent, {duplicates} were already marked.")
@@ -0,0 +1,142 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+
+def start_backend(db_path, port=0):
+    """
+    Run backend.py on a temporary database in a background thread.
+    :return: (server, base_url)
+    """
+    from backend import create_app
+
+    # The request log would cost more than the requests
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", port, create_app(db_path), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def start_asgi_backend(db_path, port=0):
+    """
+    Run backend_asgi.py under uvicorn on a temporary database in a background thread.
+    :return: (server, base_url)
+    """
+    import uvicorn
+    from backend_asgi import AttendanceApp
+
+    if not port:
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(AttendanceApp(db_path), host="127.0.0.1", port=port,
+                                           log_level="warning", access_log=False))
+    server.shutdown = lambda: setattr(server, "should_exit", True)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def make_records(count, slot):
+    return [{"student_id": f"{100000 + i}", "subject": "Benchmark", "slot": slot} for i in range(count)]
+
+
+def client(url, bodies):
+    """
+    Send request bodies one after the other over one keep-alive session.
+    """
+    with requests.Session() as session:
+        for body in bodies:
+            session.post(url, json=body).raise_for_status()
+
+
+def run_clients(url, bodies, concurrency):
+    """
+    Send request bodies from `concurrency` client processes. Clients run in
+    their own processes, so that the cost of the HTTP client itself does
+    not limit what is measured.
+    :return: Elapsed seconds.
+    """
+    chunks = [bodies[i::concurrency] for i in range(concurrency)]
+    with ProcessPoolExecutor(max_workers=concurrency) as executor:
+        # Start the processes before timing
+        list(executor.map(time.sleep, [0.1] * concurrency))
+        start = time.perf_counter()
+        list(executor.map(client, [url] * concurrency, chunks))
+        return time.perf_counter() - start
+
+
+def bench_single(url, records, concurrency=1):
+    """
+    One POST /mark-attendance per record.
+    """
+    return run_clients(f"{url}/mark-attendance", records, concurrency)
+
+
+def bench_bulk(url, records, batch_size, concurrency=1):
+    """
+    POST /mark-attendance/bulk with batch_size records per request.
+    """
+    batches = [{"records": records[i:i + batch_size]} for i in range(0, len(records), batch_size)]
+    return run_clients(f"{url}/mark-attendance/bulk", batches, concurrency)
+
+
+def result(path, records, seconds, requests_sent, concurrency):
+    return {"path": path, "records": records, "requests": requests_sent, "concurrency": concurrency,
+            "seconds": seconds, "records_per_s": records / seconds if seconds else None}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Single-record versus bulk attendance ingestion.")
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--batch", type=int, nargs="+", default=[60, 500], help="Records per bulk request")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16], help="Client processes")
+    parser.add_argument("--server", choices=["flask", "asgi"], default="flask",
+                        help="Backend started on a temporary database (backend.py or backend_asgi.py)")
+    parser.add_argument("--url", help="Benchmark a running backend instead of a temporary one")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = None
+        url = args.url
+        if url is None:
+            start = start_asgi_backend if args.server == "asgi" else start_backend
+            server, url = start(os.path.join(tmp, "attendance.db"))
+
+        # Every run uses its own slot, so no run sees duplicates of an earlier one
+        results = []
+        for concurrency in args.concurrency:
+            records = make_records(args.records, f"single-{concurrency}")
+            results.append(result("single", args.records, bench_single(url, records, concurrency),
+                                  args.records, concurrency))
+            for batch_size in args.batch:
+                records = make_records(args.records, f"bulk-{batch_size}-{concurrency}")
+                seconds = bench_bulk(url, records, batch_size, concurrency)
+                results.append(result(f"bulk/{batch_size}", args.records, seconds,
+                                      -(-args.records // batch_size), concurrency))
+
+            # Sending the same records again only finds duplicates
+            seconds = bench_bulk(url, records, args.batch[-1], concurrency)
+            results.append(result(f"bulk/{args.batch[-1]} retry", args.records, seconds,
+                                  -(-args.records // args.batch[-1]), concurrency))
+
+        if server is not None:
+            server.shutdown()
+
+    for r in results:
+        print("{path:18s} {records} records in {requests} requests from {concurrency} clients: "
+              "{seconds:.2f}s, {records_per_s:.0f} records/s".format(**r))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,115 @@
+import json
+
+from timetable_index import TimetableIndex
+from user_registry import UserRegistry
+
+
+def load_timetables(path="timetable.json"):
+    """
+    Load the timetable file. It holds either one class timetable or a list of them.
+    :return: List of timetables, each with "class", "room", "semester" and "timetable" keys.
+    """
+    with open(path, "r") as file:
+        data = json.load(file)
+    return data if isinstance(data, list) else [data]
+
+
+def load_timetable_index(path="timetable.json"):
+    """
+    Load the timetable file and compile it, see timetable_index.py.
+    """
+    return TimetableIndex(load_timetables(path))
+
+
+def as_index(timetables):
+    return timetables if isinstance(timetables, TimetableIndex) else TimetableIndex(timetables)
+
+
+def room_slots(timetables, room, day):
+    """
+    Lectures held in a room on a day, in time order. Breaks are left out.
+    :param timetables: TimetableIndex, or timetables as returned by load_timetables.
+    :param day: Day name, e.g. "Monday".
+    :return: List of TimetableSlot (start, end, day, slot, timetable), with start and end in minutes since midnight.
+    """
+    return as_index(timetables).room_slots(room, day)
+
+
+def in_class(user, class_name, semester):
+    """
+    Check whether a user belongs to a class. Users sign up with their branch
+    ("IT") while the timetable names the section ("IT 7A-FSD"), so a branch
+    matches every section of the same semester.
+    """
+    if str(user.get("semester")) != str(semester):
+        return False
+    user_class = str(user.get("class", "")).strip()
+    return user_class == class_name or user_class == class_name.split()[0]
+
+
+def timetable_classes(timetables, user):
+    """
+    Timetable classes a user may belong to: the class they signed up with
+    first, then every section of their branch in their semester (see in_class).
+    """
+    user_class = str(user.get("class", "")).strip()
+    matches = [timetable["class"] for timetable in as_index(timetables).timetables
+               if in_class(user, timetable["class"], timetable["semester"])]
+    return sorted(matches, key=lambda class_name: class_name != user_class)
+
+
+def class_roster(users, class_name, semester):
+    """
+    Enrollment numbers of the students of a class.
+    :param users: List of user dicts, or a UserRegistry, which finds them by its class index.
+    """
+    if isinstance(users, UserRegistry):
+        return users.class_roster(class_name, semester)
+    return {user["enrollment"] for user in users if in_class(user, class_name, semester)}
+
+
+class RoomRoster:
+    """
+    Keeps the candidates of a SimpleFacerec on the class scheduled in a room
+    while a session runs, so a stream that runs across a period change
+    matches the new class first.
+    """
+
+    def __init__(self, room, timetables, users):
+        """
+        :param timetables: TimetableIndex, or timetables as returned by load_timetables.
+        :param users: List of user dicts, or a UserRegistry.
+        """
+        self.room = room
+        self.timetables = as_index(timetables)
+        self.users = users
+        # (day, start, class) of the lecture the candidates were set for, None outside lectures
+        self.lecture = None
+        self.updated = False
+
+    def update(self, sfr, when):
+        """
+        Set the candidates of `sfr` to the class in the room at `when`, if the lecture changed.
+        :return: True if the candidates were set.
+        """
+        lecture = self.timetables.lecture_in_room(self.room, when)
+        key = (lecture.day, lecture.start, lecture.timetable["class"]) if lecture is not None else None
+        if self.updated and key == self.lecture:
+            return False
+        self.lecture = key
+        self.updated = True
+        sfr.set_candidates(class_roster(self.users, lecture.timetable["class"], lecture.timetable["semester"])
+                           if lecture is not None else None)
+        return True
+
+    def recognizer(self, sfr, recognize, capture):
+        """
+        Wrap a recognize callable for RecognitionPipeline so the candidates are
+        updated on the recognition thread, to the time of the frame, before it is matched.
+        :param recognize: Callable frame -> (face_locations, face_names), e.g. sfr.track_known_faces.
+        :param capture: FrameSource the frames come from.
+        """
+        def recognize_frame(frame):
+            self.update(sfr, capture.frame_time())
+            return recognize(frame)
+        return recognize_frame
@@ -0,0 +1,90 @@
+import argparse
+import glob
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+from face_detectors import make_detector
+
+
+def load_images(images_path):
+    """
+    RGB images of the gallery folder. Every image shows exactly one student,
+    so a detector that finds no face in it missed one.
+    """
+    images = []
+    for img_path in sorted(glob.glob(os.path.join(images_path, "*.*"))):
+        img = cv2.imread(img_path)
+        if img is not None:
+            images.append(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    return images
+
+
+def measure(detector, images, scale):
+    """
+    Latency and recall of a detector on the images resized by `scale`.
+    :return: Dict with recall (images with a face found), false extra faces and latency percentiles.
+    """
+    latencies = []
+    found = 0
+    extra = 0
+    for img in images:
+        small = cv2.resize(img, (0, 0), fx=scale, fy=scale) if scale != 1.0 else img
+        start = time.perf_counter()
+        face_locations = detector.detect(small)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found += bool(face_locations)
+        extra += max(0, len(face_locations) - 1)
+
+    latencies = np.asarray(latencies)
+    return {
+        "recall": found / len(images),
+        "extra_faces": extra,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "mean_ms": float(latencies.mean()),
+    }
+
+
+def report(images, backends, scales, upsample=1, roi_padding=0.5):
+    """
+    Run every backend on every scale.
+    :param backends: Backend names accepted by make_detector.
+    :param scales: Resize factors, as used for frame_resizing.
+    :return: List of result dicts, one per backend and scale.
+    """
+    results = []
+    for backend in backends:
+        detector = make_detector(backend, upsample=upsample, roi_padding=roi_padding)
+        for scale in scales:
+            result = {"backend": backend, "scale": scale, "images": len(images)}
+            result.update(measure(detector, images, scale))
+            if hasattr(detector, "stats"):
+                # Share of the frames on which the expensive detector had to run
+                result["expensive_ratio"] = detector.stats["expensive_runs"] / max(detector.stats["frames"], 1)
+                detector.stats = {"frames": 0, "expensive_runs": 0}
+            results.append(result)
+            print("{backend:8s} scale={scale:<5} recall={recall:.3f} extra={extra_faces:<3d} "
+                  "p50={p50_ms:.1f}ms p95={p95_ms:.1f}ms".format(**result))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency versus recall of the face detector backends.")
+    parser.add_argument("--images", default="images/", help="Folder with one face per image")
+    parser.add_argument("--backends", nargs="+", default=["haar", "hog", "cascade", "cnn"])
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.5, 0.25])
+    parser.add_argument("--upsample", type=int, default=1)
+    parser.add_argument("--roi-padding", type=float, default=0.5, help="ROI padding of the cascade backend")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    print(f"{len(images)} images from {args.images}")
+    results = report(images, args.backends, args.scales, args.upsample, args.roi_padding)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
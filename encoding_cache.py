@@ -0,0 +1,123 @@
+import hashlib
+import os
+import pickle
+
+# Bump when the layout of a cache entry changes so old files are rebuilt
+CACHE_VERSION = 1
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """
+    Hash the content of a file.
+    :param path: Path of the file to hash.
+    :param chunk_size: Number of bytes read per step.
+    :return: Hex SHA-1 digest of the file content.
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EncodingCache:
+    """
+    Persistent store of face encodings, keyed by image path.
+    Every entry remembers the mtime, size and content hash of the image it was
+    computed from, so only new or changed images need to be encoded again.
+    """
+
+    def __init__(self, pkl_path):
+        self.pkl_path = pkl_path
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.removed = 0
+        self.load()
+
+    def load(self):
+        """
+        Read the cache file if it exists and matches the current cache version.
+        """
+        if not os.path.exists(self.pkl_path):
+            return
+        try:
+            with open(self.pkl_path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            print(f"Encoding cache {self.pkl_path} is unreadable, rebuilding it.")
+            return
+        if isinstance(data, dict) and data.get("version") == CACHE_VERSION:
+            self.entries = data["entries"]
+
+    def save(self):
+        """
+        Write the cache to disk. The file is replaced atomically so a crash
+        while saving never leaves a truncated cache behind.
+        """
+        directory = os.path.dirname(self.pkl_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = self.pkl_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"version": CACHE_VERSION, "entries": self.entries}, f)
+        os.replace(tmp_path, self.pkl_path)
+
+    def key(self, img_path):
+        return os.path.normpath(img_path)
+
+    def get(self, img_path):
+        """
+        Look up the encoding of an image.
+        :param img_path: Path of the image.
+        :return: (hit, encoding). The encoding is None for cached images without a face.
+        """
+        entry = self.entries.get(self.key(img_path))
+        if entry is None:
+            self.misses += 1
+            return False, None
+
+        stat = os.stat(img_path)
+        if entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            self.hits += 1
+            return True, entry["encoding"]
+
+        # The file was touched, only re-encode it if the content really changed
+        if entry["size"] == stat.st_size and entry["sha1"] == file_digest(img_path):
+            entry["mtime"] = stat.st_mtime
+            self.hits += 1
+            return True, entry["encoding"]
+
+        self.misses += 1
+        return False, None
+
+    def put(self, img_path, encoding):
+        """
+        Store the encoding of an image (None if no face was found in it).
+        """
+        stat = os.stat(img_path)
+        self.entries[self.key(img_path)] = {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "sha1": file_digest(img_path),
+            "encoding": encoding,
+        }
+
+    def prune(self, images_dir, img_paths):
+        """
+        Drop entries of images that were deleted from a gallery directory.
+        :param images_dir: Gallery directory the images were listed from.
+        :param img_paths: Paths of the images currently in the directory.
+        :return: Number of entries removed.
+        """
+        directory = self.key(images_dir)
+        present = {self.key(p) for p in img_paths}
+        stale = [k for k in self.entries
+                 if os.path.dirname(k) == directory and k not in present]
+        for k in stale:
+            del self.entries[k]
+        self.removed += len(stale)
+        return len(stale)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "removed": self.removed}
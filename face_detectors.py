@@ -0,0 +1,158 @@
+import os
+
+import cv2
+import face_recognition
+import numpy as np
+
+
+class HogDetector:
+    """
+    dlib HOG detector, what face_recognition.face_locations uses by default.
+    """
+    name = "hog"
+
+    def __init__(self, upsample=1):
+        # Each upsample doubles the image size: smaller faces are found, at about 4x the cost
+        self.upsample = upsample
+
+    def detect(self, rgb_frame):
+        """
+        :param rgb_frame: RGB image.
+        :return: List of (top, right, bottom, left) face locations.
+        """
+        return face_recognition.face_locations(rgb_frame, number_of_times_to_upsample=self.upsample, model="hog")
+
+
+class CnnDetector(HogDetector):
+    """
+    dlib CNN (MMOD) detector. Finds rotated and partly hidden faces the HOG
+    detector misses, but is an order of magnitude slower without a GPU.
+    Meant for accuracy runs and offline processing.
+    """
+    name = "cnn"
+
+    def detect(self, rgb_frame):
+        return face_recognition.face_locations(rgb_frame, number_of_times_to_upsample=self.upsample, model="cnn")
+
+
+class OpenCVCascadeDetector:
+    """
+    OpenCV cascade classifier (Haar or LBP). Very cheap, but only finds
+    frontal faces and gives more false positives, so it is best used to
+    decide whether a more expensive detector needs to run.
+    """
+    name = "haar"
+
+    def __init__(self, cascade_file="haarcascade_frontalface_default.xml", scale_factor=1.1,
+                 min_neighbors=5, min_size=20):
+        """
+        :param cascade_file: Path of a cascade XML file, or the name of one bundled with OpenCV
+            (opencv-python only bundles the Haar cascades, LBP cascades need a path).
+        :param scale_factor: Image pyramid step of detectMultiScale.
+        :param min_neighbors: Overlapping detections needed to accept a face.
+        :param min_size: Smallest face side in pixels.
+        """
+        self.cascade_file = cascade_file
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self.classifier = None
+
+    def __getstate__(self):
+        # CascadeClassifier cannot be pickled, it is loaded again on first use
+        state = self.__dict__.copy()
+        state["classifier"] = None
+        return state
+
+    def load(self):
+        if not hasattr(cv2, "CascadeClassifier"):
+            raise ValueError("This OpenCV build has no cascade classifiers (removed in OpenCV 5), "
+                             "install opencv-python<5 to use the haar and cascade backends")
+        path = self.cascade_file
+        if not os.path.exists(path):
+            path = os.path.join(cv2.data.haarcascades, self.cascade_file)
+        self.classifier = cv2.CascadeClassifier(path)
+        if self.classifier.empty():
+            raise ValueError(f"Could not load cascade {self.cascade_file}")
+
+    def detect(self, rgb_frame):
+        if self.classifier is None:
+            self.load()
+        gray = cv2.equalizeHist(cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2GRAY))
+        faces = self.classifier.detectMultiScale(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                                 minSize=(self.min_size, self.min_size))
+        return [(int(y), int(x + w), int(y + h), int(x)) for (x, y, w, h) in faces]
+
+
+class CascadeDetector:
+    """
+    Runs a cheap detector first and the expensive one only when the cheap one
+    finds a face. With roi_padding set, the expensive detector only looks at
+    the padded regions around the cheap detections and not at the whole frame.
+    """
+    name = "cascade"
+
+    def __init__(self, cheap, expensive, roi_padding=None):
+        """
+        :param cheap: Detector deciding whether the expensive one runs.
+        :param expensive: Detector whose locations are returned.
+        :param roi_padding: Padding around cheap detections, relative to the face size,
+            or None to run the expensive detector on the whole frame.
+        """
+        self.cheap = cheap
+        self.expensive = expensive
+        self.roi_padding = roi_padding
+        self.stats = {"frames": 0, "expensive_runs": 0}
+
+    def detect(self, rgb_frame):
+        self.stats["frames"] += 1
+        candidates = self.cheap.detect(rgb_frame)
+        if not candidates:
+            return []
+        self.stats["expensive_runs"] += 1
+        if self.roi_padding is None:
+            return self.expensive.detect(rgb_frame)
+
+        face_locations = []
+        height, width = rgb_frame.shape[:2]
+        for top, right, bottom, left in candidates:
+            pad_y = int((bottom - top) * self.roi_padding)
+            pad_x = int((right - left) * self.roi_padding)
+            y0, y1 = max(0, top - pad_y), min(height, bottom + pad_y)
+            x0, x1 = max(0, left - pad_x), min(width, right + pad_x)
+            # dlib needs a contiguous image, not a view into the frame
+            roi = np.ascontiguousarray(rgb_frame[y0:y1, x0:x1])
+            for t, r, b, l in self.expensive.detect(roi):
+                face_locations.append((t + y0, r + x0, b + y0, l + x0))
+        return face_locations
+
+
+def make_detector(backend="hog", upsample=1, cascade_file="haarcascade_frontalface_default.xml",
+                  confirm="hog", roi_padding=None):
+    """
+    Create a detector from the DETECTOR section of config.yaml.
+    :param backend: "hog", "cnn", "haar" or "cascade" (haar deciding whether `confirm` runs).
+    :param upsample: Upsampling of the dlib detectors.
+    :param cascade_file: OpenCV cascade of the haar and cascade backends.
+    :param confirm: Expensive backend of the cascade mode, "hog" or "cnn".
+    :param roi_padding: Run the confirming detector only around the cascade's faces, see CascadeDetector.
+    """
+    if backend == "hog":
+        return HogDetector(upsample)
+    if backend == "cnn":
+        return CnnDetector(upsample)
+    if backend == "haar":
+        return OpenCVCascadeDetector(cascade_file)
+    if backend == "cascade":
+        return CascadeDetector(OpenCVCascadeDetector(cascade_file), make_detector(confirm, upsample),
+                               roi_padding=roi_padding)
+    raise ValueError(f"Unknown detector backend {backend!r}")
+
+
+def detector_from_config(section):
+    """
+    :param section: DETECTOR section of config.yaml.
+    """
+    return make_detector(backend=section['BACKEND'], upsample=section['UPSAMPLE'],
+                         cascade_file=section['CASCADE_FILE'], confirm=section['CASCADE_CONFIRM'],
+                         roi_padding=section.get('ROI_PADDING'))
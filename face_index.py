@@ -0,0 +1,336 @@
+import heapq
+import pickle
+
+import numpy as np
+
+# Bump when the pickled layout of an index changes
+INDEX_VERSION = 1
+
+
+def squared_distances(queries, matrix, sq_norms):
+    """
+    Squared euclidean distances between every query and every row of matrix.
+    :param queries: float32 array of shape (queries, 128).
+    :param matrix: float32 array of shape (rows, 128).
+    :param sq_norms: Precomputed squared norms of the rows of matrix.
+    :return: Array of shape (queries, rows).
+    """
+    q_norms = np.einsum("ij,ij->i", queries, queries)
+    # |q - g|^2 = |q|^2 + |g|^2 - 2 q.g
+    sq = q_norms[:, None] + sq_norms[None, :] - 2.0 * queries @ matrix.T
+    return np.maximum(sq, 0.0, out=sq)
+
+
+def top_k(dist, ids, k):
+    """
+    Select the k smallest distances of a single query.
+    :param dist: 1-d array of distances.
+    :param ids: Row ids matching dist.
+    :param k: Number of neighbours wanted.
+    :return: (ids, distances) padded with -1 / inf up to k entries.
+    """
+    out_ids = np.full(k, -1, dtype=np.int64)
+    out_dist = np.full(k, np.inf, dtype=np.float32)
+    n = min(k, len(dist))
+    if n:
+        part = np.argpartition(dist, n - 1)[:n] if len(dist) > n else np.arange(len(dist))
+        order = part[np.argsort(dist[part])]
+        out_ids[:n] = ids[order]
+        out_dist[:n] = dist[order]
+    return out_ids, out_dist
+
+
+def as_queries(face_encodings):
+    return np.ascontiguousarray(np.asarray(face_encodings, dtype=np.float32).reshape(-1, 128))
+
+
+class BruteForceIndex:
+    """
+    Exact nearest-neighbour search by scanning the whole gallery.
+    Rows are never moved: removed rows are only masked out, so row ids stay
+    stable for the caller.
+    """
+    kind = "brute"
+
+    def __init__(self):
+        self.build([])
+
+    def build(self, encodings):
+        """
+        Build the index from scratch.
+        :param encodings: Sequence of 128-d face encodings, row i gets id i.
+        """
+        self.data = as_queries(encodings)
+        self.sq_norms = np.einsum("ij,ij->i", self.data, self.data)
+        self.deleted = np.zeros(len(self.data), dtype=bool)
+
+    def __len__(self):
+        return int(len(self.data) - self.deleted.sum())
+
+    def add(self, encodings):
+        """
+        Append encodings to the index.
+        :return: Ids given to the new rows.
+        """
+        new = as_queries(encodings)
+        first = len(self.data)
+        self.data = np.ascontiguousarray(np.vstack([self.data, new]))
+        self.sq_norms = np.concatenate([self.sq_norms, np.einsum("ij,ij->i", new, new)])
+        self.deleted = np.concatenate([self.deleted, np.zeros(len(new), dtype=bool)])
+        return np.arange(first, first + len(new))
+
+    def remove(self, ids):
+        """
+        Remove rows from the search results.
+        """
+        self.deleted[np.asarray(ids, dtype=np.int64)] = True
+
+    def search(self, face_encodings, k=2):
+        """
+        Find the k nearest gallery rows of every query.
+        :param face_encodings: Sequence of query encodings.
+        :param k: Number of neighbours per query.
+        :return: (ids, distances) arrays of shape (queries, k), padded with -1 / inf.
+        """
+        queries = as_queries(face_encodings)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        dist = np.full((len(queries), k), np.inf, dtype=np.float32)
+        if len(queries) == 0 or len(self) == 0:
+            return ids, dist
+
+        sq = squared_distances(queries, self.data, self.sq_norms)
+        sq[:, self.deleted] = np.inf
+        n = min(k, len(self))
+        part = np.argpartition(sq, n - 1, axis=1)[:, :n] if sq.shape[1] > n else np.argsort(sq, axis=1)[:, :n]
+        part_sq = np.take_along_axis(sq, part, axis=1)
+        order = np.argsort(part_sq, axis=1)
+        ids[:, :n] = np.take_along_axis(part, order, axis=1)
+        dist[:, :n] = np.sqrt(np.take_along_axis(part_sq, order, axis=1))
+        return ids, dist
+
+    def save(self, path, fingerprint=None):
+        """
+        Pickle the index.
+        :param fingerprint: Optional value identifying the gallery the index was built from.
+        """
+        with open(path, "wb") as f:
+            pickle.dump({"version": INDEX_VERSION, "fingerprint": fingerprint, "index": self}, f)
+
+
+class IVFIndex(BruteForceIndex):
+    """
+    Inverted-file index: the gallery is partitioned with k-means and a query
+    only scans the n_probe partitions whose centroids are closest to it.
+    """
+    kind = "ivf"
+
+    def __init__(self, n_lists=None, n_probe=8, iterations=10, seed=0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.iterations = iterations
+        self.seed = seed
+        super().__init__()
+
+    def build(self, encodings):
+        super().build(encodings)
+        n = len(self.data)
+        n_lists = self.n_lists or max(1, int(np.sqrt(n)))
+        n_lists = min(n_lists, max(n, 1))
+        self.centroids = self.kmeans(n_lists) if n else np.zeros((0, 128), dtype=np.float32)
+        self.lists = [np.zeros(0, dtype=np.int64) for _ in range(len(self.centroids))]
+        if n:
+            self.assign(np.arange(n))
+
+    def kmeans(self, n_lists):
+        """
+        Lloyd's k-means on the gallery rows.
+        :return: Centroid matrix of shape (n_lists, 128).
+        """
+        rng = np.random.default_rng(self.seed)
+        centroids = self.data[rng.choice(len(self.data), n_lists, replace=False)].copy()
+        for _ in range(self.iterations):
+            c_norms = np.einsum("ij,ij->i", centroids, centroids)
+            labels = np.argmin(squared_distances(self.data, centroids, c_norms), axis=1)
+            counts = np.bincount(labels, minlength=n_lists)
+            # Sum the rows of every cluster in one pass over the rows sorted by label
+            order = np.argsort(labels, kind="stable")
+            filled = np.flatnonzero(counts)
+            starts = np.concatenate([[0], np.cumsum(counts[filled])[:-1]])
+            sums = np.add.reduceat(self.data[order], starts, axis=0)
+            # Clusters that lost all their members keep their old centroid
+            centroids[filled] = sums / counts[filled, None]
+        return centroids
+
+    def assign(self, ids):
+        c_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        labels = np.argmin(squared_distances(self.data[ids], self.centroids, c_norms), axis=1)
+        for label in np.unique(labels):
+            self.lists[label] = np.concatenate([self.lists[label], ids[labels == label]])
+
+    def add(self, encodings):
+        if len(self.centroids) == 0:
+            # Nothing to partition yet, build the index from the new rows
+            self.build(encodings)
+            return np.arange(len(self.data))
+        ids = super().add(encodings)
+        self.assign(ids)
+        return ids
+
+    def search(self, face_encodings, k=2):
+        queries = as_queries(face_encodings)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        dist = np.full((len(queries), k), np.inf, dtype=np.float32)
+        if len(queries) == 0 or len(self) == 0:
+            return ids, dist
+
+        c_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        c_dist = squared_distances(queries, self.centroids, c_norms)
+        n_probe = min(self.n_probe, len(self.centroids))
+        probes = np.argpartition(c_dist, n_probe - 1, axis=1)[:, :n_probe]
+
+        for i, query in enumerate(queries):
+            candidates = np.concatenate([self.lists[p] for p in probes[i]])
+            candidates = candidates[~self.deleted[candidates]]
+            if len(candidates) == 0:
+                continue
+            sq = squared_distances(query[None, :], self.data[candidates], self.sq_norms[candidates])[0]
+            ids[i], cand_dist = top_k(sq, candidates, k)
+            dist[i] = np.sqrt(cand_dist)
+        return ids, dist
+
+
+class BallTreeIndex(BruteForceIndex):
+    """
+    Exact search with a ball tree: each node bounds its rows by a sphere, so
+    whole subtrees farther away than the current k-th neighbour are skipped.
+    Rows added after the build are scanned linearly until there are enough
+    of them to make a rebuild worthwhile.
+    """
+    kind = "balltree"
+
+    def __init__(self, leaf_size=128, rebuild_ratio=0.1):
+        self.leaf_size = leaf_size
+        self.rebuild_ratio = rebuild_ratio
+        super().__init__()
+
+    def build(self, encodings):
+        super().build(encodings)
+        self.centers = []
+        self.radii = []
+        self.children = []
+        self.leaves = []
+        self.pending = np.zeros(0, dtype=np.int64)
+        if len(self.data):
+            self.build_node(np.arange(len(self.data)))
+        self.centers = np.asarray(self.centers, dtype=np.float32).reshape(-1, 128)
+        self.radii = np.asarray(self.radii, dtype=np.float32)
+
+    def build_node(self, ids):
+        node = len(self.radii)
+        points = self.data[ids]
+        center = points.mean(axis=0)
+        self.centers.append(center)
+        self.radii.append(float(np.sqrt(((points - center) ** 2).sum(axis=1).max())))
+        self.children.append(None)
+        self.leaves.append(None)
+
+        if len(ids) <= self.leaf_size:
+            self.leaves[node] = ids
+            return node
+
+        # Split along the direction between two far-apart rows
+        a = points[np.argmax(((points - center) ** 2).sum(axis=1))]
+        b = points[np.argmax(((points - a) ** 2).sum(axis=1))]
+        projection = points @ (b - a)
+        order = np.argsort(projection)
+        half = len(ids) // 2
+        left = self.build_node(ids[order[:half]])
+        right = self.build_node(ids[order[half:]])
+        self.children[node] = [left, right]
+        return node
+
+    def add(self, encodings):
+        ids = BruteForceIndex.add(self, encodings)
+        self.pending = np.concatenate([self.pending, ids])
+        if len(self.pending) > max(self.leaf_size, self.rebuild_ratio * len(self.data)):
+            deleted = self.deleted
+            self.build(self.data)
+            self.deleted = deleted
+        return ids
+
+    def search(self, face_encodings, k=2):
+        queries = as_queries(face_encodings)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        dist = np.full((len(queries), k), np.inf, dtype=np.float32)
+        if len(queries) == 0 or len(self) == 0:
+            return ids, dist
+
+        for i, query in enumerate(queries):
+            # Max-heap of the best k (negated distance, id) pairs found so far
+            best = []
+            self.scan(query, self.pending, best, k)
+            if len(self.radii):
+                frontier = [(0.0, 0)]
+                while frontier:
+                    bound, node = heapq.heappop(frontier)
+                    if len(best) == k and bound >= -best[0][0]:
+                        break
+                    if self.leaves[node] is not None:
+                        self.scan(query, self.leaves[node], best, k)
+                        continue
+                    children = self.children[node]
+                    gaps = np.sqrt(((self.centers[children] - query) ** 2).sum(axis=1)) - self.radii[children]
+                    for child, gap in zip(children, gaps):
+                        heapq.heappush(frontier, (max(0.0, float(gap)), child))
+            found = sorted((-d, j) for d, j in best)
+            for j, (d, row) in enumerate(found):
+                ids[i, j] = row
+                dist[i, j] = d
+        return ids, dist
+
+    def scan(self, query, rows, best, k):
+        rows = rows[~self.deleted[rows]]
+        if len(rows) == 0:
+            return
+        dist = np.sqrt(squared_distances(query[None, :], self.data[rows], self.sq_norms[rows])[0])
+        if len(best) == k:
+            # Only rows closer than the current k-th neighbour can enter the heap
+            closer = dist < -best[0][0]
+            dist, rows = dist[closer], rows[closer]
+        for d, row in zip(dist, rows):
+            if len(best) < k:
+                heapq.heappush(best, (-float(d), int(row)))
+            elif d < -best[0][0]:
+                heapq.heapreplace(best, (-float(d), int(row)))
+
+
+INDEX_TYPES = {cls.kind: cls for cls in (BruteForceIndex, IVFIndex, BallTreeIndex)}
+
+
+def make_index(kind="brute", **params):
+    """
+    Create an empty index.
+    :param kind: One of "brute", "ivf" or "balltree".
+    :param params: Keyword arguments of the index class.
+    """
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {kind!r}, expected one of {sorted(INDEX_TYPES)}")
+    return INDEX_TYPES[kind](**params)
+
+
+def load_index(path, fingerprint=None):
+    """
+    Load a pickled index.
+    :param fingerprint: If given, the index is only returned when it was saved with the same fingerprint.
+    :return: The index, or None if the file is missing, stale or unreadable.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+        return None
+    if fingerprint is not None and data.get("fingerprint") != fingerprint:
+        return None
+    return data["index"]
@@ -0,0 +1,90 @@
+import hashlib
+import os
+
+import numpy as np
+from face_index import load_index, make_index
+
+
+class FaceMatcher:
+    """
+    Matches face encodings against the gallery in a single batched search.
+    The gallery lives in a nearest-neighbour index (exact brute force by
+    default, see face_index.py), so a frame with many faces costs one query.
+    """
+
+    def __init__(self, encodings=None, tolerance=0.6, index="brute", index_params=None):
+        # Same default as face_recognition.compare_faces
+        self.tolerance = tolerance
+        self.index_kind = index
+        self.index_params = index_params or {}
+        self.build(encodings if encodings is not None else [])
+
+    def build(self, encodings, index_path=None):
+        """
+        (Re)build the gallery index.
+        :param encodings: Sequence of 128-d face encodings.
+        :param index_path: Optional pickle file to reuse the index from and save it to.
+            The saved index is only reused when it was built from the same encodings
+            with the same kind and parameters.
+        """
+        matrix = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, 128))
+        if index_path:
+            self.index = load_index(index_path, self.fingerprint(matrix))
+            if self.index is not None:
+                return
+
+        self.index = make_index(self.index_kind, **self.index_params)
+        self.index.build(matrix)
+        if index_path:
+            self.save(index_path, matrix)
+
+    def fingerprint(self, encodings):
+        """
+        Identifies an index of this kind and parameters holding exactly these encodings.
+        """
+        matrix = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, 128))
+        params = ",".join("{}={!r}".format(key, value) for key, value in sorted(self.index_params.items()))
+        return "{}({}):{}".format(self.index_kind, params, hashlib.sha1(matrix.tobytes()).hexdigest())
+
+    def save(self, index_path, encodings):
+        """
+        Persist the index, e.g. after changing it in place.
+        :param encodings: Every row of the index, removed ones included; build() only reuses
+            the saved index for a gallery with exactly these rows.
+        """
+        directory = os.path.dirname(index_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.index.save(index_path, self.fingerprint(encodings))
+
+    def __len__(self):
+        return len(self.index)
+
+    def add(self, encodings):
+        """
+        Add encodings to the gallery in place.
+        :return: Row ids of the new encodings.
+        """
+        return self.index.add(encodings)
+
+    def remove(self, rows):
+        """
+        Remove rows from the gallery in place.
+        """
+        self.index.remove(rows)
+
+    def match(self, face_encodings):
+        """
+        Find the closest gallery encoding for every query.
+        :param face_encodings: Sequence of query encodings.
+        :return: (best_index, best_distance, margin) arrays, one entry per query.
+            margin is the gap between the runner-up and the best distance
+            (inf when the gallery has a single entry). best_index is -1 and
+            best_distance inf when the gallery is empty.
+        """
+        ids, dist = self.index.search(face_encodings, k=2)
+        best_distance = dist[:, 0]
+        margin = np.full_like(best_distance, np.inf)
+        found = np.isfinite(best_distance)
+        margin[found] = dist[found, 1] - best_distance[found]
+        return ids[:, 0], best_distance, margin
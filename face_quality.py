@@ -0,0 +1,122 @@
+import cv2
+import face_recognition
+import numpy as np
+
+# Side of the square the face is resized to before measuring sharpness, so
+# the score does not depend on the size of the face
+SHARPNESS_SIZE = 64
+
+
+class FaceQualityGate:
+    """
+    Cheap checks run on every detected face before its 128-d encoding is
+    computed: size, sharpness (variance of the Laplacian), brightness and,
+    optionally, how far the face is turned (from the 5-point landmarks).
+    Faces that fail are not encoded and come out as "Unknown"; on video
+    they are retried on a later frame, see SimpleFacerec.encode_faces.
+    """
+
+    def __init__(self, min_size=30, min_sharpness=30.0, min_brightness=40, max_brightness=220, max_yaw=0.5):
+        """
+        :param min_size: Smallest face height, in pixels of the resized frame, that is encoded.
+        :param min_sharpness: Lowest variance of the Laplacian of the face.
+        :param min_brightness: Lowest mean gray level of the face (0-255).
+        :param max_brightness: Highest mean gray level of the face (0-255).
+        :param max_yaw: Largest offset of the nose from between the eyes, relative
+            to the eye distance (0 is frontal, about 0.5 is half profile). None skips the pose check.
+        """
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_yaw = max_yaw
+        self.stats = {"faces": 0, "passed": 0, "too_small": 0, "blurry": 0, "too_dark": 0, "too_bright": 0,
+                      "turned": 0}
+
+    @staticmethod
+    def crop(rgb_frame, location):
+        top, right, bottom, left = location
+        top, left = max(0, top), max(0, left)
+        bottom, right = min(rgb_frame.shape[0], bottom), min(rgb_frame.shape[1], right)
+        if bottom <= top or right <= left:
+            return None
+        return cv2.cvtColor(rgb_frame[top:bottom, left:right], cv2.COLOR_RGB2GRAY)
+
+    @staticmethod
+    def sharpness(gray):
+        gray = cv2.resize(gray, (SHARPNESS_SIZE, SHARPNESS_SIZE), interpolation=cv2.INTER_AREA)
+        return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+    @staticmethod
+    def yaw(rgb_frame, location):
+        """
+        Horizontal offset of the nose tip from the middle of the eyes, relative to the eye distance.
+        :return: The offset, or None if no landmarks were found.
+        """
+        landmarks = face_recognition.face_landmarks(rgb_frame, [location], model="small")
+        if not landmarks:
+            return None
+        points = landmarks[0]
+        left_eye = np.mean(points["left_eye"], axis=0)
+        right_eye = np.mean(points["right_eye"], axis=0)
+        eye_distance = np.linalg.norm(right_eye - left_eye)
+        if eye_distance == 0:
+            return None
+        nose = np.asarray(points["nose_tip"][0], dtype=float)
+        return float(abs(nose[0] - (left_eye[0] + right_eye[0]) / 2) / eye_distance)
+
+    def check(self, rgb_frame, location):
+        """
+        :param rgb_frame: Frame the face was detected in.
+        :param location: (top, right, bottom, left) of the face.
+        :return: None if the face is good enough to encode, otherwise the reason it is not.
+        """
+        top, right, bottom, left = location
+        if bottom - top < self.min_size:
+            return "too_small"
+        gray = self.crop(rgb_frame, location)
+        if gray is None:
+            return "too_small"
+        brightness = float(gray.mean())
+        if brightness < self.min_brightness:
+            return "too_dark"
+        if brightness > self.max_brightness:
+            return "too_bright"
+        if self.sharpness(gray) < self.min_sharpness:
+            return "blurry"
+        # Landmarks cost more than the other checks, so they come last
+        if self.max_yaw is not None:
+            yaw = self.yaw(rgb_frame, location)
+            if yaw is not None and yaw > self.max_yaw:
+                return "turned"
+        return None
+
+    def select(self, rgb_frame, face_locations):
+        """
+        :return: Indices of the faces worth encoding.
+        """
+        selected = []
+        for i, location in enumerate(face_locations):
+            reason = self.check(rgb_frame, location)
+            self.stats["faces"] += 1
+            if reason is None:
+                self.stats["passed"] += 1
+                selected.append(i)
+            else:
+                self.stats[reason] += 1
+        return selected
+
+    def skipped(self):
+        return self.stats["faces"] - self.stats["passed"]
+
+
+def quality_gate_from_config(section):
+    """
+    :param section: QUALITY section of config.yaml.
+    :return: FaceQualityGate, or None when the gate is disabled.
+    """
+    if not section['ENABLED']:
+        return None
+    return FaceQualityGate(min_size=section['MIN_SIZE'], min_sharpness=section['MIN_SHARPNESS'],
+                           min_brightness=section['MIN_BRIGHTNESS'], max_brightness=section['MAX_BRIGHTNESS'],
+                           max_yaw=section['MAX_YAW'] or None)
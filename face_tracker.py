@@ -0,0 +1,215 @@
+import cv2
+
+
+def iou(a, b):
+    """
+    Intersection over union of two (top, right, bottom, left) boxes.
+    """
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    union = (a[1] - a[3]) * (a[2] - a[0]) + (b[1] - b[3]) * (b[2] - b[0]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class TemplateTracker:
+    """
+    Follows a face by looking for its appearance at the last detection in a
+    window around its previous position. Needs nothing beyond the base
+    OpenCV package and costs one small matchTemplate per face and frame.
+    """
+
+    def __init__(self, search_scale=0.5, min_score=0.5):
+        # Window margin relative to the face size, and the lowest correlation still accepted
+        self.search_scale = search_scale
+        self.min_score = min_score
+
+    def init(self, frame, box):
+        # Detections can reach slightly past the frame border
+        top, right, bottom, left = box
+        top, left = max(0, top), max(0, left)
+        bottom, right = min(frame.shape[0], bottom), min(frame.shape[1], right)
+        self.box = (top, right, bottom, left)
+        self.template = None
+        if bottom > top and right > left:
+            self.template = cv2.cvtColor(frame[top:bottom, left:right], cv2.COLOR_RGB2GRAY)
+
+    def update(self, frame):
+        """
+        :return: New (top, right, bottom, left) box, or None if the face was lost.
+        """
+        if self.template is None:
+            return None
+        top, right, bottom, left = self.box
+        height, width = self.template.shape[:2]
+        pad_y, pad_x = int(height * self.search_scale), int(width * self.search_scale)
+        y0, y1 = max(0, top - pad_y), min(frame.shape[0], bottom + pad_y)
+        x0, x1 = max(0, left - pad_x), min(frame.shape[1], right + pad_x)
+        if height < 4 or width < 4 or y1 - y0 < height or x1 - x0 < width:
+            return None
+
+        window = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_RGB2GRAY)
+        result = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (x, y) = cv2.minMaxLoc(result)
+        if score < self.min_score:
+            return None
+        self.box = (y0 + y, x0 + x + width, y0 + y + height, x0 + x)
+        return self.box
+
+
+def create_opencv_tracker(kind):
+    """
+    Create one of OpenCV's built-in trackers ("kcf", "csrt" or "mil").
+    Depending on the OpenCV build they live in cv2 or cv2.legacy.
+    """
+    name = "Tracker{}_create".format(kind.upper())
+    for module in (cv2, getattr(cv2, "legacy", None)):
+        if module is not None and hasattr(module, name):
+            return getattr(module, name)()
+    raise ValueError(f"OpenCV tracker {kind!r} is not available in this OpenCV build")
+
+
+class OpenCVTracker:
+    """
+    Adapts an OpenCV tracker to (top, right, bottom, left) boxes.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+
+    def init(self, frame, box):
+        top, right, bottom, left = box
+        self.tracker = create_opencv_tracker(self.kind)
+        self.tracker.init(frame, (left, top, right - left, bottom - top))
+
+    def update(self, frame):
+        ok, (x, y, w, h) = self.tracker.update(frame)
+        if not ok:
+            return None
+        return int(y), int(x + w), int(y + h), int(x)
+
+
+class Track:
+    """
+    A face followed across frames, keeping the identity it was given when it was first encoded.
+    """
+
+    def __init__(self, track_id, box, name, tracker):
+        self.track_id = track_id
+        self.box = box
+        self.name = name
+        self.tracker = tracker
+
+
+class FaceTracker:
+    """
+    Runs detection and encoding of a SimpleFacerec only every detect_every
+    frames, or as soon as a track is lost, and follows the faces with a cheap
+    tracker in between. Detections are associated with existing tracks by
+    IoU, so only new (or still unknown) faces are encoded.
+    """
+
+    def __init__(self, sfr, detect_every=5, tracker="template", iou_threshold=0.3):
+        """
+        :param sfr: SimpleFacerec used for detection, encoding and matching.
+        :param detect_every: Run detection every this many frames.
+        :param tracker: "template" or the name of an OpenCV tracker ("kcf", "csrt", "mil").
+        :param iou_threshold: Minimum overlap for a detection to continue a track.
+        """
+        self.sfr = sfr
+        self.detect_every = detect_every
+        self.tracker_kind = tracker
+        self.iou_threshold = iou_threshold
+        self.tracks = []
+        self.next_track_id = 0
+        self.frames_since_detection = 0
+
+        # Counters to see how much detection and encoding work is skipped
+        self.stats = {"frames": 0, "detections": 0, "encodings": 0}
+
+    def new_tracker(self):
+        if self.tracker_kind == "template":
+            return TemplateTracker()
+        return OpenCVTracker(self.tracker_kind)
+
+    def process(self, frame):
+        """
+        :param frame: BGR frame of the video.
+        :return: (face_locations, face_names) like SimpleFacerec.detect_known_faces.
+        """
+        self.stats["frames"] += 1
+        self.frames_since_detection += 1
+        rgb_small_frame = self.sfr.prepare_frame(frame)
+
+        lost = False
+        if self.tracks and self.frames_since_detection < self.detect_every:
+            for track in self.tracks:
+                box = track.tracker.update(rgb_small_frame)
+                if box is None:
+                    lost = True
+                    break
+                track.box = box
+
+        detected = not self.tracks or lost or self.frames_since_detection >= self.detect_every
+        if detected:
+            self.detect(rgb_small_frame)
+
+        face_locations = self.sfr.scale_locations([track.box for track in self.tracks])
+        if detected:
+            self.adapt_resizing()
+        return face_locations, [track.name for track in self.tracks]
+
+    def adapt_resizing(self):
+        """
+        Let the SimpleFacerec pick a new scale after a detection. Track boxes
+        are moved to the new scale and the next frame is detected again, so
+        the trackers restart on frames of the new size.
+        """
+        ratio = self.sfr.adapt_resizing([track.box for track in self.tracks])
+        if ratio != 1.0:
+            for track in self.tracks:
+                track.box = tuple(int(round(v * ratio)) for v in track.box)
+            self.frames_since_detection = self.detect_every
+
+    def detect(self, rgb_small_frame):
+        """
+        Detect faces, continue matching tracks and encode only the new faces.
+        """
+        self.stats["detections"] += 1
+        self.frames_since_detection = 0
+        face_locations = [tuple(int(v) for v in loc) for loc in self.sfr.locate_faces(rgb_small_frame)]
+
+        # Associate detections with tracks, best overlapping pairs first
+        pairs = sorted(((iou(track.box, loc), t, d)
+                        for t, track in enumerate(self.tracks)
+                        for d, loc in enumerate(face_locations)), reverse=True)
+        matched = {}
+        used_tracks = set()
+        for overlap, t, d in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t not in used_tracks and d not in matched:
+                matched[d] = self.tracks[t]
+                used_tracks.add(t)
+
+        # Encode faces without a track, and retry tracks that are still unknown; faces
+        # skipped by the quality gate stay unknown and are retried on the next detection
+        to_encode = [d for d in range(len(face_locations))
+                     if d not in matched or matched[d].name == "Unknown"]
+        face_encodings = self.sfr.encode_faces(rgb_small_frame, [face_locations[d] for d in to_encode])
+        face_names, _, _ = self.sfr.match_faces(face_encodings)
+        self.stats["encodings"] += sum(encoding is not None for encoding in face_encodings)
+        names = dict(zip(to_encode, face_names))
+
+        tracks = []
+        for d, loc in enumerate(face_locations):
+            track = matched.get(d)
+            if track is None:
+                track = Track(self.next_track_id, loc, names[d], self.new_tracker())
+                self.next_track_id += 1
+            elif d in names:
+                track.name = names[d]
+            track.box = loc
+            track.tracker.init(rgb_small_frame, loc)
+            tracks.append(track)
+        self.tracks = tracks
@@ -1,37 +1,62 @@
 import streamlit as st
-import pandas as pd
 import cv2
 import tempfile
-from facial_recognition import SimpleFacerec
-import json
-import requests
-
-# Load timetable
-@st.cache_data
+import yaml
+from simple_facerec import SimpleFacerec
+from class_roster import load_timetable_index
+from face_detectors import detector_from_config
+from face_quality import quality_gate_from_config
+from frame_source import open_source
+from pipeline import RecognitionPipeline
+from recognition_client import recognition_client_from_config
+from shared_gallery import shared_gallery_from_config
+from timetable_index import day_date, lecture_slot
+from attendance_client import attendance_client_from_config
+
+# Load configuration from YAML file
+cfg = yaml.load(open('config.yaml', 'r'), Loader=yaml.FullLoader)
+
+# Timetable compiled once for all sessions, see timetable_index.py
+@st.cache_resource
 def load_timetable():
-    with open("timetable.json", "r") as file:
-        return pd.json_normalize(data=json.load(file)["timetable"], record_path="slots", meta="day")
+    return load_timetable_index(cfg['CLASSROOM']['TIMETABLE_PATH'])
+
+# One gallery shared by all sessions and reloaded when images/ changes, see shared_gallery.py
+@st.cache_resource
+def get_shared_gallery():
+    return shared_gallery_from_config(cfg)
 
-# Initialize facial recognition
+# Initialize facial recognition on the shared gallery of the `images` folder, once for all sessions
+@st.cache_resource
 def init_facial_recognition():
-    sfr = SimpleFacerec()
-    sfr.load_encoding_images("images/")  # Load images from the `images` folder
+    if cfg['RECOGNITION_SERVICE']['URL']:
+        # Thin client of recognition_service.py, which holds the gallery and models
+        return recognition_client_from_config(cfg['RECOGNITION_SERVICE'])
+    sfr = SimpleFacerec(index=cfg['MATCHING']['INDEX']).use_gallery(get_shared_gallery())
+    sfr.detector = detector_from_config(cfg['DETECTOR'])
+    sfr.quality_gate = quality_gate_from_config(cfg['QUALITY'])
     return sfr
 
-# Mark attendance API call
-def mark_attendance_api(student_id, subject):
-    url = "http://localhost:5001/mark-attendance"
-    payload = {"student_id": student_id, "subject": subject}
-    response = requests.post(url, json=payload)
-    return response.json()
+# Attendance is queued and sent to the backend in the background, see attendance_client.py
+@st.cache_resource
+def get_attendance_client():
+    return attendance_client_from_config(cfg['CLIENT'])
+
+def submit_attendance(student_id, subject, slot):
+    client = get_attendance_client()
+    client.submit(student_id, subject, slot)
+    # submit() only spools the record, it is sent in the background
+    st.success("Attendance saved, it is sent to the backend in the background.")
+    if client.last_error is not None:
+        st.warning(f"The backend was unreachable at the last attempt, {client.pending()} records are waiting.")
 
 # Facial recognition function
 def perform_facial_recognition(subject, sfr):
     st.title(f"Facial Recognition for {subject}")
     st.write("Starting webcam for facial recognition...")
 
-    # Access webcam
-    cap = cv2.VideoCapture(0)
+    # Access webcam (or the video source set in config.yaml)
+    cap = open_source(cfg['CAPTURE']['SOURCE'], realtime=cfg['CAPTURE']['REALTIME'])
 
     # Temporary file to store the output
     tmp_video = tempfile.NamedTemporaryFile(delete=False, suffix=".avi")
@@ -42,15 +67,9 @@ def perform_facial_recognition(subject, sfr):
 
     recognized_name = None
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            st.error("Failed to open webcam.")
-            break
-
-        # Detect faces
-        face_locations, face_names = sfr.detect_known_faces(frame)
-
+    # Capture and face detection run on their own threads, always on the latest frame
+    pipeline = RecognitionPipeline(cap, sfr.detect_known_faces).start()
+    for frame, face_locations, face_names in pipeline.results():
         # Display results
         for face_loc, name in zip(face_locations, face_names):
             top, right, bottom, left = face_loc
@@ -70,11 +89,13 @@ def perform_facial_recognition(subject, sfr):
         if recognized_name:
             st.success(f"Face recognized as {recognized_name}")
             st.write("Marking attendance...")
-            cap.release()
+            pipeline.stop()
             out.release()
             return recognized_name
+    else:
+        st.error("Failed to open webcam.")
 
-    cap.release()
+    pipeline.stop()
     out.release()
     return None
 
@@ -89,16 +110,15 @@ def main():
     student_id = st.text_input("Enter Student ID", value="12345")
 
     # Display timetable by day
-    days = timetable["day"].unique()
-    selected_day = st.selectbox("Select Day", days)
+    selected_day = st.selectbox("Select Day", timetable.days)
 
-    filtered_timetable = timetable[timetable["day"] == selected_day]
+    filtered_timetable = timetable.day_slots(selected_day)
 
     st.subheader(f"Timetable for {selected_day}")
-    for index, row in filtered_timetable.iterrows():
-        time = row["time"]
-        subject = row["subject"]
-        teacher = row["teacher"]
+    for index, entry in enumerate(filtered_timetable):
+        time = entry.slot["time"]
+        subject = entry.slot["subject"]
+        teacher = entry.slot.get("teacher", "")
 
         if subject == "Break":
             st.write(f"**{time} - Break**")
@@ -109,12 +129,8 @@ def main():
                 recognized_name = perform_facial_recognition(subject, sfr)
 
                 if recognized_name:
-                    # Call API to mark attendance
-                    response = mark_attendance_api(student_id, subject)
-                    if response.get("message"):
-                        st.success(response["message"])
-                    else:
-                        st.error("Failed to mark attendance. Check backend.")
+                    # Queue the attendance for the backend, for this lecture of the selected day this week
+                    submit_attendance(student_id, subject, lecture_slot(entry, day_date(selected_day)))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
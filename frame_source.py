@@ -0,0 +1,166 @@
+import glob
+import os
+import time
+from datetime import datetime, timedelta
+
+import cv2
+
+
+class FrameSource:
+    """
+    Source of video frames with read() -> (ret, frame) like cv2.VideoCapture.
+    After every read, `timestamp` holds the time of the frame in seconds
+    since the start of the source, taken from the source itself, and
+    frame_time() the corresponding date and time.
+    """
+
+    # Live sources drop frames when recognition is slower than the camera,
+    # sources that are not realtime are processed frame by frame
+    realtime = True
+
+    def __init__(self, start_time=None):
+        self.start_time = start_time or datetime.now()
+        self.timestamp = 0.0
+        self.frame_index = -1
+        self.grabbed = None
+
+    def read(self):
+        raise NotImplementedError
+
+    def grab(self):
+        """
+        Advance by one frame without returning it, cheaper than read() where
+        the source allows it. retrieve() then returns the frame if it is needed.
+        :return: True if there was a frame.
+        """
+        ret, self.grabbed = self.read()
+        return ret
+
+    def retrieve(self):
+        return self.grabbed is not None, self.grabbed
+
+    def release(self):
+        pass
+
+    def frame_time(self):
+        """
+        Date and time of the last frame read.
+        """
+        return self.start_time + timedelta(seconds=self.timestamp)
+
+
+class LiveSource(FrameSource):
+    """
+    Webcam (device index) or network stream (rtsp/http URL). Frames are
+    stamped with the time they were read.
+    """
+
+    def __init__(self, source):
+        super().__init__()
+        self.capture = cv2.VideoCapture(source)
+        self.opened = time.monotonic()
+
+    def read(self):
+        ret, frame = self.capture.read()
+        if ret:
+            self.frame_index += 1
+            self.timestamp = time.monotonic() - self.opened
+        return ret, frame
+
+    def release(self):
+        self.capture.release()
+
+
+class VideoFileSource(FrameSource):
+    """
+    Recorded video. Frames are stamped with their position in the file, so a
+    recorded lecture gives the same times however fast it is processed.
+    """
+
+    def __init__(self, path, realtime=False, start_time=None):
+        """
+        :param path: Path of the video file.
+        :param realtime: Pace reading to the frame rate of the video, like a camera.
+            Otherwise frames are read as fast as they are consumed.
+        :param start_time: Date and time of the start of the recording. Defaults to the
+            modification time of the file minus the duration of the video.
+        """
+        self.capture = cv2.VideoCapture(path)
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 0.0
+        frame_count = self.capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0
+        self.duration = frame_count / self.fps if self.fps > 0 else 0.0
+        if start_time is None and os.path.exists(path):
+            start_time = datetime.fromtimestamp(os.path.getmtime(path)) - timedelta(seconds=self.duration)
+        super().__init__(start_time)
+        self.realtime = realtime
+        self.opened = None
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def retrieve(self):
+        return self.capture.retrieve()
+
+    def grab(self):
+        # Frames skipped with grab() are never retrieved, which saves their colour conversion and copy.
+        # Most codecs still decode them, as later frames are predicted from them
+        if not self.capture.grab():
+            return False
+        self.frame_index += 1
+        position = self.capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        # Some backends report no position, fall back to the frame rate
+        if position <= 0 and self.frame_index > 0 and self.fps > 0:
+            position = self.frame_index / self.fps
+        self.timestamp = position
+
+        if self.realtime:
+            if self.opened is None:
+                self.opened = time.monotonic() - self.timestamp
+            delay = self.opened + self.timestamp - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return True
+
+    def release(self):
+        self.capture.release()
+
+
+class ImageDirSource(FrameSource):
+    """
+    Folder of images read in name order as frames `1 / fps` seconds apart,
+    e.g. frames exported from a recording or snapshots of a camera.
+    """
+
+    realtime = False
+
+    def __init__(self, path, fps=1.0, start_time=None):
+        super().__init__(start_time)
+        self.paths = sorted(glob.glob(os.path.join(path, "*.*")))
+        self.fps = fps
+
+    def read(self):
+        while self.frame_index + 1 < len(self.paths):
+            self.frame_index += 1
+            frame = cv2.imread(self.paths[self.frame_index])
+            if frame is not None:
+                self.timestamp = self.frame_index / self.fps
+                return True, frame
+        return False, None
+
+
+def open_source(source, realtime=False, start_time=None):
+    """
+    Open a webcam index, video file, image folder or stream URL.
+    :param source: Webcam index (int or digit string), path or URL.
+    :param realtime: Replay video files at their own frame rate instead of as fast as possible.
+    :param start_time: Date and time of the start of a recording (video files and image folders).
+    """
+    if isinstance(source, int) or str(source).isdigit():
+        return LiveSource(int(source))
+    if os.path.isdir(source):
+        return ImageDirSource(source, start_time=start_time)
+    if os.path.isfile(source):
+        return VideoFileSource(source, realtime=realtime, start_time=start_time)
+    return LiveSource(source)
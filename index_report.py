@@ -0,0 +1,104 @@
+import argparse
+import json
+import time
+
+import numpy as np
+from encoding_cache import EncodingCache
+from face_index import make_index
+
+
+def synthetic_gallery(size, seed=0):
+    """
+    Random 128-d encodings with a spread similar to dlib face encodings.
+    """
+    rng = np.random.default_rng(seed)
+    return (rng.normal(size=(size, 128)) * 0.09).astype(np.float32)
+
+
+def cached_gallery(pkl_path):
+    """
+    Encodings stored in the persistent encoding cache (see encoding_cache.py).
+    """
+    cache = EncodingCache(pkl_path)
+    encodings = [e["encoding"] for e in cache.entries.values() if e["encoding"] is not None]
+    return np.asarray(encodings, dtype=np.float32).reshape(-1, 128)
+
+
+def measure(index, queries, exact_ids, repeat):
+    """
+    Recall and latency of an index against the exact neighbours.
+    :return: Dict with recall@1 and per-query latency percentiles in milliseconds.
+    """
+    latencies = []
+    found = None
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            ids, _ = index.search(query[None, :], k=1)
+            latencies.append((time.perf_counter() - start) * 1000)
+        if found is None:
+            found = index.search(queries, k=1)[0][:, 0]
+
+    latencies = np.asarray(latencies)
+    return {
+        "recall@1": float((found == exact_ids).mean()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "mean_ms": float(latencies.mean()),
+    }
+
+
+def report(gallery, n_queries=200, noise=0.03, repeat=1, configs=None, seed=0):
+    """
+    Compare every index configuration with the exact scan.
+    :param gallery: Encodings to index.
+    :param n_queries: Number of queries, taken from the gallery and perturbed with noise.
+    :param noise: Standard deviation of the noise added to the queries.
+    :param configs: List of (kind, params) to evaluate.
+    :return: List of result dicts, one per configuration.
+    """
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(gallery), min(n_queries, len(gallery)), replace=False)
+    queries = gallery[picks] + rng.normal(size=(len(picks), 128)).astype(np.float32) * noise
+
+    exact = make_index("brute")
+    exact.build(gallery)
+    exact_ids = exact.search(queries, k=1)[0][:, 0]
+
+    results = []
+    for kind, params in configs or [("brute", {}), ("ivf", {}), ("balltree", {})]:
+        index = make_index(kind, **params)
+        start = time.perf_counter()
+        index.build(gallery)
+        build_s = time.perf_counter() - start
+        result = {"index": kind, "params": params, "gallery": len(gallery), "build_s": build_s}
+        result.update(measure(index, queries, exact_ids, repeat))
+        results.append(result)
+        print("{index:9s} {params!s:30s} recall@1={recall@1:.3f} p50={p50_ms:.2f}ms "
+              "p95={p95_ms:.2f}ms build={build_s:.2f}s".format(**result))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall versus latency of the face indexes against the exact scan.")
+    parser.add_argument("--cache", help="Encoding cache pickle to use as gallery (default: synthetic gallery)")
+    parser.add_argument("--size", type=int, nargs="+", default=[1000, 10000, 50000], help="Synthetic gallery sizes")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.03)
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[4, 8, 16], help="IVF partitions scanned per query")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    configs = [("brute", {})]
+    configs += [("ivf", {"n_probe": n}) for n in args.n_probe]
+    configs += [("balltree", {})]
+
+    galleries = [cached_gallery(args.cache)] if args.cache else [synthetic_gallery(n) for n in args.size]
+    all_results = []
+    for gallery in galleries:
+        print(f"Gallery of {len(gallery)} encodings")
+        all_results += report(gallery, args.queries, args.noise, configs=configs)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(all_results, f, indent=2)
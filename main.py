@@ -1,29 +1,53 @@
 import streamlit as st
-import pandas as pd
-import json
-import requests
 import cv2
+import yaml
 from simple_facerec import SimpleFacerec  # Import your SimpleFacerec class
-
-# Load timetable
-@st.cache_data
+from class_roster import load_timetable_index
+from face_detectors import detector_from_config
+from face_quality import quality_gate_from_config
+from frame_source import open_source
+from pipeline import RecognitionPipeline
+from recognition_client import recognition_client_from_config
+from shared_gallery import shared_gallery_from_config
+from timetable_index import day_date, lecture_slot
+from attendance_client import attendance_client_from_config
+
+# Load configuration from YAML file
+cfg = yaml.load(open('config.yaml', 'r'), Loader=yaml.FullLoader)
+
+# Timetable compiled once for all sessions, see timetable_index.py
+@st.cache_resource
 def load_timetable():
-    with open("timetable.json", "r") as file:
-        return pd.json_normalize(data=json.load(file)["timetable"], record_path="slots", meta="day")
+    return load_timetable_index(cfg['CLASSROOM']['TIMETABLE_PATH'])
 
-# Initialize facial recognition
+# One gallery shared by all sessions and reloaded when images/ changes, see shared_gallery.py
+@st.cache_resource
+def get_shared_gallery():
+    return shared_gallery_from_config(cfg)
+
+# Initialize facial recognition on the shared gallery of the `images` folder
 @st.cache_resource
 def init_facial_recognition():
-    sfr = SimpleFacerec()
-    sfr.load_encoding_images("images/")  # Load images from the `images` folder
+    if cfg['RECOGNITION_SERVICE']['URL']:
+        # Thin client of recognition_service.py, which holds the gallery and models
+        return recognition_client_from_config(cfg['RECOGNITION_SERVICE'])
+    sfr = SimpleFacerec().use_gallery(get_shared_gallery())
+    sfr.detector = detector_from_config(cfg['DETECTOR'])
+    sfr.quality_gate = quality_gate_from_config(cfg['QUALITY'])
     return sfr
 
-# Mark attendance API call
-def mark_attendance_api(student_id, subject):
-    url = "http://localhost:5001/mark-attendance"
-    payload = {"student_id": student_id, "subject": subject}
-    response = requests.post(url, json=payload)
-    return response.json()
+# Attendance is queued and sent to the backend in the background, see attendance_client.py
+@st.cache_resource
+def get_attendance_client():
+    return attendance_client_from_config(cfg['CLIENT'])
+
+def submit_attendance(student_id, subject, slot):
+    client = get_attendance_client()
+    client.submit(student_id, subject, slot)
+    # submit() only spools the record, it is sent in the background
+    st.success("Attendance saved, it is sent to the backend in the background.")
+    if client.last_error is not None:
+        st.warning(f"The backend was unreachable at the last attempt, {client.pending()} records are waiting.")
 
 # Dashboard Page
 def dashboard():
@@ -35,10 +59,9 @@ def dashboard():
     student_id = st.text_input("Enter Student ID", value="12345")
 
     # Display timetable by day
-    days = timetable["day"].unique()
-    selected_day = st.selectbox("Select Day", days)
+    selected_day = st.selectbox("Select Day", timetable.days)
 
-    filtered_timetable = timetable[timetable["day"] == selected_day]
+    filtered_timetable = timetable.day_slots(selected_day)
 
     st.subheader(f"Timetable for {selected_day}")
 
@@ -66,10 +89,12 @@ def dashboard():
     st.markdown(attendance_button_style, unsafe_allow_html=True)
 
     # Create spacious grid layout for the timetable
-    for index, row in filtered_timetable.iterrows():
-        time = row["time"]
-        subject = row["subject"]
-        teacher = row.get("teacher", "")  # Remove "nan" for missing teacher field
+    for index, entry in enumerate(filtered_timetable):
+        time = entry.slot["time"]
+        subject = entry.slot["subject"]
+        teacher = entry.slot.get("teacher", "")
+        # This lecture of the selected day this week, attendance is marked once per lecture
+        slot = lecture_slot(entry, day_date(selected_day))
 
         # Assign colors dynamically based on subject or time
         if subject == "Break":
@@ -105,7 +130,7 @@ def dashboard():
                 # Only show button for non-break slots
                 if subject != "Break":
                     button_html = f"""
-                    <button class="attendance-btn" id="mark-attendance-button" onclick="mark_attendance('{subject}')">{f"Mark Attendance for {subject}"}</button>
+                    <button class="attendance-btn" id="mark-attendance-button" onclick="mark_attendance('{subject}', '{slot}')">{f"Mark Attendance for {subject}"}</button>
                     """
                     st.markdown(button_html, unsafe_allow_html=True)
 
@@ -116,30 +141,25 @@ def facial_recognition_page():
     st.title("Facial Recognition")
 
     # Ensure required session state variables are available
-    if "student_id" not in st.session_state or "subject" not in st.session_state:
+    if "student_id" not in st.session_state or "subject" not in st.session_state or "slot" not in st.session_state:
         st.error("Missing required data. Please go back to the dashboard.")
         return
 
     student_id = st.session_state["student_id"]
     subject = st.session_state["subject"]
+    slot = st.session_state["slot"]
     sfr = init_facial_recognition()  # Initialize face recognition
 
     st.write(f"Starting facial recognition for **{subject}**...")
     st.write("Accessing webcam...")
 
     # Webcam and facial recognition logic
-    cap = cv2.VideoCapture(0)
+    cap = open_source(cfg['CAPTURE']['SOURCE'], realtime=cfg['CAPTURE']['REALTIME'])
 
     recognized_name = None
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            st.error("Failed to access the webcam.")
-            break
-
-        # Detect faces
-        face_locations, face_names = sfr.detect_known_faces(frame)
-
+    # Capture and face detection run on their own threads, always on the latest frame
+    pipeline = RecognitionPipeline(cap, sfr.detect_known_faces).start()
+    for frame, face_locations, face_names in pipeline.results():
         # Display results
         for face_loc, name in zip(face_locations, face_names):
             top, right, bottom, left = face_loc
@@ -156,17 +176,15 @@ def facial_recognition_page():
         if recognized_name:
             st.success(f"Face recognized as {recognized_name}")
             st.write("Marking attendance...")
-            cap.release()
-
-            # Call the API to mark attendance
-            response = mark_attendance_api(student_id, subject)
-            if response.get("message"):
-                st.success(response["message"])
-            else:
-                st.error("Failed to mark attendance. Check backend.")
+            pipeline.stop()
+
+            # Queue the attendance for the backend
+            submit_attendance(student_id, subject, slot)
             return
+    else:
+        st.error("Failed to access the webcam.")
 
-    cap.release()
+    pipeline.stop()
     st.error("No face recognized. Please try again.")
 
 # Page Routing
@@ -180,7 +198,8 @@ elif st.session_state["page"] == "facial_recognition":
     facial_recognition_page()
 
 # Function to start facial recognition (triggered by button)
-def mark_attendance(subject):
+def mark_attendance(subject, slot):
     st.session_state["subject"] = subject  # Save the subject to session state
+    st.session_state["slot"] = slot  # and the lecture, attendance is marked once per lecture
     st.session_state["page"] = "facial_recognition"  # Navigate to the facial recognition page
     st.experimental_rerun()  # Rerun the app to update the page
\ No newline at end of file
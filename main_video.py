@@ -1,30 +1,58 @@
+import sys
+
 import cv2
+import yaml
+from class_roster import RoomRoster, load_timetable_index
+from face_detectors import detector_from_config
+from face_quality import quality_gate_from_config
+from frame_source import open_source
+from pipeline import RecognitionPipeline
 from simple_facerec import SimpleFacerec
+from user_registry import registry_from_config
+
+
+# Encoding may start worker processes, which import this script again: only run it as a script
+if __name__ == "__main__":
+    cfg = yaml.load(open('config.yaml', 'r'), Loader=yaml.FullLoader)
+
+    # Encode faces from a folder
+    sfr = SimpleFacerec(index=cfg['MATCHING']['INDEX'], index_path=cfg['MATCHING']['INDEX_PATH'])
+    sfr.load_encoding_images("images/", cache_path=cfg['PATH']['PKL_PATH'],
+                             workers=cfg['ENCODING']['WORKERS'])
+    sfr.detector = detector_from_config(cfg['DETECTOR'])
+    sfr.quality_gate = quality_gate_from_config(cfg['QUALITY'])
+
+    # Video source from the command line (webcam ID, video file or image folder), or config.yaml
+    cap = open_source(sys.argv[1] if len(sys.argv) > 1 else cfg['CAPTURE']['SOURCE'], realtime=cfg['CAPTURE']['REALTIME'])
 
-# Encode faces from a folder
-sfr = SimpleFacerec()
-sfr.load_encoding_images("images/")
+    # Match the students of the class scheduled in this room first, at the time of every frame
+    roster = RoomRoster(cfg['CLASSROOM']['ROOM'], load_timetable_index(cfg['CLASSROOM']['TIMETABLE_PATH']),
+                        registry_from_config(cfg['PATH']))
 
-# Load Camera
-cap = cv2.VideoCapture(0)
+    if cfg['RESIZING']['ADAPTIVE']:
+        sfr.enable_adaptive_resizing(cfg['RESIZING']['TARGET_LATENCY_MS'], cfg['RESIZING']['MIN_FACE_SIZE'])
+    sfr.enable_tracking(detect_every=cfg['TRACKING']['DETECT_EVERY'], tracker=cfg['TRACKING']['TRACKER'])
 
+    # Capture and recognition run on their own threads
+    pipeline = RecognitionPipeline(cap, roster.recognizer(sfr, sfr.track_known_faces, cap)).start()
 
-while True:
-    ret, frame = cap.read()
 
-    # Detect Faces
-    face_locations, face_names = sfr.detect_known_faces(frame)
-    for face_loc, name in zip(face_locations, face_names):
-        y1, x2, y2, x1 = face_loc[0], face_loc[1], face_loc[2], face_loc[3]
-        # top = y1, left = x1, bottom = y2, right = x2 
-        cv2.putText(frame, name,(x1, y1 - 10), cv2.FONT_HERSHEY_DUPLEX, 1, (0, 0, 200), 2)
-        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 200, 0), 2)
+    for frame, face_locations, face_names in pipeline.results():
+        # Draw the faces recognized on the latest frame
+        for face_loc, name in zip(face_locations, face_names):
+            y1, x2, y2, x1 = face_loc[0], face_loc[1], face_loc[2], face_loc[3]
+            # top = y1, left = x1, bottom = y2, right = x2 
+            cv2.putText(frame, name,(x1, y1 - 10), cv2.FONT_HERSHEY_DUPLEX, 1, (0, 0, 200), 2)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 200, 0), 2)
 
-    cv2.imshow("Frame", frame)
+        cv2.imshow("Frame", frame)
 
-    key = cv2.waitKey(1)
-    if key == 27:
-        break
+        key = cv2.waitKey(1)
+        if key == 27:
+            break
 
-cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+    print(pipeline.stats())
+    if sfr.quality_gate is not None:
+        print(sfr.quality_stats())
+    pipeline.stop()
+    cv2.destroyAllWindows()
@@ -0,0 +1,237 @@
+import json
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import yaml
+from class_roster import load_timetable_index
+from face_detectors import detector_from_config
+from face_quality import quality_gate_from_config
+from frame_source import open_source
+from pipeline import LatestFrameQueue, StageCounter
+from simple_facerec import SimpleFacerec
+from timetable_index import lecture_slot
+
+# Gallery of a worker process, attached to the shared encoding matrix by init_worker
+worker_sfr = None
+worker_shm = None
+
+
+def init_worker(shm_name, shape, names, index, frame_resizing, detector, quality_gate=None):
+    """
+    Set up the read-only gallery of a recognition worker. The encodings are
+    not copied: the matrix is a view on the shared memory block.
+    """
+    global worker_sfr, worker_shm
+    worker_shm = shared_memory.SharedMemory(name=shm_name)
+    encodings = np.ndarray(shape, dtype=np.float32, buffer=worker_shm.buf)
+    worker_sfr = SimpleFacerec(index=index)
+    worker_sfr.frame_resizing = frame_resizing
+    worker_sfr.detector = detector
+    worker_sfr.quality_gate = quality_gate
+    worker_sfr.load_encodings(names, encodings)
+
+
+def recognize(stream_name, rgb_small_frame):
+    """
+    Recognize the faces of a prepared frame in a worker process.
+    :return: (stream_name, face_locations, face_names, distances)
+    """
+    face_locations = worker_sfr.locate_faces(rgb_small_frame)
+    face_encodings = worker_sfr.encode_faces(rgb_small_frame, face_locations)
+    face_names, distances, _ = worker_sfr.match_faces(face_encodings)
+    return stream_name, worker_sfr.scale_locations(face_locations), face_names, [float(d) for d in distances]
+
+
+class CameraStream:
+    """
+    One video source, read on its own thread into a latest-frame queue.
+    """
+
+    def __init__(self, name, source, room=None, realtime=False):
+        """
+        :param source: Webcam index, video file, image folder or stream URL, see frame_source.py.
+        :param realtime: Replay a video file at its frame rate instead of as fast as possible.
+        """
+        self.name = name
+        self.source = source
+        self.room = room
+        self.realtime = realtime
+        self.frames = LatestFrameQueue(1)
+        self.counter = StageCounter()
+        self.in_flight = False
+        self.ended = False
+        # Time of the last event per student, to report each student once per cooldown
+        self.last_seen = {}
+
+    def start(self):
+        self.capture = open_source(self.source, realtime=self.realtime)
+        threading.Thread(target=self.capture_loop, daemon=True).start()
+
+    def capture_loop(self):
+        while not self.ended:
+            ret, frame = self.capture.read()
+            if not ret:
+                break
+            # Frames of recordings are all processed, live cameras keep only the latest
+            self.frames.put((frame, self.capture.frame_time()), block=not self.capture.realtime)
+        self.ended = True
+        self.capture.release()
+
+
+class MultiCameraService:
+    """
+    Serves several cameras from one machine. Frames are recognized by a pool
+    of worker processes that share one read-only copy of the gallery, and
+    recognized students are reported as attendance events.
+
+    Scheduling is round-robin with at most one frame per stream in flight,
+    so a busy stream cannot starve the others and every stream is always
+    recognized on its latest frame.
+    """
+
+    def __init__(self, sfr, streams, workers=4, on_event=None, cooldown=300, timetable=None):
+        """
+        :param sfr: SimpleFacerec with the gallery loaded.
+        :param streams: List of CameraStream.
+        :param workers: Number of recognition worker processes.
+        :param on_event: Callable receiving every attendance event dict (default: print as JSON).
+        :param cooldown: Seconds before the same student is reported again on the same stream.
+        :param timetable: Optional TimetableIndex; events then carry the lecture held in the stream's room.
+        """
+        self.sfr = sfr
+        self.streams = streams
+        self.workers = workers
+        self.on_event = on_event or (lambda event: print(json.dumps(event), flush=True))
+        self.cooldown = cooldown
+        self.timetable = timetable
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.stopped = threading.Event()
+        self.executor = None
+        self.shm = None
+
+    def share_gallery(self):
+        rows = [i for i, name in enumerate(self.sfr.known_face_names) if name is not None]
+        names = [self.sfr.known_face_names[i] for i in rows]
+        encodings = np.asarray([self.sfr.known_face_encodings[i] for i in rows], dtype=np.float32).reshape(-1, 128)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(encodings.nbytes, 1))
+        shared = np.ndarray(encodings.shape, dtype=np.float32, buffer=self.shm.buf)
+        shared[:] = encodings
+        return names, encodings.shape
+
+    def run(self):
+        """
+        Recognize frames until every stream has ended or stop() is called.
+        """
+        names, shape = self.share_gallery()
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=init_worker,
+            initargs=(self.shm.name, shape, names, self.sfr.matcher.index_kind, self.sfr.frame_resizing,
+                      self.sfr.detector, self.sfr.quality_gate))
+        for stream in self.streams:
+            stream.start()
+
+        try:
+            next_stream = 0
+            while not self.stopped.is_set():
+                if all(s.ended and not len(s.frames) for s in self.streams) and self.in_flight == 0:
+                    break
+                submitted = False
+                # Visit the streams round-robin, starting after the last one served
+                for offset in range(len(self.streams)):
+                    stream = self.streams[(next_stream + offset) % len(self.streams)]
+                    if stream.in_flight or self.in_flight >= 2 * self.workers:
+                        continue
+                    item = stream.frames.get(timeout=0)
+                    if item is None:
+                        continue
+                    self.submit(stream, *item)
+                    next_stream = (next_stream + offset + 1) % len(self.streams)
+                    submitted = True
+                if not submitted:
+                    time.sleep(0.005)
+        finally:
+            self.stop()
+
+    def submit(self, stream, frame, frame_time):
+        with self.lock:
+            stream.in_flight = True
+            self.in_flight += 1
+        future = self.executor.submit(recognize, stream.name, self.sfr.prepare_frame(frame))
+        future.add_done_callback(lambda f, stream=stream: self.on_result(stream, frame_time, f))
+
+    def on_result(self, stream, frame_time, future):
+        with self.lock:
+            stream.in_flight = False
+            self.in_flight -= 1
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            print(f"Recognition failed on stream {stream.name}: {future.exception()}")
+            return
+
+        _, face_locations, face_names, distances = future.result()
+        stream.counter.tick()
+        # Cooldown in source time, so recordings give the same events however fast they are read
+        now = frame_time.timestamp()
+        lecture = self.timetable.lecture_in_room(stream.room, frame_time) \
+            if self.timetable is not None and stream.room is not None else None
+        for name, distance in zip(face_names, distances):
+            if name == "Unknown" or now - stream.last_seen.get(name, -self.cooldown) < self.cooldown:
+                continue
+            stream.last_seen[name] = now
+            event = {
+                "event": "attendance",
+                "stream": stream.name,
+                "room": stream.room,
+                "student_id": name,
+                "distance": round(distance, 4),
+                "timestamp": frame_time.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            if lecture is not None:
+                # Subject and slot of the lecture; the slot is its start, as batch_attendance.py marks it
+                event["subject"] = lecture.slot["subject"]
+                event["teacher"] = lecture.slot.get("teacher")
+                event["class"] = lecture.timetable["class"]
+                event["slot"] = lecture_slot(lecture, frame_time)
+            self.on_event(event)
+
+    def stop(self):
+        self.stopped.set()
+        for stream in self.streams:
+            stream.ended = True
+            stream.frames.close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def stats(self):
+        return {stream.name: {"fps": stream.counter.fps(), "frames": stream.counter.count,
+                              "dropped": stream.frames.dropped} for stream in self.streams}
+
+
+if __name__ == "__main__":
+    cfg = yaml.load(open('config.yaml', 'r'), Loader=yaml.FullLoader)
+
+    sfr = SimpleFacerec(index=cfg['MATCHING']['INDEX'], index_path=cfg['MATCHING']['INDEX_PATH'])
+    sfr.load_encoding_images("images/", cache_path=cfg['PATH']['PKL_PATH'], workers=cfg['ENCODING']['WORKERS'])
+    sfr.detector = detector_from_config(cfg['DETECTOR'])
+    sfr.quality_gate = quality_gate_from_config(cfg['QUALITY'])
+
+    streams = [CameraStream(s['NAME'], s['SOURCE'], s.get('ROOM'), s.get('REALTIME', False))
+               for s in cfg['STREAMS']['SOURCES']]
+    service = MultiCameraService(sfr, streams, workers=cfg['STREAMS']['WORKERS'],
+                                 cooldown=cfg['STREAMS']['EVENT_COOLDOWN'],
+                                 timetable=load_timetable_index(cfg['CLASSROOM']['TIMETABLE_PATH']))
+    try:
+        service.run()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(service.stats()))
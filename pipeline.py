@@ -0,0 +1,225 @@
+import collections
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+class LatestFrameQueue:
+    """
+    Bounded queue that keeps only the newest items. When it is full the oldest
+    item is dropped, so a slow consumer always gets a recent frame instead of
+    working through a backlog.
+    """
+
+    def __init__(self, maxsize=1):
+        self.items = collections.deque()
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def put(self, item, block=False):
+        """
+        :param block: Wait for room instead of dropping the oldest item, for
+            sources that must be processed frame by frame.
+        """
+        with self.condition:
+            if block:
+                self.condition.wait_for(lambda: len(self.items) < self.maxsize or self.closed)
+            if len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """
+        Wait for the next item.
+        :return: The item, or None when the queue was closed and is empty (or on timeout).
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.items or self.closed, timeout):
+                return None
+            item = self.items.popleft() if self.items else None
+            self.condition.notify_all()
+            return item
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def __len__(self):
+        return len(self.items)
+
+
+class StageCounter:
+    """
+    Counts items handled by a pipeline stage and its rate over a sliding window.
+    """
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self.count = 0
+        self.times = collections.deque()
+        self.lock = threading.Lock()
+
+    def tick(self):
+        now = time.monotonic()
+        with self.lock:
+            self.count += 1
+            self.times.append(now)
+            while self.times and now - self.times[0] > self.window:
+                self.times.popleft()
+
+    def fps(self):
+        with self.lock:
+            now = time.monotonic()
+            recent = [t for t in self.times if now - t <= self.window]
+        return len(recent) / self.window
+
+
+class RecognitionPipeline:
+    """
+    Runs capture and recognition on their own threads. The capture thread
+    keeps reading so the driver buffer never fills up, and recognition
+    always works on the latest frame; older frames are dropped. The display
+    stage is the caller's thread, iterating over results(), which keeps
+    cv2.imshow and Streamlit calls on the thread that owns them.
+
+    Frames of a source that is not realtime (a video file read as fast as
+    possible, see frame_source.py) are never dropped: capture waits for
+    recognition instead.
+    """
+
+    def __init__(self, capture, recognize, queue_size=1):
+        """
+        :param capture: Object with read() -> (ret, frame), e.g. a FrameSource or cv2.VideoCapture.
+        :param recognize: Callable frame -> (face_locations, face_names),
+            e.g. SimpleFacerec.detect_known_faces or track_known_faces.
+        :param queue_size: Frames (and results) kept between stages.
+        """
+        self.capture = capture
+        self.recognize = recognize
+        self.frames = LatestFrameQueue(queue_size)
+        self.results_queue = LatestFrameQueue(queue_size)
+        self.counters = {"capture": StageCounter(), "recognition": StageCounter(), "display": StageCounter()}
+        self.stopped = threading.Event()
+        self.threads = []
+
+        # Exception raised by a stage thread, re-raised by results()
+        self.error = None
+
+        # The capture is released by whichever of stop() and the capture thread is last to use it
+        self.release_lock = threading.Lock()
+        self.released = False
+
+        # Drop frames only for live sources
+        self.block = not getattr(capture, "realtime", True)
+
+        # Source time of the frame last yielded by results()
+        self.timestamp = None
+
+    def start(self):
+        self.threads = [threading.Thread(target=self.capture_loop, daemon=True),
+                        threading.Thread(target=self.recognition_loop, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.frames.close()
+        self.results_queue.close()
+        for thread in self.threads:
+            thread.join(timeout=2.0)
+        # A capture thread still inside read() releases the capture itself when read() returns
+        if not self.threads or not self.threads[0].is_alive():
+            self.release_capture()
+
+    def release_capture(self):
+        with self.release_lock:
+            if not self.released:
+                self.released = True
+                self.capture.release()
+
+    def fail(self, error):
+        """
+        Stop the pipeline because a stage raised, so results() can re-raise it.
+        """
+        if self.error is None:
+            self.error = error
+        self.stopped.set()
+
+    def capture_loop(self):
+        try:
+            while not self.stopped.is_set():
+                ret, frame = self.capture.read()
+                if not ret:
+                    break
+                self.counters["capture"].tick()
+                self.frames.put((frame, getattr(self.capture, "timestamp", None)), block=self.block)
+        except Exception as error:
+            self.fail(error)
+        finally:
+            self.frames.close()
+            if self.stopped.is_set():
+                self.release_capture()
+
+    def recognition_loop(self):
+        try:
+            while not self.stopped.is_set():
+                item = self.frames.get()
+                if item is None:
+                    break
+                frame, timestamp = item
+                face_locations, face_names = self.recognize(frame)
+                self.counters["recognition"].tick()
+                self.results_queue.put((frame, face_locations, face_names, timestamp), block=self.block)
+        except Exception as error:
+            # E.g. the recognition service is unreachable
+            self.fail(error)
+        finally:
+            self.results_queue.close()
+            # Unblock a capture thread waiting for room in the frame queue
+            self.frames.close()
+
+    def results(self):
+        """
+        Yield (frame, face_locations, face_names) for the latest recognized frames
+        until the capture ends or the pipeline is stopped. The source time of
+        the frame being yielded is in `timestamp`, see frame_time().
+        :raises Exception: What the capture or recognition thread raised.
+        """
+        while not self.stopped.is_set():
+            result = self.results_queue.get()
+            if result is None:
+                break
+            self.counters["display"].tick()
+            frame, face_locations, face_names, self.timestamp = result
+            yield frame, face_locations, face_names
+        if self.error is not None:
+            raise self.error
+
+    def frame_time(self):
+        """
+        Date and time of the frame last yielded by results(), from the source
+        when it is a FrameSource and the wall clock otherwise.
+        """
+        start_time = getattr(self.capture, "start_time", None)
+        if start_time is None or self.timestamp is None:
+            return datetime.now()
+        return start_time + timedelta(seconds=self.timestamp)
+
+    def stats(self):
+        """
+        Per-stage frame rates and queue depths.
+        """
+        stats = {stage + "_fps": counter.fps() for stage, counter in self.counters.items()}
+        stats.update({
+            "frames_queued": len(self.frames),
+            "frames_dropped": self.frames.dropped,
+            "results_queued": len(self.results_queue),
+            "results_dropped": self.results_queue.dropped,
+        })
+        return stats
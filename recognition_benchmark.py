@@ -0,0 +1,257 @@
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+from detector_benchmark import load_images
+from index_report import synthetic_gallery
+from simple_facerec import SimpleFacerec
+
+
+def percentiles(samples):
+    """
+    Summary of latency samples in milliseconds.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    if not len(samples):
+        return {"count": 0}
+    return {
+        "count": int(len(samples)),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p90_ms": float(np.percentile(samples, 90)),
+        "p99_ms": float(np.percentile(samples, 99)),
+    }
+
+
+def timed(samples, func, *args):
+    """
+    Call func, append its duration in milliseconds to samples and return its result.
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    samples.append((time.perf_counter() - start) * 1000)
+    return result
+
+
+def compose_frame(faces, width, height, count):
+    """
+    Build a BGR frame of the given resolution with `count` faces laid out on a grid.
+    :param faces: RGB face images, used in turn.
+    """
+    frame = np.full((height, width, 3), 96, dtype=np.uint8)
+    cols = math.ceil(math.sqrt(count))
+    rows = math.ceil(count / cols)
+    cell_w, cell_h = width // cols, height // rows
+    for i in range(count):
+        face = faces[i % len(faces)]
+        scale = min(cell_w / face.shape[1], cell_h / face.shape[0])
+        resized = cv2.resize(face, (max(1, int(face.shape[1] * scale)), max(1, int(face.shape[0] * scale))))
+        y, x = (i // cols) * cell_h, (i % cols) * cell_w
+        frame[y:y + resized.shape[0], x:x + resized.shape[1]] = cv2.cvtColor(resized, cv2.COLOR_RGB2BGR)
+    return frame
+
+
+def video_frames(video_path, width, height, limit):
+    """
+    Up to `limit` frames of a recorded video, resized to the given resolution.
+    """
+    capture = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(cv2.resize(frame, (width, height)))
+    capture.release()
+    return frames
+
+
+def bench_load(images_path, workers=None, repeat=1):
+    """
+    Time load_encoding_images on images_path without a cache, and with a warm cache.
+    """
+    cold, warm = [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, "encodings.pkl")
+        for _ in range(repeat):
+            timed(cold, SimpleFacerec().load_encoding_images, images_path, None, workers)
+        # First cached load fills the cache, the following ones are all hits
+        SimpleFacerec().load_encoding_images(images_path, cache_path, workers)
+        for _ in range(repeat):
+            timed(warm, SimpleFacerec().load_encoding_images, images_path, cache_path, workers)
+    return [{"stage": "load", "cache": "cold", "workers": workers, **percentiles(cold)},
+            {"stage": "load", "cache": "warm", "workers": workers, **percentiles(warm)}]
+
+
+def bench_matching(sizes, index="brute", faces_per_frame=(1, 8), queries=200, noise=0.03):
+    """
+    Time building the matcher and matching frames of faces against synthetic galleries.
+    """
+    results = []
+    rng = np.random.default_rng(1)
+    for size in sizes:
+        gallery = synthetic_gallery(size)
+        names = [f"synthetic_{i}" for i in range(size)]
+        sfr = SimpleFacerec(index=index)
+        build = []
+        timed(build, sfr.load_encodings, names, gallery)
+        results.append({"stage": "build", "index": index, "gallery": size, **percentiles(build)})
+
+        for faces in faces_per_frame:
+            samples = []
+            n_frames = max(1, queries // faces)
+            for _ in range(n_frames):
+                picks = rng.integers(0, size, faces)
+                frame_encodings = list(gallery[picks] + rng.normal(size=(faces, 128)).astype(np.float32) * noise)
+                timed(samples, sfr.match_faces, frame_encodings)
+            total_s = sum(samples) / 1000
+            results.append({"stage": "match", "index": index, "gallery": size, "faces": faces,
+                            "throughput_fps": n_frames / total_s if total_s else None, **percentiles(samples)})
+    return results
+
+
+def bench_frames(sfr, frames, label):
+    """
+    Time every stage of detect_known_faces on a list of BGR frames.
+    """
+    stages = {"prepare": [], "detect": [], "encode": [], "match": [], "total": []}
+    found = 0
+    for frame in frames:
+        start = time.perf_counter()
+        rgb_small_frame = timed(stages["prepare"], sfr.prepare_frame, frame)
+        face_locations = timed(stages["detect"], sfr.locate_faces, rgb_small_frame)
+        face_encodings = timed(stages["encode"], sfr.encode_faces, rgb_small_frame, face_locations)
+        timed(stages["match"], sfr.match_faces, face_encodings)
+        stages["total"].append((time.perf_counter() - start) * 1000)
+        found += len(face_locations)
+
+    total_s = sum(stages["total"]) / 1000
+    result = dict(label, stage="frame", frames=len(frames), faces_found=found,
+                  throughput_fps=len(frames) / total_s if total_s else None)
+    result["stages"] = {stage: percentiles(samples) for stage, samples in stages.items()}
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def result_key(result):
+    """
+    Identify a result across runs by everything except its measurements.
+    """
+    measured = {"count", "mean_ms", "p50_ms", "p90_ms", "p99_ms", "throughput_fps", "stages", "faces_found"}
+    return json.dumps({k: v for k, v in result.items() if k not in measured}, sort_keys=True)
+
+
+def result_latencies(result):
+    """
+    (name, p50) pairs of a result, one per stage for frame results.
+    """
+    if "stages" in result:
+        return [(stage, s.get("p50_ms")) for stage, s in result["stages"].items()]
+    return [(result["stage"], result.get("p50_ms"))]
+
+
+def compare(base_path, new_path, threshold=0.1):
+    """
+    Print the p50 latency change of every result found in both runs.
+    :param threshold: Relative slowdown reported as a regression.
+    :return: Number of regressions.
+    """
+    with open(base_path) as f:
+        base = {result_key(r): r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+
+    regressions = 0
+    for result in new:
+        old = base.get(result_key(result))
+        if old is None:
+            continue
+        old_latencies = dict(result_latencies(old))
+        for name, p50 in result_latencies(result):
+            before = old_latencies.get(name)
+            if not before or p50 is None:
+                continue
+            change = p50 / before - 1
+            flag = "REGRESSION" if change > threshold else ""
+            regressions += change > threshold
+            print(f"{result_key(result)} {name}: {before:.2f}ms -> {p50:.2f}ms ({change:+.1%}) {flag}")
+    print(f"{regressions} regressions above {threshold:.0%}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark of the recognition hot path.")
+    parser.add_argument("--images", default="images/", help="Gallery images, also used as faces of the frames")
+    parser.add_argument("--video", help="Replay this video instead of frames composed from the images")
+    parser.add_argument("--gallery", type=int, nargs="+", default=[100, 1000, 10000, 100000],
+                        help="Synthetic gallery sizes of the matching benchmark")
+    parser.add_argument("--index", default="brute", help="Matcher index, see face_index.py")
+    parser.add_argument("--resolutions", nargs="+", default=["640x480", "1280x720", "1920x1080"])
+    parser.add_argument("--faces", type=int, nargs="+", default=[1, 4, 16], help="Faces per composed frame")
+    parser.add_argument("--frames", type=int, default=20, help="Frames per resolution and face count")
+    parser.add_argument("--frame-resizing", type=float, default=0.25)
+    parser.add_argument("--frame-gallery", type=int, default=1000,
+                        help="Synthetic encodings added to the images for the frame benchmark")
+    parser.add_argument("--workers", type=int, default=None, help="Encoding workers of the load benchmark")
+    parser.add_argument("--skip", nargs="*", default=[], choices=["load", "match", "frame"])
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="Compare two result files and exit")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Slowdown reported as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+
+    results = []
+    if "load" not in args.skip:
+        results += bench_load(args.images, args.workers)
+    if "match" not in args.skip:
+        results += bench_matching(args.gallery, index=args.index)
+
+    if "frame" not in args.skip:
+        # Real gallery images plus synthetic encodings, so matching works on a realistic gallery size
+        sfr = SimpleFacerec(index=args.index)
+        sfr.load_encoding_images(args.images)
+        padding = synthetic_gallery(args.frame_gallery, seed=2)
+        sfr.load_encodings(sfr.known_face_names + [f"synthetic_{i}" for i in range(len(padding))],
+                           list(sfr.known_face_encodings) + list(padding))
+        sfr.frame_resizing = args.frame_resizing
+        faces = load_images(args.images)
+
+        for resolution in args.resolutions:
+            width, height = (int(v) for v in resolution.split("x"))
+            if args.video:
+                label = {"video": os.path.basename(args.video), "resolution": resolution}
+                results.append(bench_frames(sfr, video_frames(args.video, width, height, args.frames), label))
+                continue
+            for count in args.faces:
+                frames = [compose_frame(faces[i:] + faces[:i], width, height, count) for i in range(args.frames)]
+                label = {"resolution": resolution, "faces": count}
+                results.append(bench_frames(sfr, frames, label))
+
+    for result in results:
+        latencies = " ".join(f"{name}={p50:.2f}ms" for name, p50 in result_latencies(result) if p50 is not None)
+        throughput = result.get("throughput_fps")
+        print(result_key(result), latencies, f"{throughput:.1f}fps" if throughput else "")
+
+    if args.json:
+        meta = {"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+                "cpus": os.cpu_count(), "date": datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "args": vars(args)}
+        with open(args.json, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
@@ -0,0 +1,75 @@
+import cv2
+import numpy as np
+import requests
+
+
+class RecognitionClient:
+    """
+    Recognizes faces through recognition_service.py instead of loading dlib
+    and the gallery in this process. detect_known_faces returns the same as
+    SimpleFacerec.detect_known_faces, so a client can be passed to
+    RecognitionPipeline in place of a SimpleFacerec, and set_candidates
+    restricts matching the same way (e.g. through class_roster.RoomRoster).
+    Tracking is not available: every frame is detected by the service.
+    """
+
+    def __init__(self, base_url="http://localhost:5002", jpeg_quality=90, timeout=10.0):
+        """
+        :param base_url: Address of recognition_service.py.
+        :param jpeg_quality: JPEG quality frames are sent with.
+        :param timeout: Seconds before a request to the service is given up.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.jpeg_quality = jpeg_quality
+        self.timeout = timeout
+        # One keep-alive connection for all frames
+        self.session = requests.Session()
+        # X-Candidates header sent with every image, see set_candidates
+        self.candidates = None
+
+    def post_image(self, path, image):
+        ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError("Could not encode the image as JPEG")
+        headers = {"Content-Type": "image/jpeg"}
+        if self.candidates is not None:
+            headers["X-Candidates"] = self.candidates
+        response = self.session.post(self.base_url + path, data=jpeg.tobytes(), headers=headers,
+                                     timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def set_candidates(self, names):
+        """
+        Have the service match these names first, as SimpleFacerec.set_candidates.
+        :param names: Names (enrollment numbers) of the candidates, or None to match against everyone.
+        """
+        self.candidates = ",".join(sorted(names)) if names is not None else None
+
+    def recognize(self, frame):
+        """
+        :param frame: BGR frame.
+        :return: List of faces, each a dict with name, box (top, right, bottom, left), distance and margin.
+        """
+        return self.post_image("/recognize", frame)["faces"]
+
+    def recognize_crop(self, crop):
+        """
+        Identify a face that was already detected.
+        :param crop: BGR crop of one face.
+        :return: The face as for recognize, or None.
+        """
+        return self.post_image("/recognize/crop", crop)["face"]
+
+    def detect_known_faces(self, frame):
+        faces = self.recognize(frame)
+        face_locations = np.array([face["box"] for face in faces], dtype=int).reshape(-1, 4)
+        return face_locations, [face["name"] for face in faces]
+
+
+def recognition_client_from_config(section):
+    """
+    :param section: RECOGNITION_SERVICE section of config.yaml.
+    """
+    return RecognitionClient(base_url=section['URL'], jpeg_quality=section['JPEG_QUALITY'],
+                             timeout=section['TIMEOUT'])
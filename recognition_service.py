@@ -0,0 +1,263 @@
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import cv2
+import numpy as np
+import yaml
+from flask import Blueprint, Flask, current_app, request, jsonify
+from attendance_api import RequestError
+from face_detectors import detector_from_config
+from face_quality import quality_gate_from_config
+from shared_gallery import shared_gallery_from_config
+from simple_facerec import SimpleFacerec
+
+cfg = yaml.load(open('config.yaml', 'r'), Loader=yaml.FullLoader)
+
+
+class RecognitionJob:
+    """
+    One image of a request: a whole BGR frame, or a BGR crop of a single face,
+    and the names matched first (see SimpleFacerec.set_candidates), if any.
+    """
+
+    def __init__(self, image, crop=False, candidates=None):
+        self.image = image
+        self.crop = crop
+        self.candidates = candidates
+        self.future = Future()
+
+
+class DynamicBatcher:
+    """
+    Recognizes the images of concurrent requests on one thread. Images that
+    arrive within `max_wait` seconds of each other are handled as a batch:
+    their faces are detected and encoded one image after the other on the
+    warm models, and matched against the gallery in a single search.
+    """
+
+    def __init__(self, sfr, max_batch=16, max_wait=0.01, timeout=8.0):
+        """
+        :param sfr: SimpleFacerec with the gallery, only used by the batching thread.
+        :param max_batch: Most images in one batch.
+        :param max_wait: Seconds the first image of a batch waits for more.
+        :param timeout: Seconds a request waits for its batch. Keep it below the timeout
+            of the clients, or the service works on images nobody waits for any more.
+        """
+        self.sfr = sfr
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.queue = queue.Queue()
+        self.stats = {"images": 0, "batches": 0, "faces": 0}
+        self.thread = threading.Thread(target=self.run, name="recognition-batcher", daemon=True)
+        self.thread.start()
+
+    def recognize(self, image, crop=False, candidates=None):
+        """
+        Queue an image and wait for its batch.
+        :param candidates: frozenset of names matched first, e.g. the class in the room, or None.
+        :return: List of faces, each a dict with name, box (top, right, bottom, left), distance and margin.
+        :raises concurrent.futures.TimeoutError: If the batch was not done within `timeout` seconds.
+        """
+        job = RecognitionJob(image, crop, candidates)
+        self.queue.put(job)
+        try:
+            return job.future.result(self.timeout)
+        except FutureTimeout:
+            # Skipped by the batcher if it did not start on it yet
+            job.future.cancel()
+            raise
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            jobs = [job]
+            deadline = time.perf_counter() + self.max_wait
+            while len(jobs) < self.max_batch:
+                try:
+                    job = self.queue.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if job is None:
+                    # Finish this batch, then stop
+                    self.queue.put(None)
+                    break
+                jobs.append(job)
+            self.process(jobs)
+
+    def process(self, jobs):
+        # Jobs whose request timed out are not worth the work
+        jobs = [job for job in jobs if job.future.set_running_or_notify_cancel()]
+        if not jobs:
+            return
+        done, boxes, encodings = [], [], []
+        for job in jobs:
+            try:
+                if job.crop:
+                    # The whole crop is the face
+                    rgb = cv2.cvtColor(job.image, cv2.COLOR_BGR2RGB)
+                    height, width = rgb.shape[:2]
+                    face_locations = [(0, width, height, 0)]
+                    job_boxes = face_locations
+                else:
+                    rgb = self.sfr.prepare_frame(job.image)
+                    face_locations = self.sfr.locate_faces(rgb)
+                    job_boxes = self.sfr.scale_locations(face_locations).reshape(-1, 4).tolist()
+                job_encodings = self.sfr.encode_faces(rgb, face_locations)
+            except Exception as error:
+                job.future.set_exception(error)
+                continue
+            done.append((job, job_boxes, job_encodings))
+
+        # One gallery search for the faces of all images of the batch with the same candidates
+        groups = {}
+        for item in done:
+            groups.setdefault(item[0].candidates, []).append(item)
+        for candidates, group in groups.items():
+            self.match_group(candidates, group)
+
+        self.stats["images"] += len(jobs)
+        self.stats["batches"] += 1
+
+    def match_group(self, candidates, group):
+        encodings = [encoding for _, _, job_encodings in group for encoding in job_encodings]
+        try:
+            # Only rebuilt when the candidates differ from the previous group's
+            if candidates != self.sfr.candidate_names:
+                self.sfr.set_candidates(candidates)
+            names, distances, margins = self.sfr.match_faces(encodings)
+        except Exception as error:
+            for job, _, _ in group:
+                job.future.set_exception(error)
+            return
+        start = 0
+        for job, job_boxes, _ in group:
+            end = start + len(job_boxes)
+            job.future.set_result([{"name": name, "box": [int(v) for v in box], "distance": finite(distance),
+                                    "margin": finite(margin)}
+                                   for name, box, distance, margin in zip(names[start:end], job_boxes,
+                                                                          distances[start:end], margins[start:end])])
+            self.stats["faces"] += end - start
+            start = end
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+def finite(value):
+    """
+    JSON has no infinity, so distances and margins without a match are null.
+    """
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def request_candidates(headers):
+    """
+    Names a client matches first, sent comma separated in the X-Candidates header.
+    :return: frozenset of names, or None to match against the whole gallery.
+    """
+    if 'X-Candidates' not in headers:
+        return None
+    return frozenset(name for name in headers['X-Candidates'].split(',') if name)
+
+
+def decode_image(data):
+    """
+    :raises RequestError: If the body is not an image.
+    """
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR) if data else None
+    if image is None:
+        raise RequestError("Expected a JPEG image as request body")
+    return image
+
+
+def create_batcher(section):
+    """
+    Load the shared gallery and start the batching thread.
+    :param section: RECOGNITION_SERVICE section of config.yaml.
+    """
+    sfr = SimpleFacerec().use_gallery(shared_gallery_from_config(cfg))
+    sfr.detector = detector_from_config(cfg['DETECTOR'])
+    sfr.quality_gate = quality_gate_from_config(cfg['QUALITY'])
+    return DynamicBatcher(sfr, max_batch=section['MAX_BATCH'], max_wait=section['MAX_WAIT_MS'] / 1000,
+                          timeout=section['WAIT_TIMEOUT'])
+
+
+service = Blueprint("recognition_service", __name__)
+
+
+def create_app(batcher=None):
+    """
+    The service as a Flask app, e.g. for `flask --app recognition_service run` or a WSGI server.
+    The gallery and models are loaded once for all clients when the app is created.
+    :param batcher: DynamicBatcher to use, created from config.yaml by default.
+    """
+    app = Flask(__name__)
+    app.extensions["batcher"] = batcher or create_batcher(cfg['RECOGNITION_SERVICE'])
+    app.register_blueprint(service)
+    return app
+
+
+def current_batcher():
+    return current_app.extensions["batcher"]
+
+
+@service.app_errorhandler(RequestError)
+def request_error(error):
+    return jsonify({"error": str(error)}), error.status
+
+
+@service.app_errorhandler(FutureTimeout)
+def recognition_timeout(error):
+    # The batcher is behind, the client may try again
+    return jsonify({"error": "Recognition timed out"}), 503
+
+
+@service.route('/recognize', methods=['POST'])
+def recognize_frame():
+    """
+    Endpoint to recognize the faces of a video frame.
+    Expects the frame as JPEG request body, and optionally the names to match first
+    (e.g. the class in the room) comma separated in the X-Candidates header.
+    Responds with the `faces` found, each with `name` ("Unknown" without a match),
+    `box` (top, right, bottom, left in frame pixels), `distance` and `margin`.
+    """
+    batcher = current_batcher()
+    faces = batcher.recognize(decode_image(request.get_data()), candidates=request_candidates(request.headers))
+    return jsonify({"faces": faces, "gallery_version": batcher.sfr.gallery_version})
+
+
+@service.route('/recognize/crop', methods=['POST'])
+def recognize_crop():
+    """
+    Endpoint to identify one face that was already detected.
+    Expects the crop of the face as JPEG request body. Responds with the `face` as for /recognize.
+    """
+    batcher = current_batcher()
+    faces = batcher.recognize(decode_image(request.get_data()), crop=True,
+                              candidates=request_candidates(request.headers))
+    return jsonify({"face": faces[0] if faces else None, "gallery_version": batcher.sfr.gallery_version})
+
+
+@service.route('/status', methods=['GET'])
+def status():
+    """
+    Endpoint reporting the gallery version and size, the batching counters and the
+    encodings saved by the quality gate.
+    """
+    batcher = current_batcher()
+    snapshot = batcher.sfr.gallery.snapshot
+    return jsonify({"gallery_version": snapshot.version, "gallery_size": len(snapshot), **batcher.stats,
+                    "quality": batcher.sfr.quality_stats()})
+
+
+if __name__ == '__main__':
+    # Created here rather than on import, as encoding workers may import this module again
+    create_app().run(port=5002, threaded=True)
@@ -0,0 +1,176 @@
+import copy
+import os
+import threading
+
+import numpy as np
+from encoding_cache import EncodingCache
+from face_matcher import FaceMatcher
+from simple_facerec import SimpleFacerec, encode_image
+
+
+class GallerySnapshot:
+    """
+    One version of the gallery: names, encodings and the built matcher.
+    Snapshots are never changed after they are made, so any number of
+    sessions can match against one without locking. A change makes a new
+    snapshot. Rows of replaced people stay in it with the name None, so
+    the rows of the matcher keep their positions.
+    """
+
+    def __init__(self, version, names, encodings, matcher):
+        self.version = version
+        self.names = tuple(names)
+        self.encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, 128)
+        self.encodings.setflags(write=False)
+        self.name_rows = {name: i for i, name in enumerate(self.names) if name is not None}
+        self.matcher = matcher
+
+    def __len__(self):
+        return len(self.name_rows)
+
+
+def images_fingerprint(images_path):
+    """
+    Name, size and modification time of every file in the image folder,
+    which changes whenever an image is added, replaced or deleted.
+    """
+    if not os.path.isdir(images_path):
+        return ()
+    with os.scandir(images_path) as entries:
+        return tuple(sorted((entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+                            for entry in entries if entry.is_file()))
+
+
+class SharedGallery:
+    """
+    The gallery of a whole process, shared by all Streamlit sessions instead
+    of every session loading its own. The current GallerySnapshot is swapped
+    for a new one when the image folder changes or a person is added; the
+    sessions pick it up on their next match, see SimpleFacerec.use_gallery.
+    """
+
+    def __init__(self, images_path="images/", cache_path=None, index="brute", index_path=None,
+                 index_params=None, workers=None):
+        """
+        :param images_path: Folder of gallery images, named after the person.
+        :param cache_path: Optional encoding cache, so reloads only encode changed images.
+        :param index: Nearest-neighbour index used for matching, see face_index.py.
+        :param index_path: Optional pickle file the built index is persisted to.
+        :param workers: Worker processes used to encode images, see encode_images.
+        """
+        self.images_path = images_path
+        self.cache_path = cache_path
+        self.index = index
+        self.index_path = index_path
+        self.index_params = index_params
+        self.workers = workers
+
+        self.snapshot = GallerySnapshot(0, [], [], FaceMatcher(index=index, index_params=index_params))
+        self.fingerprint = None
+        # Only one new snapshot is built at a time; matching never waits for it
+        self.lock = threading.Lock()
+        self.watcher = None
+        self.stop_event = threading.Event()
+        self.stats = {"reloads": 0, "additions": 0}
+
+    def swap(self, names, encodings, matcher):
+        self.snapshot = GallerySnapshot(self.snapshot.version + 1, names, encodings, matcher)
+        print(f"Gallery version {self.snapshot.version}: {len(self.snapshot)} faces.")
+
+    def reload(self):
+        """
+        Load the image folder into a new snapshot. Unchanged images come from the encoding cache.
+        :return: The new snapshot.
+        """
+        with self.lock:
+            fingerprint = images_fingerprint(self.images_path)
+            loader = SimpleFacerec(index=self.index, index_path=self.index_path, index_params=self.index_params)
+            loader.load_encoding_images(self.images_path, cache_path=self.cache_path, workers=self.workers)
+            self.swap(loader.known_face_names, loader.known_face_encodings, loader.matcher)
+            self.fingerprint = fingerprint
+            self.stats["reloads"] += 1
+            return self.snapshot
+
+    def add_person(self, name, img_path):
+        """
+        Add or replace one person without reloading the folder, e.g. after Signup.
+        :return: True if a face was found and the person was added.
+        """
+        img_encoding = encode_image(img_path)
+        if self.cache_path:
+            cache = EncodingCache(self.cache_path)
+            cache.put(img_path, img_encoding)
+            cache.save()
+        if img_encoding is None:
+            print(f"No face found in {name}, skipping this image.")
+            return False
+
+        with self.lock:
+            snapshot = self.snapshot
+            # Sessions keep matching against the current matcher, so the change is made to a copy.
+            # Adding in place keeps the ivf clusters and the ball tree instead of building them again
+            matcher = copy.deepcopy(snapshot.matcher)
+            names = list(snapshot.names)
+            if name in snapshot.name_rows:
+                row = snapshot.name_rows[name]
+                matcher.remove([row])
+                names[row] = None
+            matcher.add(np.asarray(img_encoding, dtype=np.float32)[None])
+            names.append(name)
+            encodings = np.vstack([snapshot.encodings, np.asarray(img_encoding, dtype=np.float32)[None]])
+            if self.index_path:
+                matcher.save(self.index_path, encodings)
+            self.swap(names, encodings, matcher)
+            # The image is in the new snapshot already, so the watcher need not reload for it
+            self.fingerprint = images_fingerprint(self.images_path)
+            self.stats["additions"] += 1
+        return True
+
+    def check(self):
+        """
+        Reload if the image folder changed since the current snapshot was made.
+        :return: True if a new snapshot was loaded.
+        """
+        with self.lock:
+            if images_fingerprint(self.images_path) == self.fingerprint:
+                return False
+        self.reload()
+        return True
+
+    def watch(self, interval=2.0):
+        """
+        Poll the image folder every `interval` seconds on a background thread.
+        """
+        if self.watcher is not None:
+            return self
+
+        def run():
+            while not self.stop_event.wait(interval):
+                try:
+                    self.check()
+                except Exception as error:
+                    # Keep serving the current snapshot and retry on the next poll
+                    print(f"Gallery reload failed: {error}")
+
+        self.watcher = threading.Thread(target=run, name="gallery-watcher", daemon=True)
+        self.watcher.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.watcher is not None:
+            self.watcher.join()
+            self.watcher = None
+
+
+def shared_gallery_from_config(cfg, images_path="images/"):
+    """
+    Load the gallery and start watching the image folder.
+    :param cfg: Whole config.yaml.
+    """
+    gallery = SharedGallery(images_path, cache_path=cfg['PATH']['PKL_PATH'], index=cfg['MATCHING']['INDEX'],
+                            index_path=cfg['MATCHING']['INDEX_PATH'], workers=cfg['ENCODING']['WORKERS'])
+    gallery.reload()
+    if cfg['GALLERY']['WATCH_INTERVAL']:
+        gallery.watch(cfg['GALLERY']['WATCH_INTERVAL'])
+    return gallery
@@ -3,73 +3,467 @@ import cv2
 import os
 import glob
 import numpy as np
+import time
+from concurrent.futures import ProcessPoolExecutor
+from adaptive_resize import AdaptiveResizer
+from encoding_cache import EncodingCache
+from face_detectors import HogDetector
+from face_matcher import FaceMatcher
+from face_tracker import FaceTracker
+
+
+def encode_image(img_path):
+    """
+    Compute the face encoding of a gallery image.
+    :param img_path: Path of the image.
+    :return: Encoding of the first face found, or None if the image has no face.
+    """
+    img = cv2.imread(img_path)
+    rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    face_encodings = face_recognition.face_encodings(rgb_img)
+    return face_encodings[0] if face_encodings else None
+
+
+def encode_images(img_paths, workers=None, progress_every=50):
+    """
+    Encode gallery images, optionally spread over a pool of worker processes.
+    :param img_paths: Paths of the images to encode.
+    :param workers: Number of worker processes. None encodes in this process, 0 uses all CPU cores.
+    :param progress_every: Print progress after this many images.
+    :return: List of encodings (or None) in the same order as img_paths.
+    """
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    total = len(img_paths)
+    results = []
+
+    if workers is None or workers <= 1 or total <= 1:
+        encoded = map(encode_image, img_paths)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=min(workers, total))
+        # Hand out images in chunks to keep the inter-process overhead low
+        chunksize = max(1, total // (workers * 4))
+        encoded = executor.map(encode_image, img_paths, chunksize=chunksize)
+        print(f"Encoding {total} images with {min(workers, total)} workers.")
+
+    try:
+        for img_encoding in encoded:
+            results.append(img_encoding)
+            if len(results) % progress_every == 0 or len(results) == total:
+                print(f"Encoded {len(results)}/{total} images.")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return results
+
 
 class SimpleFacerec:
-    def __init__(self):
+    def __init__(self, index="brute", index_path=None, index_params=None):
+        """
+        :param index: Nearest-neighbour index used for matching: "brute", "ivf" or "balltree".
+        :param index_path: Optional pickle file the built index is persisted to.
+        :param index_params: Keyword arguments of the index, see face_index.py.
+        """
         self.known_face_encodings = []
         self.known_face_names = []
 
+        # Row of every name in the lists above (removed people keep a None row until compact)
+        self.name_rows = {}
+
+        # Gallery index used to match faces, rebuilt when the encodings change
+        self.matcher = FaceMatcher(index=index, index_params=index_params)
+        self.index_path = index_path
+
+        # Optional subset of names matched first, see set_candidates
+        self.candidate_names = None
+        self.candidate_matcher = None
+        self.candidate_rows = None
+
+        # Hit/miss counts of the last cached load
+        self.cache_stats = None
+
         # Resize frame for faster speed
         self.frame_resizing = 0.25
 
-    def load_encoding_images(self, images_path):
+        # Face detector backend, see face_detectors.py
+        self.detector = HogDetector()
+
+        # Optional AdaptiveResizer choosing frame_resizing, see enable_adaptive_resizing
+        self.resizer = None
+        self.last_detection_time = 0.0
+
+        # Tracker used by track_known_faces, see enable_tracking
+        self.tracker = None
+
+        # Optional SharedGallery this instance matches against, see use_gallery
+        self.gallery = None
+        self.gallery_version = None
+
+        # Optional FaceQualityGate deciding which faces are worth encoding, see face_quality.py
+        self.quality_gate = None
+        self.encode_stats = {"faces": 0, "seconds": 0.0}
+
+    def load_encoding_images(self, images_path, cache_path=None, workers=None):
         """
         Load encoding images from path
         :param images_path:
+        :param cache_path: Optional pickle file used as a persistent encoding cache.
+            Only new or changed images are encoded, deleted images are dropped from it.
+        :param workers: Number of worker processes used to encode images.
+            None encodes in this process, 0 uses one worker per CPU core. Worker
+            processes import the main script again, so scripts using them must
+            call this under `if __name__ == "__main__":`.
         :return:
         """
-        # Load images
-        images_path = glob.glob(os.path.join(images_path, "*.*"))
+        cache = EncodingCache(cache_path) if cache_path else None
+
+        # Load images, sorted so names always come out in the same order
+        images_dir = images_path
+        images_path = sorted(glob.glob(os.path.join(images_path, "*.*")))
         print("{} encoding images found.".format(len(images_path)))
 
-        # Store image encoding and names
+        # Get encodings from the cache when the image did not change
+        encodings = {}
+        to_encode = []
         for img_path in images_path:
-            img = cv2.imread(img_path)
-            rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            hit, img_encoding = cache.get(img_path) if cache else (False, None)
+            if hit:
+                encodings[img_path] = img_encoding
+            else:
+                to_encode.append(img_path)
+
+        # Encode the remaining images
+        for img_path, img_encoding in zip(to_encode, encode_images(to_encode, workers)):
+            encodings[img_path] = img_encoding
+            if cache:
+                cache.put(img_path, img_encoding)
 
+        # Store image encoding and names
+        for img_path in images_path:
             # Get the filename only from the initial file path.
             basename = os.path.basename(img_path)
             (filename, ext) = os.path.splitext(basename)
 
-            # Get encoding
-            face_encodings = face_recognition.face_encodings(rgb_img)
-            if face_encodings:  # Ensure at least one face encoding is found
-                img_encoding = face_encodings[0]
-                
-                # Store file name and file encoding
-                self.known_face_encodings.append(img_encoding)
-                self.known_face_names.append(filename)
+            img_encoding = encodings[img_path]
+            if img_encoding is not None:  # Ensure at least one face encoding is found
+                # Store file name and file encoding, replacing an earlier entry of the same name
+                if filename in self.name_rows:
+                    self.known_face_encodings[self.name_rows[filename]] = img_encoding
+                else:
+                    self.name_rows[filename] = len(self.known_face_names)
+                    self.known_face_encodings.append(img_encoding)
+                    self.known_face_names.append(filename)
                 print(f"Encoding for {filename} loaded successfully.")
             else:
                 print(f"No face found in {filename}, skipping this image.")
 
+        if cache:
+            cache.prune(images_dir, images_path)
+            cache.save()
+            self.cache_stats = cache.stats()
+            print("Encoding cache: {hits} hits, {misses} misses, {removed} removed.".format(**self.cache_stats))
+
+        self.compact()
+        self.matcher.build(self.known_face_encodings, index_path=self.index_path)
+        self.refresh_candidates()
         print("Encoding images loaded.")
 
-    def detect_known_faces(self, frame):
+    def load_encodings(self, names, encodings):
+        """
+        Use encodings computed elsewhere as the gallery, e.g. a matrix shared
+        with other processes. A float32 matrix is used without copying it.
+        :param names: Name of every encoding.
+        :param encodings: Sequence or (n, 128) array of encodings.
+        """
+        self.known_face_names = list(names)
+        self.known_face_encodings = list(encodings)
+        self.name_rows = {name: i for i, name in enumerate(self.known_face_names)}
+        self.matcher.build(encodings)
+        self.refresh_candidates()
+
+    def use_gallery(self, gallery):
+        """
+        Match against the current snapshot of a SharedGallery instead of a
+        gallery of its own. Newer snapshots are picked up before each match,
+        without loading anything.
+        :param gallery: SharedGallery, see shared_gallery.py.
+        """
+        self.gallery = gallery
+        self.gallery_version = None
+        self.sync_gallery()
+        return self
+
+    def sync_gallery(self):
+        """
+        Switch to the latest snapshot of the shared gallery, if it changed.
+        """
+        if self.gallery is None:
+            return
+        snapshot = self.gallery.snapshot
+        if snapshot.version == self.gallery_version:
+            return
+        # Snapshots are immutable, so they are used without copying
+        self.known_face_names = snapshot.names
+        self.known_face_encodings = snapshot.encodings
+        self.name_rows = snapshot.name_rows
+        self.matcher = snapshot.matcher
+        self.gallery_version = snapshot.version
+        self.refresh_candidates()
+
+    def compact(self):
+        """
+        Drop the rows of removed people from the encoding and name lists.
+        Only call this right before rebuilding the matcher, since it renumbers rows.
+        """
+        rows = [i for i, name in enumerate(self.known_face_names) if name is not None]
+        self.known_face_encodings = [self.known_face_encodings[i] for i in rows]
+        self.known_face_names = [self.known_face_names[i] for i in rows]
+        self.name_rows = {name: i for i, name in enumerate(self.known_face_names)}
+
+    def add_person(self, name, img_path, cache_path=None):
+        """
+        Add one person to the gallery without reloading it. An existing entry
+        with the same name (enrollment number) is replaced.
+        :param name: Name (enrollment number) of the person.
+        :param img_path: Path of the person's image.
+        :param cache_path: Optional encoding cache the new encoding is recorded in.
+        :return: True if a face was found and the person was added.
+        """
+        if self.gallery is not None:
+            # Every session sharing the gallery gets the person in a new snapshot
+            added = self.gallery.add_person(name, img_path)
+            self.sync_gallery()
+            return added
+
+        img_encoding = encode_image(img_path)
+        if cache_path:
+            cache = EncodingCache(cache_path)
+            cache.put(img_path, img_encoding)
+            cache.save()
+
+        if img_encoding is None:
+            print(f"No face found in {name}, skipping this image.")
+            return False
+
+        self.remove_person(name)
+        self.name_rows[name] = len(self.known_face_names)
+        self.known_face_encodings.append(img_encoding)
+        self.known_face_names.append(name)
+        self.matcher.add([img_encoding])
+        self.refresh_candidates()
+        print(f"Encoding for {name} loaded successfully.")
+        return True
+
+    def update_person(self, name, img_path, cache_path=None):
+        """
+        Replace the face of a person already in the gallery.
+        :return: True if the person was known and the new image has a face.
+        """
+        if name not in self.name_rows:
+            print(f"{name} is not in the gallery, use add_person instead.")
+            return False
+        return self.add_person(name, img_path, cache_path=cache_path)
+
+    def remove_person(self, name):
+        """
+        Remove a person from the gallery. The row is only masked out of the
+        matcher, so the other rows keep their positions.
+        :return: True if the person was in the gallery.
+        """
+        if self.gallery is not None:
+            raise ValueError("Remove the image from the shared gallery's folder instead.")
+        row = self.name_rows.pop(name, None)
+        if row is None:
+            return False
+        self.known_face_names[row] = None
+        self.matcher.remove([row])
+        self.refresh_candidates()
+        return True
+
+    def refresh_candidates(self):
+        if self.candidate_names is not None:
+            self.set_candidates(self.candidate_names)
+
+    def set_candidates(self, names):
+        """
+        Restrict matching to a subset of the known faces, e.g. the students of
+        the class scheduled in the room. Faces without a confident match among
+        the candidates are still matched against the whole gallery.
+        :param names: Names (enrollment numbers) of the candidates, or None to match against everyone.
+        """
+        self.candidate_names = set(names) if names is not None else None
+        if self.candidate_names is None:
+            self.candidate_matcher = None
+            self.candidate_rows = None
+            return
+        rows = [i for i, name in enumerate(self.known_face_names) if name in self.candidate_names]
+        self.candidate_rows = np.asarray(rows, dtype=np.int64)
+        self.candidate_matcher = FaceMatcher([self.known_face_encodings[i] for i in rows],
+                                             tolerance=self.matcher.tolerance)
+
+    def match_faces(self, face_encodings):
+        """
+        Match face encodings against the known faces.
+        :param face_encodings: Encodings of the faces to identify, None for faces that were not encoded.
+        :return: (names, distances, margins), one entry per face. Faces farther
+            than the tolerance from every known face are named "Unknown".
+        """
+        self.sync_gallery()
+        # Faces skipped by the quality gate have no encoding
+        encoded = [i for i, encoding in enumerate(face_encodings) if encoding is not None]
+        if len(encoded) < len(face_encodings):
+            names = ["Unknown"] * len(face_encodings)
+            distances = np.full(len(face_encodings), np.inf, dtype=np.float32)
+            margins = np.full(len(face_encodings), np.inf, dtype=np.float32)
+            if encoded:
+                found_names, found_distances, found_margins = self.match_faces([face_encodings[i] for i in encoded])
+                for i, name in zip(encoded, found_names):
+                    names[i] = name
+                distances[encoded] = found_distances
+                margins[encoded] = found_margins
+            return names, distances, margins
+
+        best_index, best_distance, margin = self.matcher.match(face_encodings) \
+            if self.candidate_matcher is None else self.match_candidates(face_encodings)
+        face_names = []
+        for index, distance in zip(best_index, best_distance):
+            if index >= 0 and distance <= self.matcher.tolerance:
+                face_names.append(self.known_face_names[index])
+            else:
+                face_names.append("Unknown")
+        return face_names, best_distance, margin
+
+    def match_candidates(self, face_encodings):
+        """
+        Match against the candidates first and fall back to the whole gallery
+        for the faces that have no confident candidate match.
+        """
+        best_index, best_distance, margin = self.candidate_matcher.match(face_encodings)
+        if len(self.candidate_rows):
+            # Map candidate rows back to rows of the whole gallery
+            best_index = np.where(best_index >= 0, self.candidate_rows[np.maximum(best_index, 0)], -1)
+
+        fallback = np.flatnonzero(best_distance > self.matcher.tolerance)
+        if len(fallback):
+            index, distance, gap = self.matcher.match([face_encodings[i] for i in fallback])
+            best_index[fallback] = index
+            best_distance[fallback] = distance
+            margin[fallback] = gap
+        return best_index, best_distance, margin
+
+    def prepare_frame(self, frame):
+        """
+        Resize a BGR frame and convert it to RGB for face_recognition.
+        """
         small_frame = cv2.resize(frame, (0, 0), fx=self.frame_resizing, fy=self.frame_resizing)
         
         # Convert the image from BGR color (OpenCV) to RGB color (face_recognition)
-        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-        
-        # Detect faces and face encodings in the current frame
-        face_locations = face_recognition.face_locations(rgb_small_frame)
-        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+        return cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
 
-        face_names = []
-        for face_encoding in face_encodings:
-            # Check if the face matches known encodings
-            matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding)
-            name = "Unknown"
-
-            # Use the known face with the smallest distance to the new face
-            face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-            best_match_index = np.argmin(face_distances)
-            if matches[best_match_index]:
-                name = self.known_face_names[best_match_index]
-            
-            face_names.append(name)
+    def locate_faces(self, rgb_small_frame):
+        """
+        Detect faces in a prepared frame without identifying them.
+        :return: Face locations in the resized frame.
+        """
+        start = time.perf_counter()
+        face_locations = self.detector.detect(rgb_small_frame)
+        self.last_detection_time = time.perf_counter() - start
+        return face_locations
 
-        # Adjust face coordinates based on frame resizing
+    def encode_faces(self, rgb_small_frame, face_locations):
+        """
+        Get face encodings of detected faces. With a quality gate, faces that
+        fail it are not encoded and get None, which match_faces names "Unknown".
+        """
+        selected = list(range(len(face_locations))) if self.quality_gate is None \
+            else self.quality_gate.select(rgb_small_frame, face_locations)
+
+        start = time.perf_counter()
+        encoded = face_recognition.face_encodings(rgb_small_frame, [face_locations[i] for i in selected]) \
+            if selected else []
+        self.encode_stats["seconds"] += time.perf_counter() - start
+        self.encode_stats["faces"] += len(selected)
+        if len(selected) == len(face_locations):
+            return encoded
+
+        face_encodings = [None] * len(face_locations)
+        for i, encoding in zip(selected, encoded):
+            face_encodings[i] = encoding
+        return face_encodings
+
+    def quality_stats(self):
+        """
+        Counters of the quality gate, with the encodings it saved and an
+        estimate of the encoding time saved, at the average time per face.
+        """
+        if self.quality_gate is None:
+            return None
+        saved = self.quality_gate.skipped()
+        per_face = self.encode_stats["seconds"] / self.encode_stats["faces"] if self.encode_stats["faces"] else 0.0
+        return dict(self.quality_gate.stats, encodings_saved=saved, encode_seconds_saved=round(saved * per_face, 3))
+
+    def scale_locations(self, face_locations):
+        """
+        Adjust face coordinates of the resized frame to the original frame.
+        """
         face_locations = np.array(face_locations)
         face_locations = face_locations / self.frame_resizing
-        return face_locations.astype(int), face_names
\ No newline at end of file
+        return face_locations.astype(int)
+
+    def detect_known_faces(self, frame):
+        rgb_small_frame = self.prepare_frame(frame)
+
+        # Detect faces and face encodings in the current frame
+        face_locations = self.locate_faces(rgb_small_frame)
+        face_encodings = self.encode_faces(rgb_small_frame, face_locations)
+
+        # Match all faces of the frame against the gallery at once
+        face_names, _, _ = self.match_faces(face_encodings)
+
+        # Adjust face coordinates based on frame resizing
+        face_locations_scaled = self.scale_locations(face_locations)
+        self.adapt_resizing(face_locations)
+        return face_locations_scaled, face_names
+
+    def enable_adaptive_resizing(self, target_latency_ms=80, min_face_size=40, **params):
+        """
+        Let frame_resizing follow the detection latency and the size of the faces seen.
+        :param target_latency_ms: Detection time allowed per frame.
+        :param min_face_size: Face height in pixels the detector needs in the resized frame.
+        :param params: Other keyword arguments of AdaptiveResizer.
+        """
+        self.resizer = AdaptiveResizer(target_latency_ms=target_latency_ms, min_face_size=min_face_size,
+                                       initial_scale=self.frame_resizing, **params)
+
+    def adapt_resizing(self, face_locations):
+        """
+        Choose the scale of the next frame after a detection.
+        :param face_locations: Locations found on the current frame, in the resized frame.
+        :return: Ratio between the new and the old scale (1.0 when unchanged or disabled).
+        """
+        if self.resizer is None:
+            return 1.0
+        heights = [(bottom - top) / self.frame_resizing for top, right, bottom, left in face_locations]
+        scale = self.resizer.update(self.last_detection_time, heights)
+        ratio = scale / self.frame_resizing
+        self.frame_resizing = scale
+        return ratio
+
+    def enable_tracking(self, detect_every=5, tracker="template"):
+        """
+        Switch track_known_faces to a new tracking configuration.
+        :param detect_every: Run detection and encoding every this many frames.
+        :param tracker: Tracker following faces between detections, see face_tracker.py.
+        """
+        self.tracker = FaceTracker(self, detect_every=detect_every, tracker=tracker)
+
+    def track_known_faces(self, frame):
+        """
+        Same result as detect_known_faces, for consecutive video frames.
+        Faces are detected only every few frames (or when a track is lost) and
+        followed by a cheap tracker in between, so each face is encoded once.
+        """
+        if self.tracker is None:
+            self.enable_tracking()
+        return self.tracker.process(frame)
@@ -0,0 +1,82 @@
+import os
+import sys
+import types
+import zlib
+
+import numpy as np
+import pytest
+
+# The modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import face_recognition
+except ImportError:
+    # dlib is not needed by the tests: an empty module lets the code that imports
+    # face_recognition load, and fake_faces stands in for the functions it calls
+    face_recognition = types.ModuleType("face_recognition")
+    sys.modules["face_recognition"] = face_recognition
+
+
+def fake_encoding(image):
+    """
+    Stand-in encoding, the same for identical images and about 1.1 apart for
+    different ones, so each test image is a distinct person.
+    """
+    rng = np.random.default_rng(zlib.crc32(np.ascontiguousarray(image).tobytes()))
+    return rng.normal(scale=0.1, size=128)
+
+
+def fake_locations(image, number_of_times_to_upsample=1, model="hog"):
+    # One face in the middle of every image that is not black
+    height, width = image.shape[:2]
+    if not image.any():
+        return []
+    return [(height // 4, width * 3 // 4, height * 3 // 4, width // 4)]
+
+
+def fake_encodings(image, known_face_locations=None, num_jitters=1, model="small"):
+    locations = fake_locations(image) if known_face_locations is None else known_face_locations
+    return [fake_encoding(image[top:bottom, left:right]) for top, right, bottom, left in locations]
+
+
+def fake_landmarks(image, face_locations=None, model="large"):
+    # Eyes level and the nose between them: a frontal face
+    landmarks = []
+    for top, right, bottom, left in face_locations if face_locations is not None else fake_locations(image):
+        width, middle = right - left, (top + bottom) // 2
+        landmarks.append({"left_eye": [(left + width // 4, middle)], "right_eye": [(right - width // 4, middle)],
+                          "nose_tip": [((left + right) // 2, middle + 5)]})
+    return landmarks
+
+
+def fake_load_image_file(path, mode="RGB"):
+    import cv2
+
+    return cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+
+
+@pytest.fixture
+def fake_faces(monkeypatch):
+    """
+    Replace the face_recognition functions with the fakes above, whether dlib is installed or not.
+    """
+    for name, function in (("face_locations", fake_locations), ("face_encodings", fake_encodings),
+                           ("face_landmarks", fake_landmarks), ("load_image_file", fake_load_image_file)):
+        monkeypatch.setattr(face_recognition, name, function, raising=False)
+    return fake_encoding
+
+
+@pytest.fixture
+def write_image():
+    """
+    :return: write(path, seed), writing a random colour image, a distinct person for every seed.
+    """
+    import cv2
+
+    def write(path, seed, size=(120, 160)):
+        image = np.random.default_rng(seed).integers(1, 255, size=size + (3,), dtype=np.uint8)
+        cv2.imwrite(str(path), image)
+        return str(path)
+
+    return write
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from adaptive_resize import AdaptiveResizer
+from simple_facerec import SimpleFacerec
+
+
+def test_large_faces_lower_the_scale():
+    resizer = AdaptiveResizer(target_latency_ms=80, min_face_size=40)
+    assert resizer.update(0.001, [400]) == 0.1
+
+
+def test_small_faces_raise_the_scale():
+    resizer = AdaptiveResizer(target_latency_ms=80, min_face_size=40)
+    assert resizer.update(0.001, [80]) == 0.5
+
+
+def test_latency_budget_caps_the_scale():
+    # 80 ms at scale 0.25 is 1.28 s at full scale, so 0.25 is all the budget allows
+    resizer = AdaptiveResizer(target_latency_ms=80, min_face_size=40)
+    assert resizer.update(0.08, [40]) == 0.25
+
+
+def test_without_faces_the_budget_decides():
+    resizer = AdaptiveResizer(target_latency_ms=80, min_face_size=40)
+    assert resizer.update(0.02, []) == 0.5
+    assert AdaptiveResizer(target_latency_ms=80).update(0.0001, []) == 1.0
+
+
+def test_smallest_recent_face_is_kept_detectable():
+    resizer = AdaptiveResizer(target_latency_ms=80, min_face_size=40, window=3)
+    resizer.update(0.001, [80])
+    assert resizer.update(0.001, [400]) == 0.5
+    resizer.update(0.001, [400])
+    # The small face left the window
+    assert resizer.update(0.001, [400]) == 0.1
+
+
+def test_scales_are_rounded_to_the_step():
+    resizer = AdaptiveResizer(target_latency_ms=80, min_face_size=40, step=0.05)
+    scale = resizer.update(0.001, [130])
+    assert scale == pytest.approx(0.3)
+
+
+def test_detection_picks_the_scale_of_the_next_frame(fake_faces):
+    sfr = SimpleFacerec()
+    sfr.enable_adaptive_resizing(target_latency_ms=1000, min_face_size=40)
+    frame = np.random.default_rng(0).integers(1, 255, size=(400, 400, 3), dtype=np.uint8)
+    locations, _ = sfr.detect_known_faces(frame)
+    # Found at 0.25 and scaled back to the frame, 200 pixels high
+    assert [tuple(location) for location in locations] == [(100, 300, 300, 100)]
+    assert sfr.frame_resizing == pytest.approx(0.2)
+    locations, _ = sfr.detect_known_faces(frame)
+    assert [tuple(location) for location in locations] == [(100, 300, 300, 100)]
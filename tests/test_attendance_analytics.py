@@ -0,0 +1,127 @@
+import random
+import sqlite3
+
+import pytest
+from attendance_analytics import AttendanceAnalytics, rebuild_counters
+from attendance_store import AttendanceStore
+from timetable_index import TimetableIndex
+from user_registry import UserRegistry
+
+COUNTER_TABLES = ("student_subject_counts", "daily_counts", "lectures", "subject_counts")
+
+# Two sections of one branch that share a subject, Monday 2024-07-01 is the first day of the term
+TIMETABLES = [
+    {"class": "IT 7A", "room": "219", "semester": "7", "timetable": [
+        {"day": "Monday", "slots": [{"time": "8:30-9:30", "subject": "Math"},
+                                    {"time": "9:30-10:25", "subject": "Physics"}]}]},
+    {"class": "CS 7B", "room": "220", "semester": "7", "timetable": [
+        {"day": "Monday", "slots": [{"time": "9:30-10:25", "subject": "Math"}]}]},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = AttendanceStore(str(tmp_path / "attendance.db"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def users(tmp_path):
+    registry = UserRegistry(str(tmp_path / "users.db"), users_dir=None)
+    registry.save_many([{"enrollment": "a1", "name": "A1", "class": "IT", "semester": "7"},
+                        {"enrollment": "a2", "name": "A2", "class": "IT", "semester": "7"},
+                        {"enrollment": "b1", "name": "B1", "class": "CS 7B", "semester": "7"}])
+    return registry
+
+
+def mark(student_id, subject, slot):
+    return {"student_id": student_id, "subject": subject, "timestamp": slot + ":05", "slot": slot}
+
+
+def report(analytics):
+    return {(row["student_id"], row["subject"]): (row["marks"], row["lectures"], row["percentage"])
+            for row in analytics.student_report()}
+
+
+def counters(connection):
+    return {table: sorted(map(tuple, connection.execute(f"SELECT * FROM {table}"))) for table in COUNTER_TABLES}
+
+
+def test_two_students_at_one_lecture_count_one_lecture(store):
+    store.add_many([mark("a1", "Math", "2024-07-01 08:30"), mark("a2", "Math", "2024-07-01 08:30")])
+    assert report(AttendanceAnalytics(store)) == {("a1", "Math"): (1, 1, 100.0), ("a2", "Math"): (1, 1, 100.0)}
+
+
+def test_lectures_come_from_the_timetable_of_each_class(store, users):
+    # Three Mondays of term; the sections attend their own Math lecture in the first week only
+    store.add_many([mark("a1", "Math", "2024-07-01 08:30"), mark("a2", "Math", "2024-07-01 08:30"),
+                    mark("b1", "Math", "2024-07-01 09:30")])
+    analytics = AttendanceAnalytics(store, TimetableIndex(TIMETABLES), users,
+                                    term_start="2024-07-01", term_end="2024-07-21")
+    assert report(analytics) == {("a1", "Math"): (1, 3, 33.3), ("a2", "Math"): (1, 3, 33.3),
+                                 ("b1", "Math"): (1, 3, 33.3)}
+
+
+def test_students_outside_the_timetable_fall_back_to_marked_lectures(store, users):
+    store.add_many([mark("x9", "Math", "2024-07-01 08:30"), mark("a1", "Math", "2024-07-01 08:30")])
+    analytics = AttendanceAnalytics(store, TimetableIndex(TIMETABLES), users,
+                                    term_start="2024-07-01", term_end="2024-07-14")
+    assert report(analytics) == {("a1", "Math"): (1, 2, 50.0), ("x9", "Math"): (1, 1, 100.0)}
+
+
+def test_migrated_slots_are_no_lectures(tmp_path):
+    path = str(tmp_path / "old.db")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE attendance (id INTEGER PRIMARY KEY AUTOINCREMENT, student_id TEXT NOT NULL, "
+                       "subject TEXT NOT NULL, date TEXT NOT NULL, timestamp TEXT NOT NULL)")
+    connection.executemany("INSERT INTO attendance (student_id, subject, date, timestamp) VALUES (?, ?, ?, ?)",
+                           [("a1", "Math", "2024-07-01", "2024-07-01 08:35:00"),
+                            ("a1", "Math", "2024-07-01", "2024-07-01 09:35:00"),
+                            ("a2", "Math", "2024-07-01", "2024-07-01 08:36:00")])
+    connection.commit()
+    connection.close()
+
+    store = AttendanceStore(path)
+    try:
+        assert tuple(store.reader().execute("SELECT lectures, marks FROM subject_counts").fetchone()) == (0, 3)
+        store.add_many([mark("a1", "Math", "2024-07-08 08:30"), mark("a2", "Math", "2024-07-08 08:30")])
+        assert tuple(store.reader().execute("SELECT lectures, marks FROM subject_counts").fetchone()) == (1, 5)
+    finally:
+        store.close()
+
+
+def test_counters_of_an_earlier_version_are_recomputed(tmp_path):
+    path = str(tmp_path / "attendance.db")
+    store = AttendanceStore(path)
+    store.add_many([mark("a1", "Math", "2024-07-01 08:30")])
+    store.close()
+    # Counters of the first version also counted migrated slots as lectures
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute("INSERT INTO lectures VALUES ('Math', '2024-07-01 08:35:00#2', '2024-07-01')")
+        connection.execute("UPDATE subject_counts SET lectures = 2")
+        connection.execute("PRAGMA user_version = 1")
+    connection.close()
+
+    store = AttendanceStore(path)
+    try:
+        assert report(AttendanceAnalytics(store)) == {("a1", "Math"): (1, 1, 100.0)}
+    finally:
+        store.close()
+
+
+def test_counters_match_rebuild_counters(store):
+    rng = random.Random(7)
+    slots = [f"2024-07-{day:02d} {hour:02d}:30" for day in range(1, 15) for hour in (8, 9, 11)]
+    records = [mark(f"s{rng.randrange(30)}", rng.choice(["Math", "Physics", "C#.Net"]), rng.choice(slots))
+               for _ in range(2000)]
+    for i in range(0, len(records), 137):
+        store.add_many(records[i:i + 137])
+
+    connection = store.connect()
+    counted = counters(connection)
+    with connection:
+        rebuild_counters(connection)
+    assert counters(connection) == counted
+    connection.close()
@@ -0,0 +1,169 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from attendance_client import AttendanceClient
+
+
+class StubBackend:
+    """
+    POST /mark-attendance/bulk answering with `status`, recording the batches it accepted.
+    """
+
+    def __init__(self, status=200, body=None):
+        self.status = status
+        # Answer of accepted batches, instead of the one of the bulk endpoint
+        self.body = body
+        self.batches = []
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                records = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["records"]
+                stub.requests += 1
+                if stub.status == 200 and stub.body:
+                    body = stub.body
+                elif stub.status == 200:
+                    stub.batches.append(records)
+                    body = {"accepted": records, "duplicates": [], "rejected": []}
+                else:
+                    body = {"error": "stub"}
+                data = json.dumps(body).encode()
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def records(self):
+        return [record for batch in self.batches for record in batch]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def backend():
+    backend = StubBackend()
+    yield backend
+    backend.close()
+
+
+def make_client(url, tmp_path, **kwargs):
+    kwargs = dict({"batch_size": 100, "flush_interval": 0.2, "max_backoff": 0.2}, **kwargs)
+    return AttendanceClient(base_url=url, spool_path=str(tmp_path / "spool.jsonl"), **kwargs)
+
+
+def submit(client, count, start=0):
+    for i in range(start, start + count):
+        client.submit(f"s{i}", "Math", "2024-07-01 08:30")
+
+
+def test_records_of_a_burst_are_sent_in_one_batch(backend, tmp_path):
+    client = make_client(backend.url, tmp_path, flush_interval=0.5)
+    submit(client, 20)
+    assert client.flush(timeout=5)
+    client.close()
+    assert backend.requests == 1
+    assert [r["student_id"] for r in backend.records()] == [f"s{i}" for i in range(20)]
+
+
+def test_full_batches_are_sent_without_waiting(backend, tmp_path):
+    client = make_client(backend.url, tmp_path, batch_size=10, flush_interval=30)
+    submit(client, 10)
+    deadline = time.time() + 5
+    while not backend.batches and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(backend.records()) == 10
+    client.close(timeout=0.1)
+
+
+def test_spool_survives_a_restart(tmp_path):
+    down = StubBackend(status=500)
+    client = make_client(down.url, tmp_path)
+    submit(client, 5)
+    assert not client.flush(timeout=0.5)
+    assert client.pending() == 5
+    assert client.stats["failures"] >= 1
+    client.close(timeout=0.1)
+    down.close()
+
+    up = StubBackend()
+    client = make_client(up.url, tmp_path)
+    submit(client, 2, start=5)
+    assert client.flush(timeout=5)
+    client.close()
+    up.close()
+    # Everything once, in order
+    assert [r["student_id"] for r in up.records()] == [f"s{i}" for i in range(7)]
+    assert client.pending() == 0
+
+
+def test_offset_skips_records_already_sent(backend, tmp_path):
+    client = make_client(backend.url, tmp_path, batch_size=3)
+    submit(client, 3)
+    deadline = time.time() + 5
+    while client.read_offset() == 0 and not backend.batches and time.time() < deadline:
+        time.sleep(0.01)
+    client.close()
+
+    client = make_client(backend.url, tmp_path, batch_size=3)
+    submit(client, 1, start=3)
+    assert client.flush(timeout=5)
+    client.close()
+    assert [r["student_id"] for r in backend.records()] == ["s0", "s1", "s2", "s3"]
+
+
+def test_refused_batches_are_quarantined(tmp_path):
+    refusing = StubBackend(status=400)
+    client = make_client(refusing.url, tmp_path)
+    submit(client, 3)
+    # The spool drains instead of retrying the batch forever
+    assert client.flush(timeout=5)
+    client.close()
+    refusing.close()
+    assert client.stats["quarantined"] == 3
+    assert refusing.requests == 1
+    with open(client.rejected_path) as f:
+        assert [json.loads(line)["student_id"] for line in f] == ["s0", "s1", "s2"]
+
+
+def test_unreadable_spool_lines_are_quarantined(backend, tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    good = json.dumps({"student_id": "s0", "subject": "Math", "slot": "2024-07-01 08:30"})
+    # A record half written before a crash, with the next record appended to it
+    spool.write_text(good + "\n" + '{"student_id": "s1", "sub' + good.replace("s0", "s2") + "\n" + "[]\n")
+    client = make_client(backend.url, tmp_path)
+    submit(client, 1, start=3)
+    assert client.flush(timeout=5)
+    client.close()
+    assert [r["student_id"] for r in backend.records()] == ["s0", "s3"]
+    assert client.stats["quarantined"] == 2
+    with open(client.rejected_path) as f:
+        assert len(f.readlines()) == 2
+
+
+def test_sender_survives_an_unexpected_answer(tmp_path):
+    backend = StubBackend(body={"ok": True})
+    client = make_client(backend.url, tmp_path)
+    submit(client, 2)
+    assert not client.flush(timeout=0.5)
+    assert client.sender.is_alive()
+    assert isinstance(client.last_error, ValueError)
+
+    backend.body = None
+    assert client.flush(timeout=5)
+    client.close()
+    backend.close()
+    assert [r["student_id"] for r in backend.records()] == ["s0", "s1"]
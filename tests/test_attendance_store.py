@@ -0,0 +1,152 @@
+import threading
+
+import pytest
+from attendance_store import AttendanceStore, PendingWrite, page_query
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = AttendanceStore(str(tmp_path / "attendance.db"))
+    yield store
+    store.close()
+
+
+def mark(student_id, subject, timestamp, slot):
+    return {"student_id": student_id, "subject": subject, "timestamp": timestamp, "slot": slot}
+
+
+def fill(store, students=20, lectures=30):
+    records = [mark(f"s{s:02d}", "Math" if l % 2 else "Physics", f"2024-07-{1 + l // 3:02d} 09:{l % 3:02d}:00",
+                    f"2024-07-{1 + l // 3:02d} {8 + l % 3}:30")
+               for l in range(lectures) for s in range(students)]
+    return store.add_many(records)
+
+
+def test_add_many_keeps_order_and_flags_duplicates(store):
+    stored = store.add_many([mark("1", "Math", "2024-07-01 08:35:00", "2024-07-01 08:30"),
+                             mark("2", "Math", "2024-07-01 08:36:00", "2024-07-01 08:30"),
+                             mark("1", "Math", "2024-07-01 08:40:00", "2024-07-01 08:30")])
+    assert [r["student_id"] for r in stored] == ["1", "2", "1"]
+    assert [r["duplicate"] for r in stored] == [False, False, True]
+    # A duplicate returns the id of the first mark
+    assert stored[2]["id"] == stored[0]["id"]
+
+    again = store.add("1", "Math", "2024-07-01 09:00:00", slot="2024-07-01 08:30")
+    assert again["duplicate"] and again["id"] == stored[0]["id"]
+    # The stored record is returned, not the one submitted again
+    assert again["timestamp"] == "2024-07-01 08:35:00"
+
+
+def test_two_lectures_of_a_subject_on_one_day_are_both_marked(store):
+    stored = store.add_many([mark("1", "C#.Net Lab", "2024-07-01 08:35:00", "2024-07-01 08:30"),
+                             mark("1", "C#.Net Lab", "2024-07-01 09:35:00", "2024-07-01 09:30")])
+    assert [r["duplicate"] for r in stored] == [False, False]
+
+
+@pytest.mark.parametrize("filters", [{}, {"student_id": "s03"}, {"subject": "Math"},
+                                     {"student_id": "s03", "date_from": "2024-07-03", "date_to": "2024-07-07"}])
+def test_pages_cover_every_record_once(store, filters):
+    fill(store)
+    expected, _ = store.query(limit=100000, **filters)
+
+    records, cursor = store.query(limit=7, **filters)
+    while cursor is not None:
+        page, cursor = store.query(cursor=cursor, limit=7, **filters)
+        records += page
+    assert [r["id"] for r in records] == [r["id"] for r in expected]
+    assert [r["id"] for r in records] == sorted((r["id"] for r in records), reverse=True)
+
+
+def test_new_records_do_not_shift_later_pages(store):
+    fill(store, students=5, lectures=4)
+    first, cursor = store.query(limit=5)
+    second, _ = store.query(cursor=cursor, limit=5)
+    store.add("new", "Math", "2024-08-01 09:00:00", slot="2024-08-01 8:30")
+    assert store.query(cursor=cursor, limit=5)[0] == second
+
+
+@pytest.mark.parametrize("filters", [{"student_id": "s03"}, {"subject": "Math"},
+                                     {"student_id": "s03", "cursor": 100, "date_from": "2024-07-03"}])
+def test_student_and_subject_pages_are_not_sorted(store, filters):
+    fill(store)
+    sql, params = page_query(limit=100, **filters)
+    plan = " ".join(row[3] for row in store.reader().execute("EXPLAIN QUERY PLAN " + sql, params))
+    assert "TEMP B-TREE" not in plan
+    assert "_page" in plan
+
+
+def test_records_without_slot_are_refused(store):
+    with pytest.raises(ValueError):
+        store.add_many([{"student_id": "1", "subject": "Math", "timestamp": "2024-07-01 08:35:00"}])
+
+
+def within(seconds, function, *args):
+    """
+    Call a function on a thread, so a write that never returns fails the test instead of hanging it.
+    :return: Its result or the exception it raised.
+    """
+    outcome = []
+
+    def run():
+        try:
+            outcome.append(function(*args))
+        except Exception as error:
+            outcome.append(error)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=seconds)
+    assert outcome, "the write never returned"
+    return outcome[0]
+
+
+def test_bad_record_does_not_stop_the_writer(store):
+    # No timestamp: insert raises KeyError on the writer thread
+    error = within(5, store.add_many, [{"student_id": "1", "subject": "Math", "slot": "2024-07-01 08:30"}])
+    assert isinstance(error, KeyError)
+    stored = within(5, store.add, "1", "Math", "2024-07-01 08:35:00", "2024-07-01 08:30")
+    assert not stored["duplicate"]
+
+
+def test_bad_record_only_fails_its_own_write(store):
+    good, bad = PendingWrite([mark("1", "Math", "2024-07-01 08:35:00", "2024-07-01 08:30")]), \
+        PendingWrite([{"student_id": "2", "subject": "Math", "slot": "2024-07-01 08:30"}])
+    connection = store.connect()
+    store.commit(connection, [bad, good])
+    connection.close()
+    assert bad.done.is_set() and isinstance(bad.error, KeyError)
+    assert good.done.is_set() and good.error is None and good.ids[0][1] is None
+
+
+def test_api_rejects_records_without_slot():
+    from attendance_api import bulk_records
+
+    valid, rejected = bulk_records({"records": [
+        {"student_id": "1", "subject": "Math", "slot": "2024-07-01 08:30"},
+        {"student_id": "2", "subject": "Math"},
+    ]})
+    assert [r["student_id"] for r in valid] == ["1"]
+    assert [r["index"] for r in rejected] == [1]
+
+
+def test_migrate_keeps_same_day_duplicates_apart(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "old.db")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE attendance (id INTEGER PRIMARY KEY AUTOINCREMENT, student_id TEXT NOT NULL, "
+                       "subject TEXT NOT NULL, date TEXT NOT NULL, timestamp TEXT NOT NULL)")
+    connection.executemany("INSERT INTO attendance (student_id, subject, date, timestamp) VALUES (?, ?, ?, ?)", [
+        ("1", "Math", "2024-07-01", "2024-07-01 08:35:00"),
+        ("1", "Math", "2024-07-01", "2024-07-01 09:35:00"),
+        ("2", "Math", "2024-07-01", "2024-07-01 08:36:00"),
+    ])
+    connection.commit()
+    connection.close()
+
+    store = AttendanceStore(path)
+    records, _ = store.query(limit=10)
+    # The first mark of a day keeps the date as slot, later ones are kept apart by id
+    assert sorted(r["slot"] for r in records) == ["2024-07-01", "2024-07-01", "2024-07-01 09:35:00#2"]
+    assert store.add("1", "Math", "2024-07-01 10:00:00", slot="2024-07-01")["duplicate"]
+    store.close()
@@ -0,0 +1,84 @@
+import pytest
+from backend import create_app
+
+
+@pytest.fixture
+def client(tmp_path):
+    app = create_app(str(tmp_path / "attendance.db"))
+    yield app.test_client()
+    app.extensions["attendance_store"].close()
+
+
+def mark(student_id, timestamp="2024-07-01 08:35:00", slot="2024-07-01 08:30", subject="Math"):
+    return {"student_id": student_id, "subject": subject, "slot": slot, "timestamp": timestamp}
+
+
+def test_marking_again_returns_the_stored_record(client):
+    first = client.post("/mark-attendance", json=mark("1")).json
+    assert first["message"] == "Attendance marked successfully!"
+
+    again = client.post("/mark-attendance", json=mark("1", timestamp="2024-07-01 09:20:00")).json
+    assert again["message"] == "Attendance already marked."
+    assert again["record"]["duplicate"]
+    assert again["record"]["id"] == first["record"]["id"]
+    assert again["record"]["timestamp"] == "2024-07-01 08:35:00"
+
+
+def test_bulk_duplicates_are_the_stored_records(client):
+    client.post("/mark-attendance", json=mark("1"))
+    result = client.post("/mark-attendance/bulk", json={"records": [
+        mark("1", timestamp="2024-07-01 09:20:00"), mark("2"), {"student_id": "3", "subject": "Math"},
+    ]}).json
+    assert [r["student_id"] for r in result["accepted"]] == ["2"]
+    assert [r["timestamp"] for r in result["duplicates"]] == ["2024-07-01 08:35:00"]
+    assert [r["index"] for r in result["rejected"]] == [2]
+
+
+@pytest.mark.parametrize("body", [{"student_id": "1", "subject": "Math"},
+                                  {"subject": "Math", "slot": "2024-07-01 08:30"},
+                                  dict(mark("1"), timestamp="yesterday")])
+def test_invalid_records_are_answered_with_400(client, body):
+    response = client.post("/mark-attendance", json=body)
+    assert response.status_code == 400 and "error" in response.json
+
+
+def test_bulk_needs_a_list_of_records(client):
+    assert client.post("/mark-attendance/bulk", json={"records": "1"}).status_code == 400
+    assert client.post("/mark-attendance/bulk", json={"records": [mark("1")] * 1001}).status_code == 413
+
+
+def test_pages_follow_the_cursor(client):
+    client.post("/mark-attendance/bulk", json={"records": [mark(str(i)) for i in range(7)]})
+    ids, cursor = [], None
+    while True:
+        page = client.get("/attendance", query_string={"limit": 3, **({"cursor": cursor} if cursor else {})}).json
+        ids += [r["id"] for r in page["records"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert ids == list(range(7, 0, -1))
+    assert client.get("/attendance", query_string={"limit": 0}).status_code == 400
+
+
+def test_report(client):
+    client.post("/mark-attendance/bulk", json={"records": [mark("1"), mark("2"),
+                                                           mark("1", slot="2024-07-02 08:30")]})
+    report = client.get("/attendance/report", query_string={"student_id": "2"}).json["report"]
+    assert [(r["subject"], r["marks"], r["lectures"], r["percentage"]) for r in report] == [("Math", 1, 2, 50.0)]
+
+
+def test_pages_are_filtered(client):
+    client.post("/mark-attendance/bulk", json={"records": [
+        mark("1"), mark("2"), mark("1", subject="Physics"),
+        mark("1", timestamp="2024-07-02 08:35:00", slot="2024-07-02 08:30")]})
+    page = client.get("/attendance", query_string={"student_id": "1", "subject": "Math"}).json
+    assert [r["slot"] for r in page["records"]] == ["2024-07-02 08:30", "2024-07-01 08:30"]
+    page = client.get("/attendance", query_string={"student_id": "1", "from": "2024-07-02"}).json
+    assert [r["subject"] for r in page["records"]] == ["Math"]
+    page = client.get("/attendance", query_string={"to": "2024-07-01"}).json
+    assert len(page["records"]) == 3 and page["next_cursor"] is None
+
+
+@pytest.mark.parametrize("query", [{"cursor": "x"}, {"limit": "ten"}, {"from": "01/07/2024"}])
+def test_invalid_page_parameters_are_answered_with_400(client, query):
+    assert client.get("/attendance", query_string=query).status_code == 400
@@ -0,0 +1,26 @@
+from backend_asgi import ReadCache
+
+
+def record(student_id, subject):
+    return {"student_id": student_id, "subject": subject}
+
+
+def test_writes_only_drop_the_entries_they_change():
+    cache = ReadCache()
+    cache.put("all", None, None, b"all", cache.writes)
+    cache.put("student-1", "1", None, b"1", cache.writes)
+    cache.put("student-2", "2", None, b"2", cache.writes)
+    cache.put("math", None, "Math", b"math", cache.writes)
+    cache.put("physics", None, "Physics", b"physics", cache.writes)
+    cache.put("student-2-physics", "2", "Physics", b"2p", cache.writes)
+
+    cache.invalidate([record("1", "Math")])
+    assert sorted(cache.entries) == ["physics", "student-2", "student-2-physics"]
+
+
+def test_reads_overlapping_a_write_are_not_cached():
+    cache = ReadCache()
+    writes = cache.writes
+    cache.invalidate([record("1", "Math")])
+    cache.put("physics", None, "Physics", b"stale?", writes)
+    assert cache.get("physics") is None
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import cv2
+import pytest
+from batch_attendance import BatchAttendance, SlotAttendance, recording_slots
+from frame_source import ImageDirSource
+from simple_facerec import SimpleFacerec
+from timetable_index import TimetableIndex
+
+TIMETABLES = TimetableIndex([
+    {"class": "IT 7A-FSD", "room": "219", "semester": "7", "timetable": [
+        {"day": "Monday", "slots": [{"time": "8:30-9:30", "subject": "C#.Net"}]},
+        {"day": "Tuesday", "slots": [{"time": "8:30-9:30", "subject": "C#.Net"}]}]},
+    {"class": "CE 5B", "room": "219", "semester": "5", "timetable": [
+        {"day": "Monday", "slots": [{"time": "9:30-10:25", "subject": "Compilers"}]}]},
+])
+
+USERS = [{"enrollment": "a", "class": "IT 7A-FSD", "semester": "7"},
+         {"enrollment": "c", "class": "CE 5B", "semester": "5"}]
+
+
+def monday(clock):
+    # 2024-07-01 is a Monday
+    return datetime.strptime(f"2024-07-01 {clock}", "%Y-%m-%d %H:%M")
+
+
+def slot():
+    return SlotAttendance(monday("8:30"), monday("9:30"), {"subject": "C#.Net"},
+                          {"class": "IT 7A-FSD", "semester": "7", "room": "219"})
+
+
+def test_confident_sightings_mark_a_student_present():
+    attendance = slot()
+    for minute in range(3):
+        attendance.add(monday(f"8:4{minute}"), ["a", "b"], [0.1, 0.5], [0.2, 0.2], tolerance=0.6, min_margin=0.03)
+    present = attendance.present(min_sightings=3, min_votes=1.0)
+    # b was seen three times, but far from the tolerance: 3 * (1 - 0.5 / 0.6) votes
+    assert list(present) == ["a"]
+    assert present["a"]["sightings"] == 3 and present["a"]["confidence"] == pytest.approx(0.833, abs=1e-3)
+    assert present["a"]["first_seen"] == "2024-07-01 08:40:00" and present["a"]["last_seen"] == "2024-07-01 08:42:00"
+
+
+def test_ambiguous_and_unknown_faces_do_not_count():
+    attendance = slot()
+    for minute in range(3):
+        attendance.add(monday(f"8:4{minute}"), ["a", "Unknown"], [0.1, 0.1], [0.01, 0.3],
+                       tolerance=0.6, min_margin=0.03)
+    assert attendance.students == {} and attendance.frames == 3
+
+
+def test_a_student_counts_once_per_frame():
+    attendance = slot()
+    attendance.add(monday("8:40"), ["a", "a"], [0.3, 0.1], [0.2, 0.2], tolerance=0.6, min_margin=0.03)
+    assert attendance.students["a"]["sightings"] == 1 and attendance.students["a"]["best_distance"] == 0.1
+
+
+def test_recording_slots_overlap_the_recording():
+    slots = recording_slots(TIMETABLES, "219", monday("9:00"), datetime(2024, 7, 2, 9, 0))
+    assert [(s.start, s.slot["subject"]) for s in slots] == [
+        (monday("8:30"), "C#.Net"), (monday("9:30"), "Compilers"), (datetime(2024, 7, 2, 8, 30), "C#.Net")]
+    assert recording_slots(TIMETABLES, "219", monday("10:25"), monday("12:00")) == []
+
+
+def test_recording_is_sampled_and_split_into_slots(tmp_path, fake_faces, write_image):
+    # One frame every 10 minutes from 8:30 to 10:20, showing a in the first lecture and c in the second
+    frames = tmp_path / "frames"
+    frames.mkdir()
+    for i in range(12):
+        write_image(frames / f"{i:02d}.png", seed=0 if i < 6 else 2)
+    sfr = SimpleFacerec()
+    sfr.frame_resizing = 1.0
+    encodings = []
+    for seed in range(3):
+        rgb = cv2.cvtColor(cv2.imread(write_image(tmp_path / f"face{seed}.png", seed=seed)), cv2.COLOR_BGR2RGB)
+        encodings.append(fake_faces(rgb[30:90, 40:120]))
+    sfr.load_encodings(["a", "b", "c"], encodings)
+
+    batch = BatchAttendance(sfr, TIMETABLES, USERS, "219", sample_every=1200, min_sightings=3)
+    slots = batch.process(ImageDirSource(str(frames), fps=1 / 600, start_time=monday("8:30")))
+    results = batch.results(slots)
+
+    assert [(r["subject"], r["frames"], list(r["students"])) for r in results] == \
+        [("C#.Net", 3, ["a"]), ("Compilers", 3, ["c"])]
+    assert batch.stats["frames_read"] == 12 and batch.stats["frames_recognized"] == 6
+    # The candidates followed the class of the slot
+    assert sfr.candidate_names == {"c"}
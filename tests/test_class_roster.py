@@ -0,0 +1,61 @@
+from datetime import datetime
+
+import pytest
+from class_roster import RoomRoster, class_roster
+from simple_facerec import SimpleFacerec
+from timetable_index import TimetableIndex
+
+TIMETABLES = [
+    {"class": "IT 7A-FSD", "room": "219", "semester": "7", "timetable": [
+        {"day": "Monday", "slots": [{"time": "8:30-9:30", "subject": "C#.Net"}]}]},
+    {"class": "CE 5B", "room": "219", "semester": "5", "timetable": [
+        {"day": "Monday", "slots": [{"time": "9:30-10:25", "subject": "Compilers"}]}]},
+]
+
+USERS = [{"enrollment": "a", "class": "IT 7A-FSD", "semester": "7"},
+         {"enrollment": "b", "class": "IT", "semester": "7"},
+         {"enrollment": "c", "class": "CE 5B", "semester": "5"},
+         {"enrollment": "d", "class": "IT 7A-FSD", "semester": "5"}]
+
+
+def monday(clock):
+    # 2024-07-01 is a Monday
+    return datetime.strptime(f"2024-07-01 {clock}", "%Y-%m-%d %H:%M")
+
+
+@pytest.fixture
+def sfr(fake_faces):
+    sfr = SimpleFacerec()
+    sfr.load_encodings(["a", "b", "c"], [fake_faces(str(name)) for name in range(3)])
+    return sfr
+
+
+def test_roster_of_a_class_includes_branch_only_users():
+    assert class_roster(USERS, "IT 7A-FSD", "7") == {"a", "b"}
+
+
+def test_candidates_follow_the_period(sfr):
+    roster = RoomRoster("219", TimetableIndex(TIMETABLES), USERS)
+    assert roster.update(sfr, monday("8:45"))
+    assert sfr.candidate_names == {"a", "b"}
+    # Same lecture, nothing to do
+    assert not roster.update(sfr, monday("9:00"))
+    assert roster.update(sfr, monday("9:45"))
+    assert sfr.candidate_names == {"c"}
+    # Break: match against everyone
+    assert roster.update(sfr, monday("11:00"))
+    assert sfr.candidate_names is None
+
+
+def test_faces_outside_the_class_fall_back_to_the_whole_gallery(sfr, fake_faces):
+    sfr.set_candidates({"a"})
+    names, distances, _ = sfr.match_faces([fake_faces("0"), fake_faces("2"), fake_faces("other")])
+    assert names == ["a", "c", "Unknown"]
+    assert distances[0] < 1e-2 and distances[1] < 1e-2
+
+
+def test_candidates_map_to_rows_of_the_whole_gallery(sfr, fake_faces):
+    sfr.set_candidates({"c", "b"})
+    assert sfr.match_faces([fake_faces("1")])[0] == ["b"]
+    sfr.set_candidates(set())
+    assert sfr.match_faces([fake_faces("1")])[0] == ["b"]
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+from encoding_cache import EncodingCache
+from simple_facerec import SimpleFacerec
+
+
+@pytest.fixture
+def images(tmp_path, write_image):
+    images = tmp_path / "images"
+    images.mkdir()
+    for i in range(3):
+        write_image(images / f"p{i}.png", seed=i)
+    return images
+
+
+def load(images, cache_path):
+    sfr = SimpleFacerec()
+    sfr.load_encoding_images(str(images), cache_path=str(cache_path))
+    return sfr
+
+
+def test_unchanged_images_are_not_encoded_again(images, tmp_path, fake_faces, monkeypatch):
+    first = load(images, tmp_path / "cache.pkl")
+    assert first.cache_stats == {"hits": 0, "misses": 3, "removed": 0}
+
+    encoded = []
+    monkeypatch.setattr("simple_facerec.encode_image", lambda path: encoded.append(path))
+    second = load(images, tmp_path / "cache.pkl")
+    assert encoded == [] and second.cache_stats == {"hits": 3, "misses": 0, "removed": 0}
+    assert second.known_face_names == first.known_face_names == ["p0", "p1", "p2"]
+
+
+def test_changed_and_deleted_images(images, tmp_path, fake_faces, write_image):
+    load(images, tmp_path / "cache.pkl")
+    write_image(images / "p1.png", seed=10, size=(100, 100))
+    os.remove(images / "p2.png")
+
+    sfr = load(images, tmp_path / "cache.pkl")
+    assert sfr.cache_stats == {"hits": 1, "misses": 1, "removed": 1}
+    assert sfr.known_face_names == ["p0", "p1"]
+
+
+def test_touched_image_with_the_same_content_is_a_hit(images, tmp_path):
+    cache = EncodingCache(str(tmp_path / "cache.pkl"))
+    path = str(images / "p0.png")
+    cache.put(path, "encoding")
+    os.utime(path, (0, 0))
+    assert cache.get(path) == (True, "encoding")
+    assert cache.entries[cache.key(path)]["mtime"] == 0
+
+
+def test_images_without_a_face_are_cached(tmp_path, write_image):
+    cache = EncodingCache(str(tmp_path / "cache.pkl"))
+    path = write_image(tmp_path / "empty.png", seed=0)
+    cache.put(path, None)
+    cache.save()
+    assert EncodingCache(str(tmp_path / "cache.pkl")).get(path) == (True, None)
+
+
+def test_unreadable_or_old_caches_are_rebuilt(tmp_path, write_image, monkeypatch):
+    path = tmp_path / "cache.pkl"
+    path.write_bytes(b"not a pickle")
+    assert EncodingCache(str(path)).entries == {}
+
+    cache = EncodingCache(str(path))
+    cache.put(write_image(tmp_path / "p.png", seed=0), "encoding")
+    cache.save()
+    monkeypatch.setattr("encoding_cache.CACHE_VERSION", 2)
+    assert EncodingCache(str(path)).entries == {}
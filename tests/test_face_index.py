@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from face_index import BruteForceIndex, make_index
+from face_matcher import FaceMatcher
+
+
+def gallery(people=2000, seed=0):
+    """
+    Clustered 128-d encodings, like faces of different people.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(people // 10, 128)).astype(np.float32)
+    encodings = centers[rng.integers(len(centers), size=people)] + 0.3 * rng.normal(size=(people, 128))
+    return encodings.astype(np.float32), rng
+
+
+@pytest.mark.parametrize("kind, params, min_recall", [
+    ("ivf", {}, 0.95),
+    ("ivf", {"n_probe": 1000}, 1.0),
+    ("balltree", {"leaf_size": 32}, 1.0),
+])
+def test_recall_against_brute_force(kind, params, min_recall):
+    encodings, rng = gallery()
+    queries = encodings[rng.integers(len(encodings), size=200)] + 0.05 * rng.normal(size=(200, 128))
+
+    exact = BruteForceIndex()
+    exact.build(encodings)
+    index = make_index(kind, **params)
+    index.build(encodings)
+
+    expected, expected_dist = exact.search(queries, k=2)
+    found, found_dist = index.search(queries, k=2)
+    assert np.mean(found[:, 0] == expected[:, 0]) >= min_recall
+    # Whatever is found is at its true distance
+    hits = found[:, 0] == expected[:, 0]
+    np.testing.assert_allclose(found_dist[hits, 0], expected_dist[hits, 0], atol=1e-3)
+
+
+@pytest.mark.parametrize("kind", ["brute", "ivf", "balltree"])
+def test_add_and_remove_match_brute_force(kind):
+    encodings, rng = gallery(500)
+    index = make_index(kind)
+    index.build(encodings[:400])
+    index.add(encodings[400:])
+    index.remove(np.arange(0, 500, 7))
+
+    exact = BruteForceIndex()
+    exact.build(encodings)
+    exact.remove(np.arange(0, 500, 7))
+
+    queries = encodings[rng.integers(500, size=50)]
+    assert len(index) == len(exact)
+    found, _ = index.search(queries, k=1)
+    expected, _ = exact.search(queries, k=1)
+    assert np.mean(found[:, 0] == expected[:, 0]) >= 0.95
+
+
+def test_persisted_index_is_rebuilt_when_params_change(tmp_path):
+    encodings, _ = gallery(300)
+    path = str(tmp_path / "index.pkl")
+
+    FaceMatcher(index="ivf", index_params={"n_lists": 4}).build(encodings, index_path=path)
+    reloaded = FaceMatcher(index="ivf", index_params={"n_lists": 4})
+    reloaded.build(encodings, index_path=path)
+    assert len(reloaded.index.centroids) == 4
+
+    changed = FaceMatcher(index="ivf", index_params={"n_lists": 8})
+    changed.build(encodings, index_path=path)
+    assert len(changed.index.centroids) == 8
@@ -0,0 +1,58 @@
+import face_recognition
+import numpy as np
+import pytest
+from face_quality import FaceQualityGate, quality_gate_from_config
+from simple_facerec import SimpleFacerec
+
+CONFIG = {"ENABLED": True, "MIN_SIZE": 30, "MIN_SHARPNESS": 30, "MIN_BRIGHTNESS": 40, "MAX_BRIGHTNESS": 220,
+          "MAX_YAW": 0.5}
+FACE = (20, 80, 80, 20)
+
+
+def frame(low=1, high=255, size=(100, 100)):
+    return np.random.default_rng(0).integers(low, high, size=size + (3,), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("image, location, reason", [
+    (frame(), FACE, None),
+    (frame(), (20, 80, 45, 20), "too_small"),
+    (frame(), (200, 280, 260, 220), "too_small"),
+    (frame(1, 30), FACE, "too_dark"),
+    (frame(230, 255), FACE, "too_bright"),
+    (np.full((100, 100, 3), 128, dtype=np.uint8), FACE, "blurry"),
+])
+def test_checks(fake_faces, image, location, reason):
+    assert FaceQualityGate().check(image, location) == reason
+
+
+def test_turned_faces_are_skipped(fake_faces, monkeypatch):
+    gate = FaceQualityGate(max_yaw=0.5)
+    # Nose tip past the left eye: a head turned to the side
+    monkeypatch.setattr(face_recognition, "face_landmarks", lambda image, locations, model="large": [
+        {"left_eye": [(35, 50)], "right_eye": [(65, 50)], "nose_tip": [(30, 60)]}])
+    assert gate.check(frame(), FACE) == "turned"
+    assert FaceQualityGate(max_yaw=None).check(frame(), FACE) is None
+
+
+def test_gate_is_opt_in():
+    assert quality_gate_from_config(dict(CONFIG, ENABLED=False)) is None
+    assert quality_gate_from_config(dict(CONFIG, MAX_YAW=None)).max_yaw is None
+    assert quality_gate_from_config(CONFIG).min_size == 30
+
+
+def test_skipped_faces_are_unknown_and_not_encoded(fake_faces, monkeypatch):
+    sfr = SimpleFacerec()
+    sfr.quality_gate = FaceQualityGate()
+    image = frame()
+    image[:, 50:] = 128
+    locations = [FACE, (20, 100, 80, 55)]
+    sfr.load_encodings(["p", "q"], [fake_faces(image[20:80, 20:80]), fake_faces(image[20:80, 55:100])])
+
+    encoded = []
+    encode = face_recognition.face_encodings
+    monkeypatch.setattr(face_recognition, "face_encodings",
+                        lambda image, locations: encoded.extend(locations) or encode(image, locations))
+    names, _, _ = sfr.match_faces(sfr.encode_faces(image, locations))
+    assert names == ["p", "Unknown"] and encoded == [FACE]
+    stats = sfr.quality_stats()
+    assert stats["faces"] == 2 and stats["blurry"] == 1 and stats["encodings_saved"] == 1
@@ -0,0 +1,64 @@
+import cv2
+import numpy as np
+import pytest
+from face_tracker import TemplateTracker, iou
+from simple_facerec import SimpleFacerec
+
+
+def frame(seed=0, size=(120, 160)):
+    return np.random.default_rng(seed).integers(1, 255, size=size + (3,), dtype=np.uint8)
+
+
+def face_encoding(fake_faces, bgr_frame):
+    # Detections of the fake detector are in the middle of the frame
+    rgb = cv2.cvtColor(bgr_frame, cv2.COLOR_BGR2RGB)
+    height, width = rgb.shape[:2]
+    return fake_faces(rgb[height // 4:height * 3 // 4, width // 4:width * 3 // 4])
+
+
+@pytest.fixture
+def sfr(fake_faces):
+    sfr = SimpleFacerec()
+    sfr.frame_resizing = 1.0
+    sfr.load_encodings(["p"], [face_encoding(fake_faces, frame())])
+    return sfr
+
+
+def test_faces_are_detected_every_n_frames_and_encoded_once(sfr):
+    sfr.enable_tracking(detect_every=5)
+    for _ in range(10):
+        locations, names = sfr.track_known_faces(frame())
+        assert names == ["p"]
+        assert tuple(locations[0]) == (30, 120, 90, 40)
+    assert sfr.tracker.stats == {"frames": 10, "detections": 2, "encodings": 1}
+
+
+def test_lost_track_is_detected_again(sfr, monkeypatch):
+    sfr.enable_tracking(detect_every=5)
+    sfr.track_known_faces(frame())
+    monkeypatch.setattr(TemplateTracker, "update", lambda self, image: None)
+    sfr.track_known_faces(frame())
+    assert sfr.tracker.stats["detections"] == 2 and sfr.tracker.stats["encodings"] == 1
+
+
+def test_unknown_faces_are_encoded_again_at_the_next_detection(sfr, fake_faces):
+    sfr.enable_tracking(detect_every=2)
+    stranger = frame(seed=1)
+    assert sfr.track_known_faces(stranger)[1] == ["Unknown"]
+    sfr.track_known_faces(stranger)
+    sfr.load_encodings(["p", "q"], [face_encoding(fake_faces, frame()), face_encoding(fake_faces, stranger)])
+    assert sfr.track_known_faces(stranger)[1] == ["q"]
+    assert sfr.tracker.stats["encodings"] == 2
+
+
+def test_template_tracker_follows_a_moving_face():
+    image = frame(seed=2)
+    tracker = TemplateTracker()
+    tracker.init(image, (30, 80, 70, 40))
+    assert tracker.update(np.roll(image, (3, -5), axis=(0, 1))) == (33, 75, 73, 35)
+
+
+def test_iou():
+    assert iou((0, 10, 10, 0), (0, 10, 10, 0)) == 1.0
+    assert iou((0, 10, 10, 0), (0, 20, 10, 10)) == 0.0
+    assert iou((0, 10, 10, 0), (0, 15, 10, 5)) == pytest.approx(1 / 3)
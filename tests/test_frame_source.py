@@ -0,0 +1,92 @@
+import os
+from datetime import datetime, timedelta
+
+import cv2
+import numpy as np
+import pytest
+from frame_source import ImageDirSource, LiveSource, VideoFileSource, open_source
+
+START = datetime(2024, 7, 1, 8, 30)
+
+
+@pytest.fixture
+def video(tmp_path):
+    """
+    Ten frames at 5 fps, frame i filled with the gray level 20 * i.
+    """
+    path = str(tmp_path / "lecture.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 5, (64, 48))
+    if not writer.isOpened():
+        pytest.skip("OpenCV was built without an MJPG writer")
+    for i in range(10):
+        writer.write(np.full((48, 64, 3), 20 * i, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def gray_level(frame):
+    return int(round(frame.mean() / 20))
+
+
+def test_video_frames_are_stamped_with_their_position(video):
+    source = open_source(video, start_time=START)
+    assert isinstance(source, VideoFileSource) and not source.realtime
+    levels, times = [], []
+    while True:
+        ret, frame = source.read()
+        if not ret:
+            break
+        levels.append(gray_level(frame))
+        times.append(source.timestamp)
+    source.release()
+    assert levels == list(range(10))
+    assert times == pytest.approx([i / 5 for i in range(10)])
+    assert source.frame_time() == START + timedelta(seconds=1.8)
+
+
+def test_grabbed_video_frames_are_only_retrieved_when_needed(video):
+    source = VideoFileSource(video, start_time=START)
+    for _ in range(4):
+        assert source.grab()
+    ret, frame = source.retrieve()
+    assert ret and gray_level(frame) == 3 and source.timestamp == pytest.approx(0.6)
+    source.release()
+
+
+def test_recording_start_defaults_to_the_file_time(video):
+    os.utime(video, (0, datetime(2024, 7, 1, 10, 0).timestamp()))
+    assert VideoFileSource(video).start_time == datetime(2024, 7, 1, 9, 59, 58)
+
+
+def test_image_folders_are_read_in_name_order(tmp_path, write_image):
+    for name, seed in (("b.png", 1), ("a.png", 0), ("c.png", 2)):
+        write_image(tmp_path / name, seed=seed)
+    (tmp_path / "notes.txt").write_text("not an image")
+
+    source = open_source(str(tmp_path), start_time=START)
+    assert isinstance(source, ImageDirSource) and not source.realtime
+    frames = []
+    while True:
+        ret, frame = source.read()
+        if not ret:
+            break
+        frames.append((frame, source.timestamp))
+    assert [timestamp for _, timestamp in frames] == [0.0, 1.0, 2.0]
+    assert (frames[0][0] == cv2.imread(str(tmp_path / "a.png"))).all()
+    assert source.frame_time() == START + timedelta(seconds=2)
+
+
+def test_image_folder_grab_and_retrieve(tmp_path, write_image):
+    write_image(tmp_path / "a.png", seed=0)
+    source = ImageDirSource(str(tmp_path))
+    assert source.grab()
+    assert source.retrieve()[0]
+    assert not source.grab() and source.retrieve() == (False, None)
+
+
+def test_webcams_and_urls_are_live(monkeypatch):
+    monkeypatch.setattr(cv2, "VideoCapture", lambda source: source)
+    for source in (0, "1", "rtsp://camera/stream"):
+        live = open_source(source)
+        assert isinstance(live, LiveSource) and live.realtime
+    assert open_source("1").capture == 1
@@ -0,0 +1,107 @@
+import time
+from datetime import datetime
+
+import pytest
+from pipeline import LatestFrameQueue, RecognitionPipeline
+
+
+class FakeCapture:
+    """
+    Yields the numbers 0..frames-1 as frames, one per `interval` seconds.
+    """
+
+    def __init__(self, frames, realtime=True, interval=0.0, fail_at=None):
+        self.frames = frames
+        self.realtime = realtime
+        self.interval = interval
+        self.fail_at = fail_at
+        self.position = 0
+        self.timestamp = None
+        self.start_time = datetime(2024, 7, 1, 8, 30)
+        self.releases = 0
+
+    def read(self):
+        if self.position == self.fail_at:
+            raise OSError("camera unplugged")
+        if self.position >= self.frames:
+            return False, None
+        time.sleep(self.interval)
+        frame = self.position
+        self.timestamp = frame / 25.0
+        self.position += 1
+        return True, frame
+
+    def release(self):
+        self.releases += 1
+
+
+def slow_recognize(frame):
+    time.sleep(0.005)
+    return [], [str(frame)]
+
+
+def run(capture, recognize=slow_recognize):
+    pipeline = RecognitionPipeline(capture, recognize).start()
+    try:
+        return pipeline, [names[0] for _, _, names in pipeline.results()]
+    finally:
+        pipeline.stop()
+
+
+def test_latest_frame_queue_drops_the_oldest_items():
+    queue = LatestFrameQueue(maxsize=1)
+    for item in range(3):
+        queue.put(item)
+    assert queue.get() == 2 and queue.dropped == 2
+    queue.close()
+    assert queue.get() is None
+
+
+def test_video_files_are_not_dropped():
+    capture = FakeCapture(40, realtime=False)
+    pipeline, names = run(capture)
+    assert names == [str(i) for i in range(40)]
+    assert pipeline.stats()["frames_dropped"] == 0 and pipeline.stats()["results_dropped"] == 0
+    assert capture.releases == 1
+
+
+def test_live_sources_skip_to_the_latest_frame():
+    def slower_recognize(frame):
+        time.sleep(0.02)
+        return [], [str(frame)]
+
+    pipeline, names = run(FakeCapture(40, interval=0.001), slower_recognize)
+    assert pipeline.stats()["frames_dropped"] > 0 and len(names) < 40
+    assert names[-1] == "39"
+
+
+def test_frame_time_comes_from_the_source():
+    capture = FakeCapture(3, realtime=False)
+    pipeline = RecognitionPipeline(capture, slow_recognize).start()
+    for _ in pipeline.results():
+        pass
+    pipeline.stop()
+    assert pipeline.frame_time() == datetime(2024, 7, 1, 8, 30, 0, 80000)
+
+
+def test_recognition_errors_are_raised_by_results():
+    def recognize(frame):
+        if frame == 3:
+            raise ConnectionError("recognition service unreachable")
+        return [], [str(frame)]
+
+    capture = FakeCapture(1000, realtime=False)
+    pipeline = RecognitionPipeline(capture, recognize).start()
+    seen = []
+    with pytest.raises(ConnectionError):
+        for _, _, names in pipeline.results():
+            seen.append(names[0])
+    pipeline.stop()
+    assert seen == ["0", "1", "2"] and capture.releases == 1
+
+
+def test_capture_errors_are_raised_by_results():
+    capture = FakeCapture(10, realtime=False, fail_at=5)
+    with pytest.raises(OSError):
+        run(capture)
+    assert capture.releases == 1
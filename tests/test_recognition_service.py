@@ -0,0 +1,73 @@
+import threading
+
+import cv2
+import numpy as np
+import pytest
+from recognition_service import DynamicBatcher, create_app
+from simple_facerec import SimpleFacerec
+
+
+def face(seed):
+    return np.random.default_rng(seed).integers(1, 255, size=(40, 30, 3), dtype=np.uint8)
+
+
+def png(image):
+    return cv2.imencode(".png", image)[1].tobytes()
+
+
+@pytest.fixture
+def sfr(fake_faces):
+    # A crop is encoded whole, so the gallery holds the fake encodings of the crops
+    sfr = SimpleFacerec()
+    sfr.load_encodings(["s1", "s2"], [fake_faces(cv2.cvtColor(face(seed), cv2.COLOR_BGR2RGB)) for seed in (1, 2)])
+    return sfr
+
+
+@pytest.fixture
+def batcher(sfr):
+    batcher = DynamicBatcher(sfr, max_wait=0.05, timeout=2)
+    yield batcher
+    if batcher.thread.is_alive():
+        batcher.stop()
+
+
+def test_crop_is_recognized(batcher):
+    client = create_app(batcher).test_client()
+    response = client.post("/recognize/crop", data=png(face(2)))
+    assert response.status_code == 200
+    assert response.json["face"]["name"] == "s2"
+
+
+def test_candidates_are_matched_first(batcher):
+    client = create_app(batcher).test_client()
+    response = client.post("/recognize/crop", data=png(face(1)), headers={"X-Candidates": "s2"})
+    # Not among the candidates, but still found in the whole gallery
+    assert response.json["face"]["name"] == "s1"
+    assert batcher.sfr.candidate_names == {"s2"}
+
+
+def test_requests_of_a_burst_share_a_batch(batcher):
+    results = [None] * 8
+
+    def recognize(i):
+        results[i] = batcher.recognize(face(1 + i % 2), crop=True)
+
+    threads = [threading.Thread(target=recognize, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [r[0]["name"] for r in results] == ["s1", "s2"] * 4
+    assert batcher.stats["images"] == 8 and batcher.stats["batches"] < 8
+
+
+def test_slow_batches_are_answered_with_503(sfr):
+    batcher = DynamicBatcher(sfr, timeout=0.1)
+    batcher.stop()
+    response = create_app(batcher).test_client().post("/recognize/crop", data=png(face(1)))
+    assert response.status_code == 503
+
+
+def test_body_must_be_an_image(batcher):
+    response = create_app(batcher).test_client().post("/recognize", data=b"not an image")
+    assert response.status_code == 400
@@ -0,0 +1,72 @@
+import pytest
+from face_index import IVFIndex, load_index
+from shared_gallery import SharedGallery
+from simple_facerec import SimpleFacerec, encode_image
+
+
+@pytest.fixture
+def gallery(tmp_path, fake_faces, write_image):
+    images = tmp_path / "images"
+    images.mkdir()
+    for i in range(6):
+        write_image(images / f"p{i}.png", seed=i)
+    gallery = SharedGallery(str(images), cache_path=str(tmp_path / "cache.pkl"), index="ivf",
+                            index_path=str(tmp_path / "index.pkl"), index_params={"n_lists": 2})
+    gallery.reload()
+    return gallery
+
+
+def best_name(snapshot, encoding):
+    ids, distances, _ = snapshot.matcher.match([encoding])
+    # float32 distances of identical encodings are not exactly 0
+    return snapshot.names[ids[0]] if distances[0] < 1e-2 else None
+
+
+def test_add_person_updates_a_copy_of_the_index_in_place(gallery, tmp_path, write_image, monkeypatch):
+    before = gallery.snapshot
+    path = write_image(tmp_path / "images" / "new.png", seed=100)
+    # No clustering again: the new face is only assigned to its list
+    monkeypatch.setattr(IVFIndex, "kmeans", lambda *args: pytest.fail("ivf index was rebuilt"))
+    assert gallery.add_person("new", path)
+
+    after = gallery.snapshot
+    assert after.version == before.version + 1 and len(after) == 7
+    assert best_name(after, encode_image(path)) == "new"
+    # Sessions still matching against the old snapshot are not affected
+    assert len(before) == 6 and len(before.matcher) == 6
+    # The watcher does not reload the folder for the image that was just added
+    assert not gallery.check()
+
+
+def test_replacing_a_person_masks_the_old_row(gallery, tmp_path, write_image):
+    old = encode_image(str(tmp_path / "images" / "p1.png"))
+    path = write_image(tmp_path / "images" / "p1.png", seed=200)
+    assert gallery.add_person("p1", path)
+
+    snapshot = gallery.snapshot
+    assert len(snapshot) == 6 and snapshot.names.count("p1") == 1
+    assert best_name(snapshot, encode_image(path)) == "p1"
+    assert best_name(snapshot, old) is None
+
+
+def test_added_index_is_saved(gallery, tmp_path, write_image):
+    path = write_image(tmp_path / "images" / "new.png", seed=100)
+    gallery.add_person("new", path)
+    snapshot = gallery.snapshot
+    saved = load_index(str(tmp_path / "index.pkl"), snapshot.matcher.fingerprint(snapshot.encodings))
+    assert saved is not None and len(saved) == 7
+
+
+def test_folder_changes_are_reloaded(gallery, tmp_path, write_image):
+    assert not gallery.check()
+    write_image(tmp_path / "images" / "late.png", seed=300)
+    assert gallery.check()
+    assert "late" in gallery.snapshot.name_rows and gallery.stats["reloads"] == 2
+
+
+def test_sessions_pick_up_new_snapshots(gallery, tmp_path, write_image):
+    sfr = SimpleFacerec().use_gallery(gallery)
+    path = write_image(tmp_path / "images" / "new.png", seed=100)
+    gallery.add_person("new", path)
+    names, distances, _ = sfr.match_faces([encode_image(path)])
+    assert names == ["new"] and distances[0] < 1e-2
@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+import pytest
+from encoding_cache import EncodingCache
+from simple_facerec import SimpleFacerec, encode_image
+
+
+@pytest.fixture
+def sfr(tmp_path, fake_faces, write_image):
+    images = tmp_path / "images"
+    images.mkdir()
+    for i in range(4):
+        write_image(images / f"p{i}.png", seed=i)
+    sfr = SimpleFacerec(index="ivf", index_params={"n_lists": 2})
+    sfr.load_encoding_images(str(images))
+    # Adding and removing people never clusters the gallery again
+    sfr.matcher.index.kmeans = lambda *args: pytest.fail("ivf index was rebuilt")
+    return sfr
+
+
+def name_of(sfr, path):
+    return sfr.match_faces([encode_image(path)])[0][0]
+
+
+def test_add_person_in_place(sfr, tmp_path, write_image):
+    path = write_image(tmp_path / "new.png", seed=100)
+    assert name_of(sfr, path) == "Unknown"
+    assert sfr.add_person("new", path)
+    assert name_of(sfr, path) == "new" and len(sfr.matcher) == 5
+
+
+def test_remove_person_keeps_the_other_rows(sfr, tmp_path):
+    assert sfr.remove_person("p1") and not sfr.remove_person("p1")
+    assert name_of(sfr, str(tmp_path / "images" / "p1.png")) == "Unknown"
+    assert name_of(sfr, str(tmp_path / "images" / "p2.png")) == "p2"
+    assert sfr.name_rows == {"p0": 0, "p2": 2, "p3": 3}
+
+
+def test_update_person_replaces_the_face(sfr, tmp_path, write_image):
+    old = str(tmp_path / "images" / "p0.png")
+    new = write_image(tmp_path / "p0-new.png", seed=200)
+    assert not sfr.update_person("stranger", new)
+    assert sfr.update_person("p0", new)
+    assert name_of(sfr, new) == "p0" and name_of(sfr, old) == "Unknown"
+    assert sfr.known_face_names.count("p0") == 1
+
+
+def test_image_without_a_face_is_not_added(sfr, tmp_path):
+    path = str(tmp_path / "black.png")
+    cv2.imwrite(path, np.zeros((40, 40, 3), dtype=np.uint8))
+    assert not sfr.add_person("nobody", path)
+    assert "nobody" not in sfr.name_rows
+
+
+def test_add_person_records_the_encoding_in_the_cache(sfr, tmp_path, write_image):
+    path = write_image(tmp_path / "new.png", seed=100)
+    sfr.add_person("new", path, cache_path=str(tmp_path / "cache.pkl"))
+    hit, encoding = EncodingCache(str(tmp_path / "cache.pkl")).get(path)
+    assert hit and (encoding == encode_image(path)).all()
+
@@ -0,0 +1,76 @@
+from datetime import date, datetime
+
+import pytest
+from timetable_index import TimetableIndex, day_date, lecture_slot, parse_clock, parse_time_range
+
+TIMETABLE = {"class": "IT 7A-FSD", "room": "219", "semester": "7", "timetable": [
+    {"day": "Monday", "slots": [{"time": "8:30-9:30", "subject": "C#.Net Lab"},
+                                {"time": "9:30-10:25", "subject": "C#.Net Lab"},
+                                {"time": "10:25-10:55", "subject": "Break"},
+                                {"time": "12:45-1:40", "subject": "Mobile App Development"},
+                                {"time": "1:40-2:35", "subject": "C#.Net"}]},
+    {"day": "Tuesday", "slots": [{"time": "8:30-9:30", "subject": "C#.Net"}]},
+]}
+
+
+@pytest.fixture
+def index():
+    return TimetableIndex([TIMETABLE])
+
+
+def monday(clock):
+    # 2024-07-01 is a Monday
+    return datetime.strptime(f"2024-07-01 {clock}", "%Y-%m-%d %H:%M")
+
+
+@pytest.mark.parametrize("text, minutes", [("8:30", 8 * 60 + 30), ("12:45", 12 * 60 + 45),
+                                           ("1:40", 13 * 60 + 40), ("2:35", 14 * 60 + 35)])
+def test_hours_before_the_day_start_are_afternoon(text, minutes):
+    assert parse_clock(text) == minutes
+
+
+def test_slot_crossing_noon():
+    assert parse_time_range("12:45-1:40") == (12 * 60 + 45, 13 * 60 + 40)
+
+
+@pytest.mark.parametrize("clock, subject", [("8:30", "C#.Net Lab"), ("9:29", "C#.Net Lab"), ("9:30", "C#.Net Lab"),
+                                            ("12:45", "Mobile App Development"), ("13:39", "Mobile App Development"),
+                                            ("13:40", "C#.Net"), ("14:34", "C#.Net")])
+def test_slots_include_their_start_and_exclude_their_end(index, clock, subject):
+    assert index.lecture_in_room("219", monday(clock)).slot["subject"] == subject
+    assert index.lecture_of_class("IT 7A-FSD", monday(clock)).slot["subject"] == subject
+
+
+@pytest.mark.parametrize("clock", ["8:29", "10:25", "10:54", "11:00", "14:35", "20:00"])
+def test_no_lecture_during_breaks_and_outside_the_timetable(index, clock):
+    assert index.lecture_in_room("219", monday(clock)) is None
+    assert index.lecture_of_class("IT 7A-FSD", monday(clock)) is None
+
+
+def test_break_is_a_slot_but_no_lecture(index):
+    assert index.slot_in_room("219", monday("10:30")).slot["subject"] == "Break"
+    assert [e.slot["subject"] for e in index.room_slots("219", "Monday")] == \
+        ["C#.Net Lab", "C#.Net Lab", "Mobile App Development", "C#.Net"]
+
+
+def test_unknown_room_and_day(index):
+    assert index.lecture_in_room("101", monday("8:30")) is None
+    assert index.lecture_in_room("219", datetime(2024, 7, 3, 8, 30)) is None
+
+
+def test_lecture_slot_is_the_start_on_the_day(index):
+    entry = index.lecture_in_room("219", monday("13:50"))
+    assert lecture_slot(entry, monday("13:50")) == "2024-07-01 13:40"
+    assert day_date("Monday", today=datetime(2024, 7, 4)) == date(2024, 7, 1)
+    assert day_date("Thursday", today=datetime(2024, 7, 4)) == date(2024, 7, 4)
+
+
+@pytest.mark.parametrize("date_from, date_to, lectures", [
+    (date(2024, 7, 1), date(2024, 7, 1), 1),     # a Monday
+    (date(2024, 7, 2), date(2024, 7, 7), 1),     # Tuesday to Sunday
+    (date(2024, 7, 1), date(2024, 7, 14), 4),    # two full weeks
+    (date(2024, 7, 3), date(2024, 7, 9), 2),     # Wednesday to the next Tuesday
+    (date(2024, 7, 8), date(2024, 7, 1), 0),     # empty range
+])
+def test_lectures_between_counts_every_weekday_in_the_range(index, date_from, date_to, lectures):
+    assert index.lectures_between("IT 7A-FSD", "C#.Net", date_from, date_to) == lectures
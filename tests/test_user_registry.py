@@ -0,0 +1,71 @@
+import pickle
+import threading
+from datetime import datetime
+
+import pytest
+from class_roster import RoomRoster
+from simple_facerec import SimpleFacerec
+from timetable_index import TimetableIndex
+from user_registry import UserRegistry
+
+USERS = [{"enrollment": "1", "name": "Asha", "class": "IT 7A-FSD", "semester": "7", "image_path": "images/1.jpg"},
+         {"enrollment": "2", "name": "Ravi", "class": "IT", "semester": "7", "image_path": "images/2.jpg"},
+         {"enrollment": "3", "name": "Meera", "class": "IT 7B", "semester": "7", "image_path": "images/3.jpg"},
+         {"enrollment": "4", "name": "Karan", "class": "IT 7A-FSD", "semester": "5", "image_path": None}]
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = UserRegistry(str(tmp_path / "users.db"), users_dir=None)
+    registry.save_many(USERS)
+    return registry
+
+
+def test_get_reads_one_user(registry):
+    assert registry.get("3") == USERS[2]
+    assert registry.get(4) == USERS[3]
+    assert registry.get("5") is None
+
+
+def test_save_replaces_a_user(registry):
+    registry.save(dict(USERS[0], name="Asha K", semester=7))
+    assert registry.get("1")["name"] == "Asha K" and registry.get("1")["semester"] == "7"
+    assert registry.count() == 4
+
+
+def test_class_roster_includes_branch_only_users(registry):
+    assert registry.class_roster("IT 7A-FSD", "7") == {"1", "2"}
+    assert registry.class_roster("IT 7B", 7) == {"2", "3"}
+    assert registry.class_roster("CE 5B", "5") == set()
+
+
+def test_pickles_are_imported_into_a_new_registry(tmp_path):
+    users_dir = tmp_path / "users"
+    users_dir.mkdir()
+    for user in USERS[:2]:
+        with open(users_dir / f"{user['enrollment']}.pkl", "wb") as f:
+            pickle.dump(user, f)
+    registry = UserRegistry(str(tmp_path / "users.db"), users_dir=str(users_dir))
+    assert [user["enrollment"] for user in registry.all()] == ["1", "2"]
+
+    # An existing registry is not imported into again
+    with open(users_dir / "3.pkl", "wb") as f:
+        pickle.dump(USERS[2], f)
+    assert UserRegistry(str(tmp_path / "users.db"), users_dir=str(users_dir)).count() == 2
+    assert registry.import_pickles(str(users_dir)) == 3 and registry.count() == 3
+
+
+def test_threads_use_their_own_connection(registry):
+    found = []
+    thread = threading.Thread(target=lambda: found.append(registry.get("1")))
+    thread.start()
+    thread.join()
+    assert found == [USERS[0]]
+
+
+def test_room_roster_reads_the_registry(registry):
+    timetables = TimetableIndex([{"class": "IT 7A-FSD", "room": "219", "semester": "7", "timetable": [
+        {"day": "Monday", "slots": [{"time": "8:30-9:30", "subject": "C#.Net"}]}]}])
+    sfr = SimpleFacerec()
+    RoomRoster("219", timetables, registry).update(sfr, datetime(2024, 7, 1, 8, 45))
+    assert sfr.candidate_names == {"1", "2"}
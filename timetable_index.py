@@ -0,0 +1,171 @@
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+# Timetable times are 12-hour without AM/PM; the college day starts at 8:00,
+# so hours before this are afternoon hours ("1:40" is 13:40).
+DAY_START_HOUR = 8
+
+# One timetable slot, start and end in minutes since midnight; slot is the
+# timetable entry ("time", "subject", "teacher") and timetable its class timetable.
+TimetableSlot = namedtuple("TimetableSlot", ["start", "end", "day", "slot", "timetable"])
+
+# Attendance is marked once per student, subject and slot; the slot is the start of the lecture
+SLOT_FORMAT = '%Y-%m-%d %H:%M'
+
+# Day names of the timetable in datetime.weekday() order (strptime cannot parse a bare day name)
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+def parse_clock(text):
+    """
+    Convert a timetable clock time such as "1:40" to minutes since midnight.
+    """
+    hours, minutes = (int(part) for part in text.strip().split(":"))
+    if hours < DAY_START_HOUR:
+        hours += 12
+    return hours * 60 + minutes
+
+
+def parse_time_range(text):
+    """
+    Convert a timetable slot time such as "12:45-1:40" to (start, end) minutes since midnight.
+    """
+    start, end = text.split("-")
+    return parse_clock(start), parse_clock(end)
+
+
+def is_lecture(entry):
+    return entry.slot["subject"] != "Break"
+
+
+def lecture_slot(entry, when):
+    """
+    Slot of a lecture for attendance: its start on the date of `when`, as SLOT_FORMAT.
+    :param entry: TimetableSlot of the lecture.
+    :param when: datetime (or date) of the day of the lecture.
+    """
+    return datetime(when.year, when.month, when.day, entry.start // 60, entry.start % 60).strftime(SLOT_FORMAT)
+
+
+def day_date(day, today=None):
+    """
+    Date of the latest `day` (e.g. "Monday") on or before today, so a lecture
+    picked from the timetable is marked for this week.
+    """
+    today = today or datetime.now()
+    days_back = (today.weekday() - WEEKDAYS.index(day)) % 7
+    return (today - timedelta(days=days_back)).date()
+
+
+class TimetableIndex:
+    """
+    Timetables compiled once into sorted slot intervals per room and day
+    and per class and day. The lecture held in a room (or by a class) at a
+    given time is found with a binary search instead of parsing and
+    scanning every slot.
+
+    Slots of one room, or of one class, must not overlap.
+    """
+
+    def __init__(self, timetables):
+        """
+        :param timetables: Timetables as returned by class_roster.load_timetables.
+        """
+        self.timetables = timetables
+        # Day names in timetable order, for day pickers
+        self.days = []
+        self.by_room = {}
+        self.by_class = {}
+
+        entries = []
+        for timetable in timetables:
+            for day_entry in timetable["timetable"]:
+                day = day_entry["day"]
+                if day not in self.days:
+                    self.days.append(day)
+                for slot in day_entry["slots"]:
+                    start, end = parse_time_range(slot["time"])
+                    entries.append(TimetableSlot(start, end, day, slot, timetable))
+
+        for entry in sorted(entries, key=lambda e: e.start):
+            self.by_room.setdefault((str(entry.timetable.get("room")), entry.day), []).append(entry)
+            self.by_class.setdefault((entry.timetable["class"], entry.day), []).append(entry)
+        # Start minutes of every list, searched with bisect
+        self.room_starts = {key: [e.start for e in slots] for key, slots in self.by_room.items()}
+        self.class_starts = {key: [e.start for e in slots] for key, slots in self.by_class.items()}
+
+    @staticmethod
+    def find(slots, starts, minute):
+        i = bisect_right(starts, minute) - 1
+        if i >= 0 and minute < slots[i].end:
+            return slots[i]
+        return None
+
+    def slot_in_room(self, room, when):
+        """
+        The slot held in a room at a given time, breaks included.
+        :param when: datetime to look up.
+        :return: TimetableSlot, or None outside the timetable.
+        """
+        key = (str(room), when.strftime("%A"))
+        if key not in self.by_room:
+            return None
+        return self.find(self.by_room[key], self.room_starts[key], when.hour * 60 + when.minute)
+
+    def lecture_in_room(self, room, when):
+        """
+        The lecture held in a room at a given time: its subject, teacher and class.
+        :return: TimetableSlot, or None during breaks and outside lectures.
+        """
+        entry = self.slot_in_room(room, when)
+        return entry if entry is not None and is_lecture(entry) else None
+
+    def lecture_of_class(self, class_name, when):
+        """
+        The lecture a class has at a given time, wherever it is held.
+        :return: TimetableSlot, or None during breaks and outside lectures.
+        """
+        key = (class_name, when.strftime("%A"))
+        if key not in self.by_class:
+            return None
+        entry = self.find(self.by_class[key], self.class_starts[key], when.hour * 60 + when.minute)
+        return entry if entry is not None and is_lecture(entry) else None
+
+    def lectures_between(self, class_name, subject, date_from, date_to):
+        """
+        Number of lectures of a subject a class has from one date to another,
+        both included, whether anyone attended them or not.
+        :param date_from: First date (date or datetime).
+        :param date_to: Last date (date or datetime).
+        """
+        total_days = (date_to - date_from).days + 1
+        if total_days <= 0:
+            return 0
+        weeks, rest = divmod(total_days, 7)
+        count = 0
+        for day in self.days:
+            per_day = sum(1 for entry in self.by_class.get((class_name, day), [])
+                          if entry.slot["subject"] == subject)
+            if per_day:
+                # Full weeks hold every day once, the remaining days hold the next `rest` weekdays
+                offset = (WEEKDAYS.index(day) - date_from.weekday()) % 7
+                count += per_day * (weeks + (1 if offset < rest else 0))
+        return count
+
+    def room_slots(self, room, day):
+        """
+        Lectures held in a room on a day, in time order. Breaks are left out.
+        :param day: Day name, e.g. "Monday".
+        """
+        return [entry for entry in self.by_room.get((str(room), day), []) if is_lecture(entry)]
+
+    def day_slots(self, day, class_name=None):
+        """
+        Slots of a day in time order, breaks included, e.g. to show the timetable.
+        :param class_name: Only the slots of this class; all classes if None.
+        """
+        if class_name is not None:
+            return list(self.by_class.get((class_name, day), []))
+        return sorted((entry for (_, slot_day), slots in self.by_class.items() if slot_day == day
+                       for entry in slots), key=lambda e: e.start)
@@ -0,0 +1,110 @@
+import os
+import pickle
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    enrollment TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    class TEXT NOT NULL,
+    semester TEXT NOT NULL,
+    image_path TEXT
+);
+CREATE INDEX IF NOT EXISTS users_class ON users (class, semester);
+CREATE INDEX IF NOT EXISTS users_semester ON users (semester);
+"""
+
+FIELDS = ("enrollment", "name", "class", "semester", "image_path")
+
+
+class UserRegistry:
+    """
+    Registered users in one SQLite table, keyed by enrollment number with
+    an index on class and semester. Lookups read a single row, so nothing
+    is loaded when a session starts. The pickles of the users/ folder are
+    imported when the registry is created.
+    """
+
+    def __init__(self, path="dataset/users.db", users_dir="users"):
+        """
+        :param path: SQLite database file, created if missing.
+        :param users_dir: Folder of user pickles imported into a new, empty registry.
+        """
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Connections can only be used on the thread that opened them
+        self.local = threading.local()
+        self.connection().executescript(SCHEMA)
+        if users_dir and not self.count():
+            self.import_pickles(users_dir)
+
+    def connection(self):
+        if getattr(self.local, "connection", None) is None:
+            self.local.connection = sqlite3.connect(self.path, timeout=30)
+            self.local.connection.row_factory = sqlite3.Row
+        return self.local.connection
+
+    def import_pickles(self, users_dir="users"):
+        """
+        Import the user pickles written by save_user_data, replacing users already registered.
+        :return: Number of users imported.
+        """
+        users = []
+        if os.path.exists(users_dir):
+            for file in sorted(os.listdir(users_dir)):
+                if file.endswith(".pkl"):
+                    with open(os.path.join(users_dir, file), "rb") as f:
+                        users.append(pickle.load(f))
+        self.save_many(users)
+        if users:
+            print(f"Imported {len(users)} users from {users_dir}.")
+        return len(users)
+
+    def save_many(self, users):
+        """
+        Add users, or replace them when their enrollment number is already registered.
+        """
+        rows = [tuple(str(user.get(field)).strip() if user.get(field) is not None else None for field in FIELDS)
+                for user in users]
+        with self.connection() as connection:
+            connection.executemany("INSERT OR REPLACE INTO users (enrollment, name, class, semester, image_path) "
+                                   "VALUES (?, ?, ?, ?, ?)", rows)
+
+    def save(self, user):
+        self.save_many([user])
+
+    def get(self, enrollment):
+        """
+        :return: User dict, or None if the enrollment number is not registered.
+        """
+        row = self.connection().execute("SELECT * FROM users WHERE enrollment = ?", (str(enrollment),)).fetchone()
+        return dict(row) if row else None
+
+    def all(self):
+        """
+        All users, ordered by enrollment number.
+        """
+        return [dict(row) for row in self.connection().execute("SELECT * FROM users ORDER BY enrollment")]
+
+    def count(self):
+        return self.connection().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def class_roster(self, class_name, semester):
+        """
+        Enrollment numbers of the students of a class. Like class_roster.in_class,
+        users registered with the branch only ("IT") belong to every section
+        ("IT 7A-FSD") of their semester.
+        """
+        rows = self.connection().execute(
+            "SELECT enrollment FROM users WHERE class IN (?, ?) AND semester = ?",
+            (class_name, class_name.split()[0], str(semester)))
+        return {row[0] for row in rows}
+
+
+def registry_from_config(section):
+    """
+    :param section: PATH section of config.yaml.
+    """
+    return UserRegistry(section['USERS_DB'], section['USERS_DIR'])